@@ -0,0 +1,124 @@
+"""
+大型JSON接口的内存占用对比: 整体下载 + json.loads vs 流式解析
+
+本地HTTP服务以分块方式输出 {"data": [...]} 形式的JSON,分别用两种方式提取全部记录,
+输出耗时与Python内存分配峰值(tracemalloc)。记录只计数不保存,内存峰值只反映解析本身。
+
+用法:
+    python benchmarks/json_stream_benchmark.py --records 200000
+"""
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+
+from core.crawl.data_processor import DataProcessor  # noqa: E402
+from core.crawl.extraction import ExtractionPlan  # noqa: E402
+from core.crawl.http_client import AsyncHttpClient  # noqa: E402
+from core.crawl.page import Page  # noqa: E402
+
+TEMPLATE = {
+    'selector': {'path': '$.data[*]'},
+    'attr': {'name': {'path': '$.name'}, 'price': {'path': '$.price'}, 'market': {'path': '$.market.name'}},
+}
+
+
+def make_handler(records: int):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self._chunk(b'{"total": %d, "data": [' % records)
+            batch = []
+            for i in range(records):
+                batch.append(json.dumps({
+                    'id': i, 'name': f'品种{i}', 'price': i * 0.5, 'unit': '斤',
+                    'market': {'name': '新发地', 'area': '北京'}, 'note': 'x' * 100,
+                }, ensure_ascii=False))
+                if len(batch) == 1000:
+                    self._chunk((','.join(batch) + (',' if i < records - 1 else '')).encode('utf-8'))
+                    batch = []
+            if batch:
+                self._chunk(','.join(batch).encode('utf-8'))
+            self._chunk(b']}')
+            self.wfile.write(b'0\r\n\r\n')
+
+        def _chunk(self, data: bytes):
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class CountingStorage:
+    """只计数不保存的存储"""
+
+    def __init__(self):
+        self.count = 0
+
+    async def save(self, table_name, data):
+        self.count += 1
+
+
+async def run_full(url: str, plan: ExtractionPlan) -> int:
+    """改造前的方式: 下载完整响应体,json.loads 后再按路径提取"""
+    client = AsyncHttpClient({'request': {'timeout': 600}, 'http': {'max_body_size': 1 << 40}})
+    try:
+        result = await client.get(url)
+        page = Page(url, result.text, result.content_type)
+        return sum(1 for _ in plan.iter_records(page))
+    finally:
+        await client.close()
+
+
+async def run_stream(url: str, plan: ExtractionPlan) -> int:
+    """流式方式: 边读取边解析,逐条写入存储"""
+    client = AsyncHttpClient({})
+    storage = CountingStorage()
+    processor = DataProcessor(None, url, 'bench', '', 'application/json', TEMPLATE, storage, plan=plan)
+    try:
+        async with client.open(url, stream=True) as response:
+            await processor.process_stream(response.content)
+        return storage.count
+    finally:
+        await client.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='大型JSON接口内存占用对比')
+    parser.add_argument('--records', type=int, default=200000)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(args.records))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/dump'
+    plan = ExtractionPlan(TEMPLATE)
+    try:
+        for name, runner in (('full', run_full), ('stream', run_stream)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            count = await runner(url, plan)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f'{name:<8} {count} 条, 耗时 {elapsed:.2f}s, 内存峰值 {peak / 1024 / 1024:.1f} MB')
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
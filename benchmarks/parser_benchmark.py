@@ -0,0 +1,76 @@
+"""
+解析后端吞吐对比
+
+对同一个生成的表格页面,用每个可用的解析后端完成一次完整的页面处理
+(解析 + 字段提取 + 链接发现),输出 pages/sec。
+"html.parser x2" 一行模拟改造前的流程: 字段提取和链接发现各自解析一次页面。
+
+用法:
+    python benchmarks/parser_benchmark.py --rows 500 --seconds 3
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+
+from core.crawl.page import PARSER_BACKENDS, Page  # noqa: E402
+
+
+def build_page(rows: int) -> str:
+    """生成一个包含表格和链接的测试页面"""
+    body = ''.join(
+        f'<tr><td class="name">品种{i}</td><td>{i % 7}</td><td>{i * 1.5:.2f}</td>'
+        f'<td><a href="/detail/{i}?from=list">详情</a></td></tr>'
+        for i in range(rows)
+    )
+    return (
+        '<html><head><title>benchmark</title></head><body>'
+        f'<table class="hq_table"><tbody>{body}</tbody></table>'
+        '</body></html>'
+    )
+
+
+def process(page: Page):
+    """字段提取 + 链接发现,与 DataProcessor / process_url 的访问方式一致"""
+    backend = page.backend
+    names = [backend.text(node) for node in page.select('.hq_table tbody tr td.name')]
+    links = [backend.attr(node, 'href') for node in page.select('a[href]')]
+    return names, links
+
+
+def bench(name: str, html: str, seconds: float, parses: int = 1) -> float:
+    """在 seconds 秒内反复处理页面,返回 pages/sec"""
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        page = Page('http://bench/', html, 'text/html', name)
+        process(page)
+        for _ in range(parses - 1):
+            Page('http://bench/', html, 'text/html', name).document
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='解析后端吞吐对比')
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--seconds', type=float, default=3.0)
+    args = parser.parse_args()
+
+    html = build_page(args.rows)
+    print(f'页面大小 {len(html) / 1024:.0f} KB, {args.rows} 行')
+    print(f"{'html.parser x2':<16} {bench('html.parser', html, args.seconds, parses=2):8.1f} pages/sec")
+    for name in PARSER_BACKENDS:
+        try:
+            rate = bench(name, html, args.seconds)
+        except ImportError as e:
+            print(f'{name:<16} 跳过 (缺少依赖: {e.name})')
+            continue
+        print(f'{name:<16} {rate:8.1f} pages/sec')
+
+
+if __name__ == '__main__':
+    main()
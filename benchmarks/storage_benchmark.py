@@ -0,0 +1,111 @@
+"""
+MongoDB 写入吞吐对比: 逐条 insert_one(改造前的 save) vs 批量缓冲写入
+
+默认使用模拟往返延迟的替身集合,不需要真实的 MongoDB;
+传入 --uri 时改为写入真实的 mongod(会写入 hermes_bench 数据库)。
+
+用法:
+    python benchmarks/storage_benchmark.py --records 20000 --rtt 0.5
+    python benchmarks/storage_benchmark.py --records 100000 --uri mongodb://localhost:27017/
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append(str(Path(__file__).parent.parent))
+
+from core.storage.mongodb_storage import MongoDBStorage  # noqa: E402
+
+
+class _InsertOneResult:
+    def __init__(self):
+        self.inserted_id = None
+
+
+class _InsertManyResult:
+    def __init__(self, count: int):
+        self.inserted_ids = [None] * count
+
+
+class LatencyCollection:
+    """模拟网络往返的集合替身: 每次调用耗时 rtt,批量写入另加每条记录的服务端开销"""
+
+    def __init__(self, rtt: float, per_doc: float):
+        self.rtt = rtt
+        self.per_doc = per_doc
+        self.count = 0
+
+    def insert_one(self, document):
+        time.sleep(self.rtt + self.per_doc)
+        self.count += 1
+        return _InsertOneResult()
+
+    def insert_many(self, documents, ordered=True):
+        time.sleep(self.rtt + self.per_doc * len(documents))
+        self.count += len(documents)
+        return _InsertManyResult(len(documents))
+
+
+class LatencyDatabase:
+    def __init__(self, rtt: float, per_doc: float):
+        self.collection = LatencyCollection(rtt, per_doc)
+
+    def __getitem__(self, name):
+        return self.collection
+
+
+def make_storage(args) -> MongoDBStorage:
+    if args.uri:
+        storage = MongoDBStorage(args.uri, 'hermes_bench', batch_size=args.batch_size)
+        storage.db.drop_collection('bench')
+    else:
+        storage = MongoDBStorage('mongodb://localhost:27017/', 'hermes_bench', batch_size=args.batch_size)
+        storage.db = LatencyDatabase(args.rtt / 1000, args.per_doc / 1000)
+    return storage
+
+
+def record(i: int) -> dict:
+    return {'name': f'品种{i}', 'price': i * 0.5, '_meta': {'url': f'http://bench/{i // 50}', 'index': i % 50}}
+
+
+async def run_insert_one(args) -> float:
+    """改造前的路径: 在事件循环上逐条同步 insert_one"""
+    storage = make_storage(args)
+    start = time.perf_counter()
+    for i in range(args.records):
+        storage.insert_one('bench', record(i))
+    elapsed = time.perf_counter() - start
+    await storage.close()
+    return elapsed
+
+
+async def run_bulk(args) -> float:
+    """新的路径: save 缓冲 + 后台无序 insert_many"""
+    storage = make_storage(args)
+    start = time.perf_counter()
+    for i in range(args.records):
+        await storage.save('bench', record(i))
+    await storage.close()
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='MongoDB 写入吞吐对比')
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--uri', help='真实 MongoDB 地址,不传则使用替身')
+    parser.add_argument('--rtt', type=float, default=0.5, help='替身的单次往返延迟(毫秒)')
+    parser.add_argument('--per-doc', type=float, default=0.005, help='替身的每条记录开销(毫秒)')
+    args = parser.parse_args()
+
+    target = args.uri or f'替身(rtt={args.rtt}ms)'
+    for name, runner in (('insert_one', run_insert_one), ('bulk', run_bulk)):
+        elapsed = await runner(args)
+        print(f'{name:<12} {target} {args.records} 条, 耗时 {elapsed:.2f}s, {args.records / elapsed:.0f} records/sec')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,363 @@
+"""
+端到端基准测试套件
+
+在本地启动合成站点(见 synthetic_site.py),按 场景 x 抓取方式 x 存储类型 逐一运行完整的抓取,
+输出吞吐(pages/s、records/s)、单次抓取延迟的 p50/p99、CPU时间与内存峰值(RSS)。
+每个组合在独立的子进程中运行,CPU与内存互不干扰;结果写入JSON文件,可与之前的结果对比。
+
+场景:
+    html_crawl   从首页出发按链接抓取整个表格站点(流水线)
+    slow_pages   每个页面响应慢 0.2 秒的站点,考察并发
+    flaky        部分页面第一次返回 503/500 的站点,考察重试
+    large_pages  MB 级的大页面
+    json_api     JSON接口,按行提取
+    json_stream  JSON接口,流式处理(只支持 aiohttp)
+
+用法:
+    python benchmarks/suite.py                                   # 默认: requests/aiohttp x 不存储/文件存储
+    python benchmarks/suite.py --scenarios html_crawl flaky --methods aiohttp --output after.json
+    python benchmarks/suite.py --compare before.json --output after.json
+    python benchmarks/suite.py --methods playwright --storages mongodb --mongo-uri mongodb://localhost:27017/
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 添加项目根目录到Python路径
+ROOT = Path(__file__).parent.parent
+sys.path.append(str(ROOT))
+sys.path.append(str(Path(__file__).parent))
+
+from synthetic_site import SyntheticSite  # noqa: E402
+
+SCENARIOS = {
+    # 名称: (页面类型, 运行方式, 页面数参数)
+    'html_crawl': ('site', 'crawl', 'pages'),
+    'slow_pages': ('slow', 'crawl', 'slow_pages'),
+    'flaky': ('flaky', 'crawl', 'pages'),
+    'large_pages': ('large', 'urls', 'large_pages'),
+    'json_api': ('api', 'urls', 'pages'),
+    'json_stream': ('api', 'urls', 'pages'),
+}
+METHODS = ('requests', 'aiohttp', 'selenium', 'playwright')
+STORAGES = ('null', 'file', 'mongodb')
+
+HTML_TEMPLATE = {
+    'selector': {'css': 'table.data tr'},
+    'attr': {
+        'name': {'css': 'td.name'},
+        'price': {'css': 'td.price'},
+        'market': {'css': 'td.market'},
+    },
+}
+JSON_TEMPLATE = {
+    'selector': {'path': '$.data[*]'},
+    'attr': {'name': {'path': 'name'}, 'price': {'path': 'price'}, 'market': {'path': 'market.name'}},
+}
+
+# 对比时关注的指标: 名称 -> 数值越大越好
+COMPARED = {
+    'pages_per_sec': True,
+    'records_per_sec': True,
+    'latency_p50_ms': False,
+    'latency_p99_ms': False,
+    'cpu_seconds': False,
+    'peak_rss_mb': False,
+}
+
+
+class MeteredStorage:
+    """统计写入条数的存储包装;inner 为 None 时只计数不保存"""
+
+    def __init__(self, inner=None):
+        self.inner = inner
+        self.records = 0
+
+    async def save(self, table_name: str, data: Dict):
+        self.records += 1
+        if self.inner is not None:
+            saved = self.inner.save(table_name, data)
+            if inspect.isawaitable(saved):
+                await saved
+
+    async def close(self):
+        if self.inner is not None and hasattr(self.inner, 'close'):
+            closed = self.inner.close()
+            if inspect.isawaitable(closed):
+                await closed
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """当前进程的内存峰值;Windows 上没有 resource 模块时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以KB为单位,macOS 以字节为单位
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def build_config(spec: Dict, workdir: str) -> Dict:
+    kind, mode, _ = SCENARIOS[spec['scenario']]
+    job = {
+        'name': 'bench',
+        'url': f"{spec['base_url']}/{kind}/0",
+        'method': spec['method'],
+        'parser': spec.get('parser'),
+        'bloomfilter': {'mode': 'memory'},
+        'template': dict(JSON_TEMPLATE if kind == 'api' else HTML_TEMPLATE),
+        'max_depth': 0,
+    }
+    if mode == 'crawl':
+        job['template']['links'] = {'selector': 'a[href]'}
+        job['max_depth'] = 64
+    if spec['scenario'] == 'json_stream':
+        job['stream'] = True
+    return {
+        'headers': {},
+        'jobs': [job],
+        'request': {'timeout': 60, 'retries': 3, 'backoff_base': 0.05, 'backoff_max': 0.5},
+        'politeness': {'concurrency': spec['concurrency']},
+        'http': {'limit_per_host': spec['concurrency'] * 2},
+        'dedup': {'path': f'{workdir}/dedup'},
+        'frontier': {'path': f'{workdir}/frontier.db'},
+        'extraction_pool': {'enabled': spec.get('extraction_pool', False)},
+    }
+
+
+def create_storage(spec: Dict, workdir: str):
+    if spec['storage'] == 'null':
+        return MeteredStorage()
+    from core.storage.storage_factory import StorageFactory
+    storage_config = {'type': spec['storage'], 'path': f'{workdir}/output'}
+    if spec['storage'] == 'mongodb':
+        storage_config.update(uri=spec.get('mongo_uri'), database='hermes_bench')
+    return MeteredStorage(StorageFactory({'storage': storage_config}).create_storage())
+
+
+async def run_scenario(spec: Dict) -> Dict:
+    """在子进程中运行一个组合,返回各项指标"""
+    from core.crawl.crawler import WebCrawler
+
+    workdir = tempfile.mkdtemp(prefix='hermes-bench-')
+    try:
+        kind, mode, _ = SCENARIOS[spec['scenario']]
+        config = build_config(spec, workdir)
+        storage = create_storage(spec, workdir)
+        crawler = WebCrawler(config, storage)
+        latencies: List[float] = []
+        failures = [0]
+
+        def timed(function):
+            # 记录每次抓取(流式场景为每次下载加处理)的耗时
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                result = await function(*args, **kwargs)
+                latencies.append(time.perf_counter() - started)
+                if not result:
+                    failures[0] += 1
+                return result
+            return wrapper
+
+        crawler._fetch = timed(crawler._fetch)
+        crawler._process_stream = timed(crawler._process_stream)
+        # 浏览器等后端的启动时间不计入
+        await crawler.initialize()
+        if mode == 'urls':
+            frontier = crawler._get_frontier()
+            urls = [f"{spec['base_url']}/{kind}/{page_id}" for page_id in range(spec['pages'])]
+            frontier.push('bench', urls, 0)
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        pages = await crawler.crawl('bench', resume=mode == 'urls')
+        # 存储的缓冲在关闭时写完,计入耗时
+        await storage.close()
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+        await crawler.close()
+        return {
+            'pages': pages,
+            'records': storage.records,
+            'failures': failures[0],
+            'seconds': elapsed,
+            'pages_per_sec': pages / elapsed if elapsed else 0.0,
+            'records_per_sec': storage.records / elapsed if elapsed else 0.0,
+            'latency_p50_ms': _ms(percentile(latencies, 0.5)),
+            'latency_p99_ms': _ms(percentile(latencies, 0.99)),
+            'cpu_seconds': cpu,
+            'cpu_percent': cpu / elapsed * 100 if elapsed else 0.0,
+            'peak_rss_mb': peak_rss_mb(),
+            'retries': crawler.resilience.retried,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else seconds * 1000
+
+
+def run_child(spec: Dict, timeout: float) -> Dict:
+    """在子进程中运行一个组合;失败时返回带 error 的结果"""
+    try:
+        completed = subprocess.run(
+            [sys.executable, __file__, '--child', json.dumps(spec)],
+            capture_output=True, text=True, timeout=timeout, cwd=str(ROOT)
+        )
+    except subprocess.TimeoutExpired:
+        return {'error': f'超过 {timeout:.0f} 秒未完成'}
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith('{'):
+            return json.loads(line)
+    error = completed.stderr.strip().splitlines()
+    return {'error': error[-1] if error else f'退出码 {completed.returncode}'}
+
+
+def skip_reason(scenario: str, method: str, storage: str, args) -> Optional[str]:
+    if scenario == 'json_stream' and method != 'aiohttp':
+        return '流式处理只支持 aiohttp'
+    if SCENARIOS[scenario][0] == 'api' and method in ('selenium', 'playwright'):
+        return '浏览器抓取方式不用于JSON接口'
+    if storage == 'mongodb' and not args.mongo_uri:
+        return '未指定 --mongo-uri'
+    return None
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=str(ROOT), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results: List[Dict], baseline_path: str):
+    """与之前的结果逐项对比,输出变化百分比"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {_key(item): item for item in json.load(f).get('results', [])}
+    print(f'\n与 {baseline_path} 对比 (+ 表示变好):')
+    for item in results:
+        old = baseline.get(_key(item))
+        if old is None or 'error' in item or 'error' in old:
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED.items():
+            before, after = old.get(metric), item.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            changes.append(f'{metric} {change if higher_is_better else -change:+.1f}%')
+        print(f"  {'/'.join(_key(item))}: {', '.join(changes)}")
+
+
+def _key(item: Dict):
+    return item['scenario'], item['method'], item['storage']
+
+
+def print_row(item: Dict):
+    name = '/'.join(_key(item))
+    if 'error' in item:
+        print(f'{name:<36} 失败: {item["error"]}')
+        return
+    p50 = item['latency_p50_ms']
+    p99 = item['latency_p99_ms']
+    rss = item['peak_rss_mb']
+    print(
+        f"{name:<36} {item['pages']:>6} 页 {item['records']:>8} 条  "
+        f"{item['pages_per_sec']:>8.1f} pages/s {item['records_per_sec']:>10.0f} records/s  "
+        f"p50 {p50 if p50 is not None else float('nan'):>7.1f}ms p99 {p99 if p99 is not None else float('nan'):>7.1f}ms  "
+        f"CPU {item['cpu_seconds']:>6.2f}s ({item['cpu_percent']:.0f}%)  "
+        f"RSS {rss if rss is not None else float('nan'):>6.1f}MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Hermes 端到端基准测试')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--methods', nargs='+', choices=METHODS, default=['requests', 'aiohttp'])
+    parser.add_argument('--storages', nargs='+', choices=STORAGES, default=['null', 'file'])
+    parser.add_argument('--pages', type=int, default=500, help='链接图与JSON接口的页面数')
+    parser.add_argument('--slow-pages', type=int, default=100)
+    parser.add_argument('--large-pages', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=50, help='每个页面的数据行数')
+    parser.add_argument('--large-rows', type=int, default=20000)
+    parser.add_argument('--latency', type=float, default=0.005, help='服务端基础延迟(秒)')
+    parser.add_argument('--concurrency', type=int, default=16, help='单主机并发数')
+    parser.add_argument('--parser', help='HTML解析后端,默认使用项目默认值')
+    parser.add_argument('--extraction-pool', action='store_true', help='启用解析进程池')
+    parser.add_argument('--mongo-uri', help='mongodb 存储使用的数据库地址')
+    parser.add_argument('--timeout', type=float, default=600, help='单个组合的超时时间(秒)')
+    parser.add_argument('--output', default='benchmark-results.json', help='结果文件')
+    parser.add_argument('--compare', help='用于对比的历史结果文件')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # 子进程: 运行单个组合,最后一行输出JSON结果
+        import logging
+        logging.basicConfig(level=logging.ERROR)
+        print(json.dumps(asyncio.run(run_scenario(json.loads(args.child)))))
+        return
+
+    site = SyntheticSite(args.pages, rows=args.rows, large_rows=args.large_rows, latency=args.latency,
+                         page_limits={'slow': args.slow_pages, 'large': args.large_pages}).start()
+    results = []
+    try:
+        for scenario in args.scenarios:
+            for method in args.methods:
+                for storage in args.storages:
+                    reason = skip_reason(scenario, method, storage, args)
+                    if reason:
+                        print(f'{scenario}/{method}/{storage}: 跳过, {reason}')
+                        continue
+                    site.reset()
+                    spec = {
+                        'scenario': scenario, 'method': method, 'storage': storage,
+                        'base_url': site.base_url, 'pages': getattr(args, SCENARIOS[scenario][2]),
+                        'concurrency': args.concurrency, 'parser': args.parser,
+                        'extraction_pool': args.extraction_pool, 'mongo_uri': args.mongo_uri,
+                    }
+                    item = {'scenario': scenario, 'method': method, 'storage': storage,
+                            **run_child(spec, args.timeout), 'server_requests': site.requests}
+                    results.append(item)
+                    print_row(item)
+    finally:
+        site.stop()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'args': {key: value for key, value in vars(args).items() if key not in ('child', 'compare', 'output')},
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f'\n结果已写入 {args.output}')
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
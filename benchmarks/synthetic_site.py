@@ -0,0 +1,202 @@
+"""
+本地合成站点: 为基准测试生成可重复的网页、链接图和JSON接口
+
+页面类型(路径前缀):
+    /site/<id>    HTML表格页,带指向子页面的链接(含重复写法与跟踪参数,用于检验链接规范化)
+    /slow/<id>    同 site,每次响应额外等待 slow_delay 秒
+    /flaky/<id>   同 site,部分页面第一次请求返回 503(带 Retry-After: 0)或 500,重试后成功
+    /large/<id>   同 site,但表格行数为 large_rows,页面通常在 MB 级
+    /api/<id>     JSON接口,{"total": n, "data": [...]}
+链接图是一棵完全 fanout 叉树: 页面 i 的子页面为 i*fanout+1 ... i*fanout+fanout,编号不超过 pages-1。
+
+用法(单独启动,便于用浏览器或其他工具查看):
+    python benchmarks/synthetic_site.py --port 18080 --pages 1000
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+KINDS = ('site', 'slow', 'flaky', 'large', 'api')
+
+
+class SyntheticSite:
+    """在后台线程中运行的合成站点"""
+
+    def __init__(self, pages: int = 500, fanout: int = 4, rows: int = 50, large_rows: int = 20000,
+                 latency: float = 0.0, slow_delay: float = 0.2, port: int = 0,
+                 page_limits: Optional[Dict[str, int]] = None):
+        """
+        :param pages: 链接图中的页面数
+        :param fanout: 每个页面链接的子页面数
+        :param rows: 普通页面与JSON接口的数据行数
+        :param large_rows: large 页面的数据行数
+        :param latency: 所有响应的基础延迟(秒)
+        :param slow_delay: slow 页面额外的延迟(秒)
+        :param port: 监听端口,0 表示随机端口
+        :param page_limits: 按页面类型单独指定页面数,如 {'slow': 100, 'large': 20}
+        """
+        self.pages = pages
+        self.fanout = fanout
+        self.rows = rows
+        self.large_rows = large_rows
+        self.latency = latency
+        self.slow_delay = slow_delay
+        self.port = port
+        self.page_limits = page_limits or {}
+        self.requests = 0
+        self.errors = 0
+        self._failed_once = set()
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.port}'
+
+    def url(self, kind: str, page_id: int = 0) -> str:
+        return f'{self.base_url}/{kind}/{page_id}'
+
+    def limit(self, kind: str) -> int:
+        """该类型页面的数量"""
+        return self.page_limits.get(kind, self.pages)
+
+    def children(self, kind: str, page_id: int):
+        first = page_id * self.fanout + 1
+        return range(first, min(first + self.fanout, self.limit(kind)))
+
+    def html_page(self, kind: str, page_id: int) -> bytes:
+        rows = self.large_rows if kind == 'large' else self.rows
+        links = []
+        for child in self.children(kind, page_id):
+            # 同一子页面的三种写法: 规范链接、带跟踪参数和片段的链接、相对路径链接
+            links.append(f'<li><a href="/{kind}/{child}">第{child}页</a></li>')
+            links.append(f'<li><a href="/{kind}/{child}?utm_source=bench#top">推荐</a></li>')
+            links.append(f'<li><a href="../{kind}/{child}">更多</a></li>')
+        links.append('<li><a href="javascript:void(0)">收藏</a></li>')
+        links.append('<li><a href="https://elsewhere.invalid/">外部链接</a></li>')
+        table = ''.join(
+            f'<tr><td class="name">品种{page_id}-{row}</td><td class="price">{(page_id * 7 + row) % 997 / 10:.1f}</td>'
+            f'<td class="unit">斤</td><td class="market">市场{row % 13}</td></tr>'
+            for row in range(rows)
+        )
+        return (
+            '<!DOCTYPE html><html><head><meta charset="utf-8"><title>合成页面</title>'
+            f'<script>var rendered = {time.time()};</script></head><body>'
+            f'<div class="nav"><ul>{"".join(links)}</ul></div>'
+            f'<table class="data"><tbody>{table}</tbody></table></body></html>'
+        ).encode('utf-8')
+
+    def api_page(self, page_id: int) -> bytes:
+        data = [
+            {'id': page_id * self.rows + row, 'name': f'品种{page_id}-{row}',
+             'price': (page_id * 7 + row) % 997 / 10, 'market': {'name': f'市场{row % 13}'}}
+            for row in range(self.rows)
+        ]
+        return json.dumps({'total': len(data), 'data': data}, ensure_ascii=False).encode('utf-8')
+
+    def _should_fail(self, page_id: int) -> Optional[int]:
+        """flaky 页面: 编号能被5整除的第一次返回503,能被7整除的第一次返回500"""
+        status = 503 if page_id % 5 == 0 else 500 if page_id % 7 == 0 else None
+        if status is None:
+            return None
+        with self._lock:
+            if page_id in self._failed_once:
+                return None
+            self._failed_once.add(page_id)
+        return status
+
+    def _make_handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with site._lock:
+                    site.requests += 1
+                kind, _, rest = self.path.lstrip('/').partition('/')
+                try:
+                    page_id = int(rest.split('?', 1)[0].split('#', 1)[0])
+                except ValueError:
+                    page_id = -1
+                if kind not in KINDS or not 0 <= page_id < site.limit(kind):
+                    return self._send(404, b'not found', 'text/plain')
+                if site.latency:
+                    time.sleep(site.latency)
+                if kind == 'slow':
+                    time.sleep(site.slow_delay)
+                if kind == 'flaky':
+                    status = site._should_fail(page_id)
+                    if status is not None:
+                        with site._lock:
+                            site.errors += 1
+                        return self._send(status, b'temporarily unavailable', 'text/plain',
+                                          {'Retry-After': '0'} if status == 503 else None)
+                if kind == 'api':
+                    return self._send(200, site.api_page(page_id), 'application/json; charset=utf-8')
+                return self._send(200, site.html_page(kind, page_id), 'text/html; charset=utf-8')
+
+            def handle(self):
+                try:
+                    super().handle()
+                except ConnectionError:
+                    # 客户端超时或关闭连接,不打印堆栈
+                    pass
+
+            def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict] = None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'SyntheticSite':
+        self._server = ThreadingHTTPServer(('127.0.0.1', self.port), self._make_handler())
+        self._server.daemon_threads = True
+        self.port = self._server.server_port
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def reset(self):
+        """清除 flaky 页面的失败记录与计数,供下一轮测试使用"""
+        with self._lock:
+            self._failed_once.clear()
+            self.requests = 0
+            self.errors = 0
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='基准测试用的本地合成站点')
+    parser.add_argument('--port', type=int, default=18080)
+    parser.add_argument('--pages', type=int, default=1000)
+    parser.add_argument('--fanout', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0, help='每次响应的基础延迟(秒)')
+    args = parser.parse_args()
+    site = SyntheticSite(args.pages, args.fanout, args.rows, latency=args.latency, port=args.port).start()
+    print(f'合成站点已启动: {site.url("site")}  (Ctrl+C 退出)')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        site.stop()
+
+
+if __name__ == '__main__':
+    main()
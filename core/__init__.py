@@ -1,5 +1,20 @@
-from .config.config import ConfigLoader
-from .crawl.crawler import WebCrawler
-from .storage.storage_factory import StorageFactory
-from .task.scheduler import TaskScheduler
-from .web.api import app
\ No newline at end of file
+# 各模块在第一次被访问时才导入,只用到其中一部分功能时不必加载全部依赖
+_EXPORTS = {
+    'ConfigLoader': '.config.config',
+    'WebCrawler': '.crawl.crawler',
+    'StorageFactory': '.storage.storage_factory',
+    'TaskScheduler': '.task.scheduler',
+    'app': '.web.api',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
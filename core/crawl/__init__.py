@@ -1,2 +1,18 @@
-from .crawler import WebCrawler
-from .data_processor import DataProcessor
\ No newline at end of file
+# 按需导入: 解析进程等只用到 page / extraction 的场景不会加载抓取相关的依赖
+_EXPORTS = {
+    'WebCrawler': '.crawler',
+    'DataProcessor': '.data_processor',
+    'WorkerCoordinator': '.workers',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
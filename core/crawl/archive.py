@@ -0,0 +1,269 @@
+import gzip
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.client import responses as _REASONS
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from core.crawl.http_client import FetchResult
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archive_index (
+    job TEXT NOT NULL,
+    url TEXT NOT NULL,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (job, url)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_archive_position ON archive_index (job, segment, offset);
+"""
+
+_SUFFIXES = {None: '.warc', 'gzip': '.warc.gz', 'zstd': '.warc.zst'}
+_SEGMENT_NAME = re.compile(r'^hermes-(\d{5,})\.warc(\.gz|\.zst)?$')
+
+# 响应体在抓取时已经解码,这些头不再与存档中的响应体对应
+_DROPPED_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length'}
+
+
+def _header(headers: Dict[str, str], name: str) -> str:
+    """按不区分大小写的方式取响应头;存档时保留的是抓取后端给出的原始写法"""
+    name = name.lower()
+    return next((value for key, value in headers.items() if key.lower() == name), '')
+
+
+def _charset(content_type: str) -> Optional[str]:
+    match = re.search(r'charset=["\']?([\w-]+)', content_type or '', re.I)
+    return match.group(1) if match else None
+
+
+class ResponseArchive:
+    """
+    原始响应的存档,格式与WARC(response 记录)兼容。
+
+    每条记录单独压缩为一个gzip(或zstd)成员后追加到分段文件,分段超过 segment_bytes 时切换到新文件;
+    SQLite索引按 (job, url) 记录每个页面最近一次响应所在的分段、偏移和长度,回放时直接定位读取。
+    存档以 hermes-00001.warc.gz 的形式命名,可以用常见的WARC工具查看。
+    """
+
+    def __init__(self, path: str = 'data/archive', segment_bytes: int = 256 * 1024 * 1024,
+                 compression: Optional[str] = 'gzip'):
+        """
+        :param path: 存档目录
+        :param segment_bytes: 单个分段文件的大小上限
+        :param compression: 'gzip'、'zstd' 或 None
+        """
+        if compression not in _SUFFIXES:
+            logger.error(f"不支持的压缩方式: {compression},改为gzip")
+            compression = 'gzip'
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.compression = compression
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()       # 保护写入与索引
+        self._read_lock = threading.Lock()  # 保护读取用的文件句柄
+        self.conn = sqlite3.connect(os.path.join(path, 'index.db'), check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+        self._segments = self._scan_segments()  # 分段编号 -> 文件名
+        self._segment = None  # 正在写入的分段编号,第一次写入时创建新分段
+        self._file = None
+        self._readers = {}
+        self._compressor = None
+        self.recorded = 0
+        self.replayed = 0
+        self.missing = 0
+
+    def _scan_segments(self) -> Dict[int, str]:
+        segments = {}
+        for name in os.listdir(self.path):
+            match = _SEGMENT_NAME.match(name)
+            if match:
+                segments[int(match.group(1))] = name
+        return segments
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.compression == 'gzip':
+            return gzip.compress(data, compresslevel=6)
+        if self.compression == 'zstd':
+            if self._compressor is None:
+                import zstandard
+                self._compressor = zstandard.ZstdCompressor(level=3)
+            return self._compressor.compress(data)
+        return data
+
+    @staticmethod
+    def _decompress(name: str, data: bytes) -> bytes:
+        if name.endswith('.gz'):
+            return gzip.decompress(data)
+        if name.endswith('.zst'):
+            import zstandard
+            return zstandard.ZstdDecompressor().decompress(data)
+        return data
+
+    def _open_segment(self):
+        """切换到新的分段文件(调用方持有锁);重启后不续写旧分段,避免接在未写完的记录之后"""
+        if self._file is not None:
+            self._file.close()
+        self._segment = max(self._segments, default=0) + 1
+        name = f'hermes-{self._segment:05d}{_SUFFIXES[self.compression]}'
+        self._segments[self._segment] = name
+        self._file = open(os.path.join(self.path, name), 'ab')
+
+    @staticmethod
+    def _encode(url: str, result: FetchResult) -> bytes:
+        """把抓取结果编码为一条WARC response 记录"""
+        body = result.content
+        if isinstance(body, str):
+            body = body.encode(result.encoding or 'utf-8', errors='replace')
+        headers = {key: value for key, value in result.headers.items() if key.lower() not in _DROPPED_HEADERS}
+        if result.content_type and not any(key.lower() == 'content-type' for key in headers):
+            headers['Content-Type'] = result.content_type
+        if result.encoding and not _charset(result.content_type):
+            # 浏览器抓取的页面或探测出的编码,回放时需要按同样的编码解码
+            headers['X-Hermes-Encoding'] = result.encoding
+        headers['Content-Length'] = str(len(body))
+        status = result.status or 200
+        http_head = f'HTTP/1.1 {status} {_REASONS.get(status, "")}\r\n' + ''.join(
+            f'{key}: {value}\r\n' for key, value in headers.items()
+        ) + '\r\n'
+        block = http_head.encode('utf-8', errors='replace') + body
+        warc_head = (
+            'WARC/1.1\r\n'
+            'WARC-Type: response\r\n'
+            f'WARC-Record-ID: <urn:uuid:{uuid.uuid4()}>\r\n'
+            f'WARC-Date: {datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")}\r\n'
+            f'WARC-Target-URI: {result.url or url}\r\n'
+            'Content-Type: application/http; msgtype=response\r\n'
+            f'Content-Length: {len(block)}\r\n'
+            '\r\n'
+        )
+        return warc_head.encode('utf-8') + block + b'\r\n\r\n'
+
+    @staticmethod
+    def _decode(record: bytes) -> FetchResult:
+        """从WARC记录还原抓取结果"""
+        warc_head, _, block = record.partition(b'\r\n\r\n')
+        warc_headers = dict(
+            line.split(': ', 1) for line in warc_head.decode('utf-8').split('\r\n')[1:] if ': ' in line
+        )
+        block = block[:int(warc_headers['Content-Length'])]
+        http_head, _, body = block.partition(b'\r\n\r\n')
+        lines = http_head.decode('utf-8', errors='replace').split('\r\n')
+        status = int(lines[0].split(' ', 2)[1])
+        headers = dict(line.split(': ', 1) for line in lines[1:] if ': ' in line)
+        encoding = headers.pop('X-Hermes-Encoding', None)
+        content_type = _header(headers, 'Content-Type')
+        return FetchResult(
+            url=warc_headers.get('WARC-Target-URI', ''),
+            status=status,
+            headers=headers,
+            content=body,
+            content_type=content_type,
+            encoding=encoding or _charset(content_type)
+        )
+
+    def record(self, job: str, url: str, result: FetchResult):
+        """
+        存档一次响应;同一页面再次存档时索引指向最新的记录
+        :param job: 任务名称
+        :param url: 请求的URL(回放时按它查找)
+        :param result: 抓取结果
+        """
+        data = self._compress(self._encode(url, result))
+        with self._lock:
+            if self._file is None or self._file.tell() >= self.segment_bytes:
+                self._open_segment()
+            offset = self._file.tell()
+            self._file.write(data)
+            # 记录写入文件后才更新索引,索引中的记录一定是完整的
+            self._file.flush()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO archive_index (job, url, segment, offset, length, status, fetched_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (job, url, self._segment, offset, len(data), result.status or 200, time.time())
+            )
+            self.recorded += 1
+
+    def _read(self, segment: int, offset: int, length: int) -> FetchResult:
+        name = self._segments.get(segment)
+        if name is None:
+            # 其他进程写入的新分段
+            self._segments.update(self._scan_segments())
+            name = self._segments[segment]
+        with self._read_lock:
+            reader = self._readers.get(segment)
+            if reader is None:
+                reader = self._readers[segment] = open(os.path.join(self.path, name), 'rb')
+            reader.seek(offset)
+            data = reader.read(length)
+        return self._decode(self._decompress(name, data))
+
+    def lookup(self, job: str, url: str) -> Optional[FetchResult]:
+        """读取页面最近一次存档的响应,没有存档时返回 None"""
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT segment, offset, length FROM archive_index WHERE job = ? AND url = ?', (job, url)
+            ).fetchone()
+        if row is None:
+            self.missing += 1
+            return None
+        self.replayed += 1
+        return self._read(*row)
+
+    def urls(self, job: str, batch_size: int = 1000) -> Iterator[List[str]]:
+        """
+        按存档中的位置顺序分批返回任务的全部URL,顺序读取分段文件
+        :param job: 任务名称
+        :param batch_size: 每批的数量
+        """
+        position: Tuple[int, int] = (0, -1)
+        while True:
+            with self._lock:
+                rows = self.conn.execute(
+                    'SELECT url, segment, offset FROM archive_index '
+                    'WHERE job = ? AND (segment, offset) > (?, ?) ORDER BY segment, offset LIMIT ?',
+                    (job, *position, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            position = rows[-1][1:]
+            yield [row[0] for row in rows]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM archive_index').fetchone()[0]
+        size = sum(
+            os.path.getsize(os.path.join(self.path, name)) for name in self._segments.values()
+            if os.path.exists(os.path.join(self.path, name))
+        )
+        return {
+            'entries': entries,
+            'segments': len(self._segments),
+            'bytes': size,
+            'recorded': self.recorded,
+            'replayed': self.replayed,
+            'missing': self.missing,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self.conn.close()
+        with self._read_lock:
+            for reader in self._readers.values():
+                reader.close()
+            self._readers = {}
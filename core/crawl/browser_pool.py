@@ -0,0 +1,407 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, List, Optional, Set
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+# 可以按任务屏蔽的资源类型(Playwright 的 request.resource_type)
+RESOURCE_TYPES = {'image', 'font', 'media', 'stylesheet', 'texttrack', 'eventsource', 'websocket', 'manifest', 'other'}
+
+
+class PooledPage:
+    """池中的一个标签页,记录导航次数与当前借用者屏蔽的资源类型"""
+    __slots__ = ('page', 'context', 'navigations', 'blocked', 'routed', 'broken')
+
+    def __init__(self, page, context: 'PooledContext'):
+        self.page = page
+        self.context = context
+        self.navigations = 0
+        self.blocked: Set[str] = set()
+        self.routed = False
+        self.broken = False
+
+    async def block(self, resource_types: Iterable[str]):
+        """设置本次借用屏蔽的资源类型;拦截请求有额外开销,只在确实需要屏蔽时才安装"""
+        self.blocked = set(resource_types)
+        if self.blocked and not self.routed:
+            await self.page.route('**/*', self._route)
+            self.routed = True
+        elif not self.blocked and self.routed:
+            await self.page.unroute('**/*', self._route)
+            self.routed = False
+
+    async def _route(self, route):
+        # 标签页在不同任务之间复用,每次请求按当前借用者的设置判断
+        if route.request.resource_type in self.blocked:
+            await route.abort()
+        else:
+            await route.continue_()
+
+
+class PooledContext:
+    """一个浏览器上下文(独立的cookie与缓存),累计导航次数达到上限后整体重建"""
+    __slots__ = ('context', 'navigations', 'live_pages', 'retiring')
+
+    def __init__(self, context):
+        self.context = context
+        self.navigations = 0
+        self.live_pages = 0
+        self.retiring = False
+
+
+class PlaywrightPool:
+    """
+    Playwright 浏览器上下文与标签页池。
+
+    Playwright 运行时和浏览器在首次使用时启动并一直保留,启动时预先打开
+    contexts × pages_per_context 个标签页;抓取时借出空闲标签页,用完放回。
+    标签页导航 page_max_navigations 次后关闭重开,上下文累计导航
+    context_max_navigations 次后在其标签页全部归还时重建,避免长时间运行的内存膨胀。
+    重开失败时池中暂时少了标签页,下次借用时补开;等待空闲标签页超过 acquire_timeout 秒时报错。
+    """
+
+    def __init__(self, config: Dict):
+        browser_config = config.get('browser', {})
+        pool_config = browser_config.get('playwright', {})
+        self.chrome_path = browser_config.get('chrome_path') or None
+        self.contexts = pool_config.get('contexts', 2)
+        self.pages_per_context = pool_config.get('pages_per_context', 4)
+        self.page_max_navigations = pool_config.get('page_max_navigations', 50)
+        self.context_max_navigations = pool_config.get('context_max_navigations', 500)
+        self.navigation_timeout = pool_config.get('navigation_timeout', 30) * 1000
+        self.wait_until = pool_config.get('wait_until', 'load')
+        self.acquire_timeout = pool_config.get('acquire_timeout', 60)
+        self.block_resources: List[str] = pool_config.get('block_resources', [])
+        unknown = set(self.block_resources) - RESOURCE_TYPES
+        if unknown:
+            logger.warning(f"未知的资源类型: {', '.join(sorted(unknown))}")
+        self._playwright = None
+        self._browser = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._start_lock = asyncio.Lock()
+        self.live_pages = 0
+        self.pages_opened = 0
+        self.contexts_opened = 0
+        self.navigations = 0
+        self.reopen_failures = 0
+
+    @property
+    def size(self) -> int:
+        """池中应有的标签页数"""
+        return self.contexts * self.pages_per_context
+
+    @property
+    def started(self) -> bool:
+        return self._browser is not None
+
+    async def start(self):
+        """启动 Playwright 运行时与浏览器,并预先打开所有标签页"""
+        async with self._start_lock:
+            if self._browser is not None:
+                return
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+            try:
+                self._browser = await self._playwright.chromium.launch(
+                    headless=True,  # 启用无头模式
+                    executable_path=self.chrome_path  # 如果配置了路径则使用
+                )
+                self._idle = asyncio.Queue()
+                for _ in range(self.contexts):
+                    await self._open_context()
+            except Exception:
+                await self.close()
+                raise
+            logger.info(f"Playwright 标签页池已启动, 上下文数: {self.contexts}, "
+                        f"每个上下文标签页数: {self.pages_per_context}")
+
+    async def _open_context(self, pages: Optional[int] = None):
+        context = PooledContext(await self._browser.new_context())
+        self.contexts_opened += 1
+        try:
+            for _ in range(pages or self.pages_per_context):
+                await self._open_page(context)
+        finally:
+            if context.live_pages == 0:
+                await self._close_context(context)
+
+    async def _open_page(self, context: PooledContext):
+        page = await context.context.new_page()
+        page.set_default_navigation_timeout(self.navigation_timeout)
+        context.live_pages += 1
+        self.live_pages += 1
+        self.pages_opened += 1
+        self._idle.put_nowait(PooledPage(page, context))
+
+    @staticmethod
+    async def _close_context(context: PooledContext):
+        try:
+            await context.context.close()
+        except Exception as e:
+            logger.debug(f"关闭浏览器上下文失败: {str(e)}")
+
+    async def _retire_page(self, pooled: PooledPage):
+        """关闭标签页;所属上下文需要重建且已无标签页时关闭并重建上下文"""
+        context = pooled.context
+        context.live_pages -= 1
+        self.live_pages -= 1
+        try:
+            await pooled.page.close()
+        except Exception as e:
+            logger.debug(f"关闭标签页失败: {str(e)}")
+        try:
+            if context.retiring:
+                if context.live_pages == 0:
+                    await self._close_context(context)
+                    await self._open_context()
+            else:
+                await self._open_page(context)
+        except Exception as e:
+            # 浏览器可能已崩溃;少掉的标签页在下次借用时补开,不会永久缺少
+            self.reopen_failures += 1
+            logger.warning(f"重开标签页失败, 池中现有 {self.live_pages}/{self.size} 个标签页: {str(e)}")
+            if context.live_pages == 0 and not context.retiring:
+                await self._close_context(context)
+
+    async def _restore(self):
+        """补开之前重开失败而缺少的标签页,放在新的上下文中"""
+        async with self._start_lock:
+            while self._browser is not None and self.live_pages < self.size:
+                await self._open_context(min(self.size - self.live_pages, self.pages_per_context))
+
+    async def _release(self, pooled: PooledPage):
+        pooled.navigations += 1
+        context = pooled.context
+        context.navigations += 1
+        self.navigations += 1
+        if context.navigations >= self.context_max_navigations:
+            context.retiring = True
+        if pooled.broken or context.retiring or pooled.navigations >= self.page_max_navigations:
+            await self._retire_page(pooled)
+        else:
+            self._idle.put_nowait(pooled)
+
+    @asynccontextmanager
+    async def page(self, block_resources: Optional[Iterable[str]] = None):
+        """
+        借出一个空闲标签页
+        :param block_resources: 本次导航中屏蔽的资源类型,默认使用池配置中的设置
+        """
+        if self._browser is None:
+            await self.start()
+        if self.live_pages < self.size:
+            try:
+                await self._restore()
+            except Exception as e:
+                self.reopen_failures += 1
+                logger.warning(f"补开标签页失败: {str(e)}")
+        try:
+            pooled = await asyncio.wait_for(self._idle.get(), self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(f"等待空闲标签页超过 {self.acquire_timeout} 秒, "
+                                       f"池中现有 {self.live_pages}/{self.size} 个标签页") from None
+        try:
+            await pooled.block(self.block_resources if block_resources is None else block_resources)
+            yield pooled.page
+        except BaseException:
+            # 导航出错的标签页状态不确定,不再放回池中
+            pooled.broken = True
+            raise
+        finally:
+            try:
+                await self._release(pooled)
+            except Exception as e:
+                logger.error(f"回收标签页失败: {str(e)}")
+
+    async def fetch(self, url: str, block_resources: Optional[Iterable[str]] = None) -> str:
+        """打开页面并返回渲染后的HTML"""
+        async with self.page(block_resources) as page:
+            await page.goto(url, wait_until=self.wait_until)
+            return await page.content()
+
+    def stats(self) -> Dict:
+        return {
+            'idle_pages': self._idle.qsize() if self._idle else 0,
+            'live_pages': self.live_pages,
+            'pages_opened': self.pages_opened,
+            'reopen_failures': self.reopen_failures,
+            'contexts_opened': self.contexts_opened,
+            'navigations': self.navigations,
+        }
+
+    async def close(self):
+        """关闭浏览器与 Playwright 运行时"""
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception as e:
+                logger.error(f"关闭浏览器失败: {str(e)}")
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+        self._idle = None
+        self.live_pages = 0
+
+
+class SeleniumWorker:
+    """
+    一个 Selenium 驱动及其专属的工作线程。
+
+    WebDriver 不是线程安全的,驱动的创建、导航和退出都在同一个线程中执行;
+    驱动在第一次使用时才启动。
+    """
+
+    def __init__(self, index: int, pool: 'SeleniumPool'):
+        self.index = index
+        self.pool = pool
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'selenium-{index}')
+        self.driver = None
+        self.navigations = 0
+        self.last_used = 0.0
+        self.restarts = 0
+
+    def _start(self):
+        from selenium import webdriver
+        chrome_options = webdriver.ChromeOptions()
+        chrome_options.add_argument('--headless')  # 启用无头模式
+        chrome_options.add_argument('--disable-gpu')  # 禁用GPU加速
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        if self.pool.block_images:
+            chrome_options.add_argument('--blink-settings=imagesEnabled=false')
+        if self.pool.chrome_path:
+            chrome_options.binary_location = self.pool.chrome_path
+        self.driver = webdriver.Chrome(options=chrome_options)
+        self.driver.set_page_load_timeout(self.pool.page_load_timeout)
+        self.navigations = 0
+        logger.debug(f"Selenium 驱动 {self.index} 已启动")
+
+    def _quit(self):
+        if self.driver is None:
+            return
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.debug(f"退出 Selenium 驱动 {self.index} 失败: {str(e)}")
+        self.driver = None
+
+    def _restart(self, reason: str, level: int = logging.WARNING):
+        logger.log(level, f"重启 Selenium 驱动 {self.index}: {reason}")
+        self._quit()
+        self.restarts += 1
+        self._start()
+
+    def _healthy(self) -> bool:
+        """驱动闲置较久后先确认浏览器进程仍可响应"""
+        try:
+            return self.driver.execute_script('return 1') == 1
+        except Exception:
+            return False
+
+    def _heap_mb(self) -> float:
+        """页面的JS堆占用(MB),Chrome 之外的浏览器返回 0"""
+        try:
+            used = self.driver.execute_script('return performance.memory ? performance.memory.usedJSHeapSize : 0')
+            return (used or 0) / (1024 * 1024)
+        except Exception:
+            return 0.0
+
+    def fetch(self, url: str) -> str:
+        """在工作线程中执行: 打开页面并返回HTML,驱动崩溃时重启后重试一次"""
+        pool = self.pool
+        if self.driver is None:
+            self._start()
+        elif time.monotonic() - self.last_used > pool.health_check_interval and not self._healthy():
+            self._restart('健康检查失败')
+        try:
+            self.driver.get(url)
+            html = self.driver.page_source
+        except Exception as e:
+            from selenium.common.exceptions import TimeoutException
+            if isinstance(e, TimeoutException):
+                raise
+            # 浏览器崩溃或会话失效,重启后重试一次
+            self._restart(str(e).splitlines()[0] if str(e) else type(e).__name__)
+            self.driver.get(url)
+            html = self.driver.page_source
+        self.navigations += 1
+        self.last_used = time.monotonic()
+        if pool.max_navigations and self.navigations >= pool.max_navigations:
+            self._restart(f'已导航 {self.navigations} 次', logging.INFO)
+        elif pool.max_heap_mb and self._heap_mb() > pool.max_heap_mb:
+            self._restart(f'JS堆超过 {pool.max_heap_mb}MB', logging.INFO)
+        return html
+
+    def close(self):
+        self.executor.submit(self._quit).result()
+        self.executor.shutdown(wait=True)
+
+
+class SeleniumPool:
+    """
+    Selenium 驱动池。
+
+    每个驱动由一个专属工作线程持有,抓取时借出空闲的驱动,在其线程中执行阻塞的
+    driver.get / page_source,事件循环不会被阻塞,吞吐随驱动数量增长。
+    驱动崩溃、健康检查失败、导航次数或JS堆占用超过上限时自动重启。
+    """
+
+    def __init__(self, config: Dict):
+        browser_config = config.get('browser', {})
+        pool_config = browser_config.get('selenium', {})
+        self.chrome_path = browser_config.get('chrome_path') or None
+        self.size = pool_config.get('drivers', 2)
+        self.page_load_timeout = pool_config.get('page_load_timeout', 30)
+        self.health_check_interval = pool_config.get('health_check_interval', 60)
+        self.max_navigations = pool_config.get('max_navigations', 200)
+        self.max_heap_mb = pool_config.get('max_heap_mb', 0)
+        self.block_images = pool_config.get('block_images', False)
+        self._workers: List[SeleniumWorker] = []
+        self._idle: Optional[asyncio.Queue] = None
+
+    def _ensure_workers(self):
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            self._workers = [SeleniumWorker(index, self) for index in range(self.size)]
+            for worker in self._workers:
+                self._idle.put_nowait(worker)
+
+    async def start(self):
+        """预先启动所有驱动;不调用时驱动在第一次使用时启动"""
+        self._ensure_workers()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(worker.executor, worker._start)
+            for worker in self._workers if worker.driver is None
+        ))
+        logger.info(f"Selenium 驱动池已启动, 驱动数: {self.size}")
+
+    async def fetch(self, url: str) -> str:
+        """借出一个空闲驱动,在其工作线程中打开页面并返回HTML"""
+        self._ensure_workers()
+        worker = await self._idle.get()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(worker.executor, worker.fetch, url)
+        finally:
+            self._idle.put_nowait(worker)
+
+    def stats(self) -> Dict:
+        return {
+            'drivers': self.size,
+            'started': sum(worker.driver is not None for worker in self._workers),
+            'idle': self._idle.qsize() if self._idle else self.size,
+            'restarts': sum(worker.restarts for worker in self._workers),
+        }
+
+    async def close(self):
+        """退出所有驱动并结束工作线程"""
+        workers, self._workers, self._idle = self._workers, [], None
+        for worker in workers:
+            try:
+                await asyncio.to_thread(worker.close)
+            except Exception as e:
+                logger.error(f"关闭 Selenium 驱动失败: {str(e)}")
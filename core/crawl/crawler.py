@@ -1,18 +1,41 @@
 # crawler.py
+import inspect
 import logging
-from bs4 import BeautifulSoup
-from selenium import webdriver
-import requests
-import json
-from urllib.parse import urlparse, urljoin
-from typing import Dict, Optional, List, Set, Tuple
-from pybloom_live import ScalableBloomFilter
-from playwright.async_api import async_playwright
+import time
+from typing import Dict, Optional, List, Tuple
 import asyncio
+from datetime import datetime
 from core.crawl.data_processor import DataProcessor  # 修改为绝对导入
-from core.crawl.headers import Headers
+from core.crawl.http_client import AsyncHttpClient, FetchResult, RequestsClient
+from core.crawl.http_cache import HttpCache
+from core.crawl.archive import ResponseArchive
+from core.crawl.fingerprint import ContentFingerprinter, FingerprintStore
+from core.crawl.politeness import PolitenessScheduler
+from core.crawl.frontier import CrawlFrontier
+from core.crawl.dedup import create_dedup_store
+from core.crawl.page import Page
+from core.crawl.extraction import ExtractionPlan
+from core.crawl.extract_pool import ExtractionPool
+from core.crawl.pipeline import CrawlPipeline, PageTask
+from core.crawl.links import LinkExtractor
+from core.crawl.browser_pool import PlaywrightPool, SeleniumPool
+from core.crawl.resilience import CircuitOpenError, ResilientFetcher
+from core.crawl.politeness import classify_exception
+from core.monitor.log_sampler import LogSampler
+from core.monitor.metrics import DEDUP_CHECKS, FETCH_BYTES, FETCH_RESPONSES, FETCH_SECONDS, host_label
 # 确保 logger 被正确导入
 logger = logging.getLogger(__name__)
+# 每个URL都可能出现的日志按类别限流
+sampled_log = LogSampler(logger)
+
+
+# 抓取方式 -> 后端的创建函数;后端(及其依赖的库)在第一次使用该抓取方式时才导入和创建
+FETCH_BACKENDS = {
+    'requests': RequestsClient,      # requests 会话,请求在专用线程池中执行
+    'aiohttp': AsyncHttpClient,      # 非阻塞HTTP客户端
+    'selenium': SeleniumPool,        # Selenium 驱动池,驱动在工作线程中运行
+    'playwright': PlaywrightPool,    # 浏览器上下文与标签页池
+}
 
 class WebCrawler:
     """支持多层级页面抓取的爬虫核心类"""
@@ -22,173 +45,545 @@ class WebCrawler:
         self.job_configs = {}
         self.storage = storage  # 传递存储实例
         self.bloom_filters = {}
+        self.extraction_plans = {}  # 各job模板编译后的提取计划
+        self.fingerprinters = {}  # 开启内容指纹的job
+        self.link_extractors = {}  # 各job的链接规范化与范围规则
+        started = time.perf_counter()
         self._init_job_settings()
-        self.drivers = {}  # 先初始化为空字典
-        self.session = requests.Session()  # 创建一个Session对象
-        adapter = requests.adapters.HTTPAdapter(pool_connections=100, pool_maxsize=100)
-        self.session.mount('http://', adapter)
-        self.session.mount('https://', adapter)
-        self.semaphore = asyncio.Semaphore(10)  # 控制并发度为10
+        logger.info(f"任务初始化完成, 共 {len(self.job_configs)} 个任务, "
+                    f"耗时 {(time.perf_counter() - started) * 1000:.0f}ms")
+        self.backends = {}  # 已创建的抓取后端,见 FETCH_BACKENDS
+        self.politeness = PolitenessScheduler(config)  # 按主机控制并发、间隔与速率
+        self.resilience = ResilientFetcher(config)  # 重试、退避与按主机熔断
+        self.frontier = None  # 持久化抓取队列,首次调用 crawl 时创建
+        self.http_cache = None  # HTTP条件请求缓存,首次用于启用缓存的job时创建
+        self.fingerprint_store = None  # 页面内容指纹索引,首次用于开启指纹的job时创建
+        self.archive = None  # 原始响应存档,首次用于记录或回放的job时创建
+        self.pipelines = {}  # 正在整站抓取的job -> 流水线,可通过 pipeline_stats 查看
+        pool = ExtractionPool(config)
+        self.extraction_pool = pool if pool.enabled else None  # 可选的解析进程池
         #self.data_processor = DataProcessor(storage)  # 初始化 DataProcessor
 
     def _init_job_settings(self):
         """从配置初始化各job的爬取参数"""
+        dedup_path = self.config.get('dedup', {}).get('path', 'data/dedup')
         for job in self.config.get('jobs', []):
-            # 初始化布隆过滤器
-            bf = ScalableBloomFilter(
-                initial_capacity=job.get('bloomfilter', {}).get('capacity', 10000),
-                error_rate=job.get('bloomfilter', {}).get('error_rate', 0.001)
+            # 初始化去重存储(默认为内存映射文件上的布隆过滤器,重启后保留)
+            self.bloom_filters[job['name']] = create_dedup_store(
+                job['name'], job.get('bloomfilter', {}), dedup_path
             )
-            self.bloom_filters[job['name']] = bf
+            # 模板在加载配置时编译一次,之后每个页面复用
+            try:
+                self.extraction_plans[job['name']] = ExtractionPlan(job.get('template', {}), job.get('parser'))
+            except Exception as e:
+                logger.error(f"编译任务模板失败 {job['name']}: {str(e)}")
+            self.link_extractors[job['name']] = LinkExtractor(job.get('scope', {}), job.get('url'))
+            if job.get('fingerprint'):
+                self.fingerprinters[job['name']] = ContentFingerprinter(job['fingerprint'])
             # 缓存job配置
             self.job_configs[job['name']] = job
 
+    def backend(self, method: str):
+        """返回抓取方式对应的后端,第一次使用时创建"""
+        backend = self.backends.get(method)
+        if backend is None:
+            factory = FETCH_BACKENDS.get(method)
+            if factory is None:
+                raise ValueError(f"不支持的抓取方法: {method}")
+            backend = self.backends[method] = factory(self.config)
+        return backend
+
+    @property
+    def session(self) -> RequestsClient:
+        """requests 客户端"""
+        return self.backend('requests')
+
+    @property
+    def http_client(self) -> AsyncHttpClient:
+        return self.backend('aiohttp')
+
+    @property
+    def selenium_pool(self) -> SeleniumPool:
+        return self.backend('selenium')
+
+    @property
+    def playwright_pool(self) -> PlaywrightPool:
+        return self.backend('playwright')
+
     async def initialize(self):  # 新增异步初始化方法
-        """异步初始化驱动"""
-        self.drivers = await self.async_init_drivers()
-
-    async def async_init_drivers(self) -> Dict:  # 改为异步方法
-        """异步初始化浏览器驱动"""
-        drivers = {
-            'selenium': None,
-            'playwright': None,
-            'browser': None
-        }
-        try:
-            # 从配置中获取浏览器路径，如果未配置则使用默认值
-            chrome_path = self.config.get('browser', {}).get('chrome_path')
-            # 配置Selenium Chrome选项
-            chrome_options = webdriver.ChromeOptions()
-            chrome_options.add_argument('--headless')  # 启用无头模式
-            chrome_options.add_argument('--disable-gpu')  # 禁用GPU加速
-            if chrome_path:
-                chrome_options.binary_location = chrome_path
-            
-            # 初始化Selenium Chrome驱动
-            drivers['selenium'] = webdriver.Chrome(options=chrome_options)
-            
-            # 使用 async with 管理生命周期
-            async with async_playwright() as playwright:
-                drivers['playwright'] = playwright
-                # 配置Playwright浏览器选项
-                browser = await playwright.chromium.launch(
-                    headless=True,  # 启用无头模式
-                    executable_path=chrome_path if chrome_path else None  # 如果配置了路径则使用
-                )
-                drivers['browser'] = browser
-        except Exception as e:
-            logger.error(f"浏览器驱动初始化失败: {str(e)}")
-        return drivers
-    async def process_url(self, url: str, job_name: str, current_depth: int = 0) -> Tuple[Dict, List[str]]:
+        """
+        预先创建并启动配置中的任务用到的抓取后端(如浏览器),并记录各自的耗时;
+        没有任务使用的后端不会被导入或启动,不调用时各后端在第一次使用时创建
+        """
+        methods = sorted({job.get('method', 'requests') for job in self.job_configs.values()})
+        for method in methods:
+            started = time.perf_counter()
+            try:
+                backend = self.backend(method)
+                start = getattr(backend, 'start', None)
+                if start is not None:
+                    await start()
+            except Exception as e:
+                logger.error(f"抓取后端 {method} 启动失败: {str(e)}")
+                continue
+            logger.info(f"抓取后端 {method} 已就绪, 耗时 {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    async def process_url(self, url: str, job_name: str, current_depth: int = 0,
+                          replay: bool = False) -> Tuple[Dict, List[str]]:
         """
         处理一个URL并返回抓取结果及子链接
         :param url: 目标URL
         :param job_name: 任务名称
         :param current_depth: 当前爬取深度
+        :param replay: 为True时只从存档读取页面,不论job的存档模式如何
         :return: (数据结果, 新发现的链接列表)
         """
         # 初始化返回结果
         result = {}
         new_links = []
         try:
-            job_config = self.job_configs.get(job_name)
-            if not job_config:
-                logger.error(f"job_config 未找到: {job_name}")
-                return result, new_links
-            template = job_config.get('template', {})  # 修改: 使用 get 方法避免 KeyError
-            if not template:
-                logger.error(f"job_config 缺少 'template' 键: {job_name}")
+            job_config = self._job_config(job_name)
+            if job_config is None:
                 return result, new_links
+            if self._streams(job_name, job_config, replay):
+                # 大型JSON接口: 边下载边解析,逐条写入存储
+                plan = self.extraction_plans[job_name]
+                return await self._process_stream(url, job_name, job_config, plan), new_links
+            task = PageTask(url, job_name, current_depth)
             # 获取页面内容
-            html, content_type = await self.fetch(url, job_config.get('method', 'requests'))
-            if not html:
-                logger.warning(f"无法获取页面内容: {url}")
-                return result, new_links
-            # 处理数据
-            processor = DataProcessor(self, url, job_name, html, content_type, template, self.storage)
-            result = await processor.process()
-            # 如果需要爬取子链接且未达到最大深度
-            max_depth = job_config.get('max_depth', 1)
-            if current_depth < max_depth:
-                # 提取子链接
-                links_config = template.get('links', {})
-                if links_config:
-                    soup = BeautifulSoup(html, 'html.parser')
-                    link_elements = soup.select(links_config.get('selector', 'a[href]'))
-                    for element in link_elements:
-                        href = element.get('href')
-                        if href:
-                            # 转换为绝对URL
-                            absolute_url = urljoin(url, href)
-                            # 检查是否已经爬取过
-                            if absolute_url not in self.bloom_filters[job_name]:
-                                self.bloom_filters[job_name].add(absolute_url)
-                                new_links.append(absolute_url)
+            task.fetched = await self._fetch(url, job_config.get('method', 'requests'), job_name, replay, task)
+            skipped = await self._prepare_page(task, job_config, replay)
+            if skipped is not None:
+                return skipped, new_links
+            result = await task.processor.process()
+            if result:
+                # 处理成功后才记录指纹和缓存校验信息,失败的页面下次仍会重新抓取和处理
+                await self._remember_page(task)
+            new_links = self._discover_links(task)
         except Exception as e:
-            logger.error(f"处理URL时发生错误 {url}: {str(e)}")
+            sampled_log.error('process_failed', f"处理URL时发生错误 {url}: {str(e)}")
         return result, new_links
-    async def fetch(self, url: str, method: str = 'requests') -> Tuple[Optional[str], Optional[str]]:
+
+    def _job_config(self, job_name: str) -> Optional[Dict]:
+        """返回job配置;job不存在或没有模板时记录错误并返回 None"""
+        job_config = self.job_configs.get(job_name)
+        if not job_config:
+            logger.error(f"job_config 未找到: {job_name}")
+            return None
+        if not job_config.get('template', {}):  # 修改: 使用 get 方法避免 KeyError
+            logger.error(f"job_config 缺少 'template' 键: {job_name}")
+            return None
+        return job_config
+
+    def _streams(self, job_name: str, job_config: Dict, replay: bool = False) -> bool:
+        """该job是否以流式方式处理;回放存档时总是读取完整响应"""
+        return (bool(job_config.get('stream')) and job_name in self.extraction_plans
+                and not self._replays(job_name, replay))
+
+    async def _prepare_page(self, task: PageTask, job_config: Dict, replay: bool = False) -> Optional[Dict]:
+        """
+        为抓取到的页面创建 DataProcessor
+        :return: 页面不需要提取时(未获取到、未变化)代替提取结果返回的字典,否则为 None
+        """
+        url, job_name, fetched = task.url, task.job_name, task.fetched
+        if fetched is not None and fetched.status == 304:
+            # 页面自上次抓取后未变化,数据已经保存过,跳过解析与存储
+            return self._unchanged(url, job_name)
+        html = fetched.text if fetched is not None else None
+        if not html:
+            sampled_log.warning('empty_page', f"无法获取页面内容: {url}")
+            return {}
+        template = job_config.get('template', {})
+        content_type = fetched.content_type
+        # 如果需要爬取子链接且未达到最大深度,链接在处理页面时一并提取
+        max_depth = job_config.get('max_depth', 1)
+        links_config = template.get('links', {})
+        task.follow_links = task.depth < max_depth and bool(links_config)
+        # 默认的 a[href] 直接从页面原文中提取,不经过DOM;自定义选择器才在解析页面时一并选出
+        if task.follow_links and links_config.get('selector', 'a[href]') not in ('a[href]', 'a'):
+            task.link_selector = links_config['selector']
+        # 页面只解析一次,字段提取与链接发现共用同一个DOM
+        page = Page(url, html, content_type, job_config.get('parser'))
+        # 内容指纹与上次相同的页面不再提取和存储
+        fingerprinter = self.fingerprinters.get(job_name)
+        if fingerprinter is not None and not self._replays(job_name, replay):
+            task.digest = fingerprinter.digest(page)
+            store = self._get_fingerprint_store()
+            if await asyncio.to_thread(store.is_unchanged, job_name, url, task.digest):
+                # 内容与上次处理成功时相同,新的校验信息可以直接记下
+                await self._commit_cache_entry(task)
+                return self._unchanged(url, job_name, task.digest)
+        task.processor = DataProcessor(self, url, job_name, html, content_type, template, self.storage, page,
+                                       self.extraction_plans.get(job_name), self.extraction_pool,
+                                       task.link_selector)
+        return None
+
+    def _discover_links(self, task: PageTask) -> List[str]:
+        """页面中尚未爬取过的子链接"""
+        if not task.follow_links:
+            return []
+        # 链接先规范化并按任务的范围规则过滤,再检查是否已经爬取过(新URL会被同时记录)
+        extractor = self.link_extractors[task.job_name]
+        base_url = task.fetched.url or task.url
+        if task.link_selector is None:
+            links = extractor.extract(task.fetched.text, base_url)
+        else:
+            links = extractor.filter(task.processor.hrefs, base_url)
+        dedup_store = self.bloom_filters[task.job_name]
+        new_links = [link for link in links if dedup_store.check_and_add(link)]
+        DEDUP_CHECKS.labels(task.job_name, 'new').inc(len(new_links))
+        DEDUP_CHECKS.labels(task.job_name, 'seen').inc(len(links) - len(new_links))
+        return new_links
+
+    async def _remember_page(self, task: PageTask):
+        """页面数据写入成功后记录其内容指纹与HTTP缓存的校验信息"""
+        if task.digest is not None:
+            await asyncio.to_thread(self.fingerprint_store.update, task.job_name, task.url, task.digest)
+        await self._commit_cache_entry(task)
+
+    async def _commit_cache_entry(self, task: PageTask):
+        """把抓取时暂存的响应写入HTTP缓存"""
+        entry, task.cache_entry = task.cache_entry, None
+        if entry is not None:
+            await asyncio.to_thread(self.http_cache.store, task.url, entry)
+
+    async def _process_stream(self, url: str, job_name: str, job_config: Dict, plan: ExtractionPlan,
+                              task: Optional[PageTask] = None) -> Dict:
+        """
+        流式抓取并处理JSON响应,内存占用与响应大小无关
+        只支持 aiohttp 抓取方式和以 $.key[*] 形式选择行的模板;重试只发生在写入第一条记录之前
+        传入 task 时失败原因记录在 task 上,供抓取队列决定何时重试
+        """
+        if job_config.get('method') != 'aiohttp' or plan.stream_prefix is None:
+            logger.error(f"任务 {job_name} 无法流式处理: 需要 aiohttp 抓取方式和 $.key[*] 形式的行选择器")
+            return {}
+        processor = DataProcessor(self, url, job_name, '', 'application/json', job_config.get('template', {}),
+                                  self.storage, plan=plan)
+        headers = self.config.get('headers', {})
+
+        async def attempt():
+            async with self.politeness.slot(url, job_name):
+                async with self.http_client.open(url, headers, stream=True) as response:
+                    FETCH_RESPONSES.labels(host_label(url), 'aiohttp', response.status).inc()
+                    processor.content_type = response.headers.get('content-type', '')
+                    return await processor.process_stream(response.content)
+
+        try:
+            return await self.resilience.call(
+                url, attempt, lambda seconds: self.politeness.defer(url, seconds)
+            )
+        except CircuitOpenError as e:
+            logger.debug(f"跳过 {url}: {str(e)}")
+            self._note_failure(task, e)
+        except Exception as e:
+            sampled_log.error('stream_failed', f"流式处理失败 {url}: {str(e)}")
+            self._note_failure(task, e)
+        return {}
+
+    def _note_failure(self, task: Optional[PageTask], error: Exception):
+        """在页面上记下抓取失败的原因: 熔断中未发出请求,或重试也不会成功的错误"""
+        if task is None:
+            return
+        if isinstance(error, CircuitOpenError):
+            task.retry_in = error.retry_in
+        elif not self.resilience.classify(error)[0]:
+            task.permanent = True
+
+    def _unchanged(self, url: str, job_name: str, digest: Optional[bytes] = None) -> Dict:
+        """页面未变化时代替提取结果返回的标记"""
+        logger.debug(f"页面未变化: {url}")
+        meta = {'url': url, 'job_name': job_name, 'timestamp': datetime.now().isoformat()}
+        if digest is not None:
+            meta['fingerprint'] = digest.hex()
+        return {'unchanged': True, '_meta': meta}
+
+    def _get_fingerprint_store(self) -> FingerprintStore:
+        """延迟创建内容指纹索引"""
+        if self.fingerprint_store is None:
+            self.fingerprint_store = FingerprintStore(
+                self.config.get('fingerprint', {}).get('path', 'data/fingerprints.db')
+            )
+        return self.fingerprint_store
+
+    def _get_frontier(self) -> CrawlFrontier:
+        """延迟创建抓取队列,只用 process_url 的部署不会产生队列文件"""
+        if self.frontier is None:
+            frontier_config = self.config.get('frontier', {})
+            self.frontier = CrawlFrontier(
+                frontier_config.get('path', 'data/frontier.db'),
+                frontier_config.get('shards', 1),
+                frontier_config.get('recover', True)
+            )
+        return self.frontier
+
+    async def crawl(self, job_name: str, resume: bool = True) -> int:
+        """
+        以job的种子URL为起点,借助持久化队列按深度抓取整个站点
+        :param job_name: 任务名称
+        :param resume: 队列中有上次未完成的URL时是否从断点继续;为False时重新从种子开始
+        :return: 本次处理的URL数量
+        """
+        job_config = self.job_configs.get(job_name)
+        if not job_config:
+            logger.error(f"job_config 未找到: {job_name}")
+            return 0
+        frontier = self._get_frontier()
+        frontier_config = self.config.get('frontier', {})
+        batch_size = frontier_config.get('batch_size', 50)
+        checkpoint_every = frontier_config.get('checkpoint_batches', 20)
+
+        if not resume:
+            # 队列与去重记录一起清空,否则种子页面上的链接都会被当作已发现过
+            await asyncio.to_thread(frontier.clear, job_name)
+            await asyncio.to_thread(self.bloom_filters[job_name].clear)
+        if not resume or not await asyncio.to_thread(frontier.pending, job_name):
+            await asyncio.to_thread(frontier.seed, job_name, job_config['url'])
+        else:
+            logger.info(f"任务 {job_name} 从断点继续抓取")
+
+        # URL经 抓取 -> 解析 -> 存储 流水线处理,各阶段之间的队列有界
+        pipeline = self.pipelines[job_name] = CrawlPipeline(self, self.config)
+        try:
+            processed = await pipeline.crawl(job_name, frontier, batch_size, batch_size * checkpoint_every)
+        finally:
+            del self.pipelines[job_name]
+        await asyncio.to_thread(frontier.checkpoint)
+        logger.info(f"任务 {job_name} 抓取完成, 共处理 {processed} 个URL")
+        return processed
+
+    async def crawl_shard(self, job_name: str, shard: int, poll_interval: float = 0.5) -> int:
+        """
+        多进程模式下工作进程的抓取: 只领取队列中属于本分片的URL,种子与断点恢复由协调进程负责,
+        全部分片都没有待抓取的URL时返回
+        :param job_name: 任务名称
+        :param shard: 本进程负责的分片
+        :param poll_interval: 本分片暂时为空时的轮询间隔
+        :return: 本进程处理的URL数量
+        """
+        if job_name not in self.job_configs:
+            logger.error(f"job_config 未找到: {job_name}")
+            return 0
+        frontier = self._get_frontier()
+        frontier_config = self.config.get('frontier', {})
+        batch_size = frontier_config.get('batch_size', 50)
+        checkpoint_every = frontier_config.get('checkpoint_batches', 20)
+        pipeline = self.pipelines[job_name] = CrawlPipeline(self, self.config)
+        try:
+            processed = await pipeline.crawl(job_name, frontier, batch_size, batch_size * checkpoint_every,
+                                             shard, poll_interval)
+        finally:
+            del self.pipelines[job_name]
+        logger.info(f"任务 {job_name} 分片 {shard} 抓取完成, 共处理 {processed} 个URL")
+        return processed
+
+    def pipeline_stats(self) -> Dict:
+        """正在运行的各流水线的队列深度与各阶段利用率"""
+        return {job_name: pipeline.stats() for job_name, pipeline in self.pipelines.items()}
+
+    async def reextract(self, job_name: str) -> int:
+        """
+        用存档中的响应重新执行job的提取与存储,不发出任何网络请求
+        用于修改模板后回填数据;启用解析进程池时多个页面并行解析
+        :param job_name: 任务名称
+        :return: 处理的页面数量
+        """
+        job_config = self.job_configs.get(job_name)
+        if not job_config:
+            logger.error(f"job_config 未找到: {job_name}")
+            return 0
+        archive = self._get_archive()
+        batch_size = self.config.get('archive', {}).get('batch_size', 200)
+        # 达到最大深度的页面不再发现子链接,只做提取
+        depth = job_config.get('max_depth', 1)
+        processed = 0
+        batches = archive.urls(job_name, batch_size)
+        while True:
+            urls = await asyncio.to_thread(next, batches, None)
+            if urls is None:
+                break
+            # 只有这些调用从存档回放,同时进行的该job的正常抓取不受影响
+            await asyncio.gather(*(self.process_url(url, job_name, depth, replay=True) for url in urls))
+            processed += len(urls)
+        logger.info(f"任务 {job_name} 重新提取完成, 共 {processed} 个页面")
+        return processed
+
+    def _archive_mode(self, job_name: Optional[str]) -> Optional[str]:
+        """job的存档模式: 'record'、'replay' 或 None;job的 archive 设置优先于全局的 mode"""
+        mode = self.job_configs.get(job_name, {}).get('archive', self.config.get('archive', {}).get('mode'))
+        if mode is True:
+            return 'record'
+        return mode if mode in ('record', 'replay') else None
+
+    def _replays(self, job_name: Optional[str], replay: bool = False) -> bool:
+        """本次处理是否从存档读取页面: 调用方明确要求回放,或job处于回放模式"""
+        return replay or self._archive_mode(job_name) == 'replay'
+
+    def _get_archive(self) -> ResponseArchive:
+        """延迟创建响应存档"""
+        if self.archive is None:
+            archive_config = self.config.get('archive', {})
+            self.archive = ResponseArchive(
+                archive_config.get('path', 'data/archive'),
+                archive_config.get('segment_mb', 256) * 1024 * 1024,
+                archive_config.get('compression', 'gzip')
+            )
+        return self.archive
+
+    def _get_http_cache(self, job_name: Optional[str]) -> Optional[HttpCache]:
+        """返回该job使用的HTTP缓存;job的 http_cache 设置优先于全局的 enabled"""
+        cache_config = self.config.get('http_cache', {})
+        enabled = self.job_configs.get(job_name, {}).get('http_cache', cache_config.get('enabled', False))
+        if not enabled:
+            return None
+        if self.http_cache is None:
+            self.http_cache = HttpCache(
+                cache_config.get('path', 'data/http_cache.db'),
+                cache_config.get('max_bytes', 256 * 1024 * 1024),
+                cache_config.get('max_entry_bytes', 8 * 1024 * 1024)
+            )
+        return self.http_cache
+
+    async def fetch(self, url: str, method: str = 'requests',
+                    job_name: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
         """
         获取页面内容
         :param url: 目标URL
-        :param method: 抓取方法 ('requests', 'selenium', 'playwright')
-        :return: (页面内容, 内容类型)
+        :param method: 抓取方法 ('requests', 'aiohttp', 'selenium', 'playwright')
+        :param job_name: 任务名称,用于选择该job的礼貌策略
+        :return: (页面内容, 内容类型);页面未变化(304)时返回缓存的内容
         """
+        result = await self._fetch(url, method, job_name)
+        if result is None:
+            return None, None
+        return result.text, result.content_type
+
+    async def _fetch(self, url: str, method: str, job_name: Optional[str],
+                     replay: bool = False, task: Optional[PageTask] = None) -> Optional[FetchResult]:
+        """
+        获取页面,返回完整的抓取结果
+        可重试的错误按退避策略重试,连续失败的主机会被熔断,熔断期间直接返回 None 而不发出请求;
+        requests / aiohttp 方式在启用HTTP缓存时发送条件请求,页面未变化时结果的 status 为304。
+        传入 task 时新的响应只暂存在 task.cache_entry 中,页面处理成功后才写入缓存:
+        校验信息提前写入的话,处理失败的页面重试时会得到304而被当作未变化跳过;
+        抓取失败的原因也记录在 task 上
+        """
+        archive_mode = 'replay' if replay else self._archive_mode(job_name)
+        if archive_mode == 'replay':
+            # 回放模式: 只读存档,不发出请求
+            result = await asyncio.to_thread(self._get_archive().lookup, job_name or '', url)
+            if result is None:
+                sampled_log.warning('archive_missing', f"存档中没有该页面: {url}")
+            return result
+        if method not in FETCH_BACKENDS:
+            logger.error(f"不支持的抓取方法: {method}")
+            return None
         try:
-            if method == 'requests':
-                async with self.semaphore:
-                    headers = self.config.get('headers', {})
-                    response = self.session.get(url, headers=headers, timeout=30)
-                    response.raise_for_status()
-                    content_type = response.headers.get('content-type', '')
-                    return response.text, content_type
-            elif method == 'selenium':
-                if not self.drivers.get('selenium'):
-                    logger.error("Selenium驱动未初始化")
-                    return None, None
-                async with self.semaphore:
-                    self.drivers['selenium'].get(url)
-                    html = self.drivers['selenium'].page_source
-                    return html, 'text/html'
-            elif method == 'playwright':
-                if not self.drivers.get('browser'):
-                    logger.error("Playwright浏览器未初始化")
-                    return None, None
-                async with self.semaphore:
-                    page = await self.drivers['browser'].new_page()
-                    try:
-                        await page.goto(url)
-                        html = await page.content()
-                        return html, 'text/html'
-                    finally:
-                        await page.close()
-            else:
-                logger.error(f"不支持的抓取方法: {method}")
-                return None, None
+            cache = self._get_http_cache(job_name) if method in ('requests', 'aiohttp') else None
+            headers = self.config.get('headers', {})
+            if cache is not None:
+                validators = await asyncio.to_thread(cache.validators, url)
+                if validators:
+                    headers = {**headers, **validators}
+            result = await self.resilience.call(
+                url,
+                lambda: self._fetch_once(url, method, job_name, headers),
+                lambda seconds: self.politeness.defer(url, seconds)
+            )
+            if cache is not None:
+                if result.status == 304:
+                    result = await asyncio.to_thread(cache.revalidated, url, result)
+                elif cache.miss(result):
+                    if task is not None:
+                        task.cache_entry = result
+                    else:
+                        await asyncio.to_thread(cache.store, url, result)
+            if archive_mode == 'record' and result.status != 304:
+                await asyncio.to_thread(self._get_archive().record, job_name or '', url, result)
+            return result
+        except CircuitOpenError as e:
+            logger.debug(f"跳过 {url}: {str(e)}")
+            self._note_failure(task, e)
+            return None
         except Exception as e:
-            logger.error(f"获取页面内容失败 {url}: {str(e)}")
-            return None, None
-    def parse(self, html: str, selectors: Dict) -> Dict:
+            sampled_log.error('fetch_failed', f"获取页面内容失败 {url}: {str(e)}")
+            self._note_failure(task, e)
+            return None
+
+    async def _fetch_once(self, url: str, method: str, job_name: Optional[str],
+                          headers: Dict[str, str]) -> FetchResult:
+        """在主机的并发槽位内执行一次抓取,失败时抛出异常"""
+        async with self.politeness.slot(url, job_name):
+            started = time.perf_counter()
+            try:
+                result = await self._request(url, method, job_name, headers)
+            except Exception as e:
+                self._observe_fetch(url, method, started, error=e)
+                raise
+            self._observe_fetch(url, method, started, result)
+            return result
+
+    @staticmethod
+    def _observe_fetch(url: str, method: str, started: float, result: Optional[FetchResult] = None,
+                       error: Optional[BaseException] = None):
+        """记录一次抓取的耗时、状态码与响应大小"""
+        host = host_label(url)
+        FETCH_SECONDS.labels(host, method).observe(time.perf_counter() - started)
+        if result is not None:
+            FETCH_RESPONSES.labels(host, method, result.status or 200).inc()
+            FETCH_BYTES.labels(host, method).inc(len(result.content or b''))
+            return
+        # HTTP错误带有状态码,其余按超时或错误归类
+        status = getattr(error, 'status', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+        FETCH_RESPONSES.labels(host, method, status or classify_exception(error)).inc()
+
+    async def _request(self, url: str, method: str, job_name: Optional[str],
+                       headers: Dict[str, str]) -> FetchResult:
+        """用指定的抓取方式发出请求"""
+        if method == 'requests':
+            return await self.session.get(url, headers=headers)
+        if method == 'aiohttp':
+            return await self.http_client.get(url, headers=headers)
+        if method == 'selenium':
+            html = await self.selenium_pool.fetch(url)
+        else:
+            # 任务可以通过 block_resources 屏蔽图片、字体等资源,未设置时使用池的默认值
+            block_resources = self.job_configs.get(job_name, {}).get('block_resources')
+            html = await self.playwright_pool.fetch(url, block_resources)
+        return FetchResult(url, content=html, content_type='text/html')
+
+    def parse(self, html: str, selectors: Dict, parser: Optional[str] = None) -> Dict:
         """
         解析HTML内容
         :param html: HTML内容
         :param selectors: 选择器配置
+        :param parser: 解析后端名称
         :return: 解析结果
         """
-        soup = BeautifulSoup(html, 'html.parser')
+        page = Page('', html, 'text/html', parser)
         result = {}
         for key, selector in selectors.items():
-            elements = soup.select(selector)
-            result[key] = [element.get_text(strip=True) for element in elements]
+            elements = page.select(selector)
+            result[key] = [page.backend.text(element) for element in elements]
         return result
     async def close(self):
         """关闭所有驱动实例"""
         try:
-            if self.drivers.get('selenium'):
-                self.drivers['selenium'].quit()
-            if self.drivers.get('browser'):
-                await self.drivers['browser'].close()
-            if self.session:
-                self.session.close()
+            for backend in self.backends.values():
+                closed = backend.close()
+                if inspect.isawaitable(closed):
+                    await closed
+            self.backends = {}
+            if self.frontier:
+                self.frontier.close()
+            if self.http_cache:
+                self.http_cache.close()
+            if self.fingerprint_store:
+                self.fingerprint_store.close()
+            if self.archive:
+                self.archive.close()
+            for dedup_store in self.bloom_filters.values():
+                dedup_store.close()
+            if self.extraction_pool:
+                self.extraction_pool.close()
         except Exception as e:
             logger.error(f"关闭驱动实例时发生错误: {str(e)}")
\ No newline at end of file
@@ -1,29 +1,31 @@
 
-import asyncio  # 导入 asyncio 模块
-import threading
+import inspect
 import logging
-import json
-import jsonpath
-from bs4 import BeautifulSoup
-from core.storage.data_storage import DataStorage
+import time
+from core.crawl.page import Page
+from core.crawl.extraction import CompiledField, ExtractionPlan
+from core.monitor.log_sampler import LogSampler
+from core.monitor.metrics import EXTRACT_SECONDS, RECORDS
 from datetime import datetime
 # 获取日志记录器
 logger = logging.getLogger(__name__)
+# 每个页面都可能出现的日志按类别限流
+sampled_log = LogSampler(logger)
 
 class DataProcessor:
     """
     DataProcessor类负责处理HTML数据，解析并提取所需信息，并将结果存储到指定的存储中。
 
     属性:
-    - soup: 用于解析HTML的BeautifulSoup对象。
+    - page: 共享的页面对象,字段提取和链接发现共用其中的DOM。
+    - soup: 页面DOM根节点(由页面的解析后端生成)。
     - template: 包含选择器和过滤规则的模板。
+    - plan: 由模板编译得到的提取计划。
     - storage: 用于存储提取数据的存储对象。
-    - queue: 存储待处理任务的队列。
-    - lock: 线程锁，用于同步对队列的访问。
-    - thread: 后台线程，用于处理队列中的任务。
     """
 
-    def __init__(self,crawler,request,jobname,content, content_type, template, storage):
+    def __init__(self,crawler,request,jobname,content, content_type, template, storage, page=None, plan=None,
+                 pool=None, link_selector=None):
         """
         初始化DataProcessor对象。
 
@@ -32,27 +34,34 @@ class DataProcessor:
         - content_type: 内容类型（text/html或application/json）。
         - template: 包含选择器和过滤规则的模板。
         - storage: 用于存储提取数据的存储对象。
+        - page: 已创建的页面对象;传入时直接复用其解析结果,不再重复解析。
+        - plan: job加载时编译好的提取计划;未传入时根据模板现场编译。
+        - pool: 解析进程池;传入时页面在工作进程中解析和提取,事件循环线程不做解析。
+        - link_selector: 需要发现子链接时的选择器,结果保存在 hrefs 中。
         """
         self.crawler = crawler
         self.request = request
         self.job_name = jobname
         self.content_type = content_type
-        if content_type and 'json' in content_type.lower():
-            try:
-                self.data = json.loads(content)
-                self.soup = None
-            except json.JSONDecodeError:
-                logger.error("JSON解析失败，尝试作为HTML处理")
-                self.soup = BeautifulSoup(content, 'html.parser')
-                self.data = None
-        else:
-            self.soup = BeautifulSoup(content, 'html.parser')
-            self.data = None
+        self.page = page or Page(request, content, content_type)
+        self.backend = self.page.backend
         self.template = template
+        self.plan = plan or ExtractionPlan(template, self.backend.name)
         self.storage = storage
-        self.queue = asyncio.Queue()  # 使用 asyncio.Queue
-        self.lock = asyncio.Lock()  # 使用 asyncio.Lock
-        self.task = None  # 用于存储异步任务
+        self.pool = pool
+        self.link_selector = link_selector
+        self.hrefs = []  # 页面中发现的原始链接
+        self._records_metric = RECORDS.labels(jobname)
+
+    @property
+    def data(self):
+        """JSON数据(按需解析)"""
+        return self.page.data
+
+    @property
+    def soup(self):
+        """页面DOM根节点(按需解析)"""
+        return self.page.document
 
     def get_attribute(self, selector, data, attr):
         """
@@ -60,21 +69,13 @@ class DataProcessor:
 
         参数:
         - selector: CSS选择器或JSONPath表达式。
-        - data: 数据源（BeautifulSoup对象或JSON数据）。
+        - data: 数据源（DOM根节点或JSON数据）。
         - attr: 属性名。
 
         返回:
         - 属性值列表。
         """
-        if self.soup:
-            elements = self.soup.select(selector)
-            return [element.get(attr) for element in elements if element.get(attr)]
-        elif self.data:
-            # 使用JSONPath处理JSON数据
-            matches = jsonpath.jsonpath(self.data, selector)
-            if matches:
-                return [item.get(attr) if isinstance(item, dict) else None for item in matches]
-        return []
+        return self._field(selector, {'attr': attr}).extract(self.page)
 
     def filter(self, selector, filters):
         """
@@ -82,120 +83,182 @@ class DataProcessor:
 
         参数:
         - selector: CSS选择器或JSONPath表达式。
-        - filters: 过滤规则字典。
+        - filters: 过滤规则字典（regex、exclude、min_length、max_length）。
 
         返回:
         - 过滤后的结果列表。
         """
-        # 这里可以实现各种过滤逻辑
-        # 例如：文本长度过滤、正则表达式匹配等
-        return []
+        return self._field(selector, {'filters': filters}).extract(self.page)
+
+    def _field(self, selector, options):
+        """为临时选择器编译单个字段"""
+        return CompiledField('_', dict(options, selector=selector), self.backend)
 
     def get_dataBySelector(self, source, selector_config):
         """
         根据选择器配置从数据源中提取数据。
 
         参数:
-        - source: 数据源（BeautifulSoup对象或JSON数据）。
+        - source: 数据源（DOM根节点或JSON数据）。
         - selector_config: 选择器配置字典。
 
         返回:
         - 提取的数据字典。
         """
-        result = {}
-        
-        for field_name, config in selector_config.items():
-            if isinstance(config, str):
-                # 简单选择器
-                selector = config
-                if self.soup:
-                    elements = self.soup.select(selector)
-                    result[field_name] = [element.get_text(strip=True) for element in elements]
-                elif self.data:
-                    matches = jsonpath.jsonpath(self.data, selector)
-                    result[field_name] = matches if matches else []
-            elif isinstance(config, dict):
-                # 复杂选择器配置
-                selector = config.get('selector', '')
-                attr = config.get('attr')
-                filters = config.get('filters', {})
-                
-                if self.soup:
-                    elements = self.soup.select(selector)
-                    if attr:
-                        values = [element.get(attr) for element in elements if element.get(attr)]
-                    else:
-                        values = [element.get_text(strip=True) for element in elements]
-                    
-                    # 应用过滤器
-                    if filters:
-                        # 实现过滤逻辑
-                        pass
-                    
-                    result[field_name] = values
-                elif self.data:
-                    matches = jsonpath.jsonpath(self.data, selector)
-                    if matches:
-                        if attr:
-                            values = [item.get(attr) if isinstance(item, dict) else None for item in matches]
-                            values = [v for v in values if v is not None]
-                        else:
-                            values = matches
-                        
-                        # 应用过滤器
-                        if filters:
-                            # 实现过滤逻辑
-                            pass
-                        
-                        result[field_name] = values
-                    else:
-                        result[field_name] = []
-        
-        return result
-
-    async def _process_queue(self):
-        """异步处理队列中的任务"""
-        while True:
-            item = await self.queue.get()
-            if item is None:
-                break
-            # 处理队列项
-            self.queue.task_done()
+        if selector_config is self.template.get('selectors'):
+            plan = self.plan
+        else:
+            plan = ExtractionPlan({'selectors': selector_config}, self.backend.name)
+        return plan.extract(self.page)
 
     async def process(self):
         """
         异步处理数据并返回结果。
 
+        按行提取的模板会逐条产出记录并直接写入存储,不在内存中构建整页的结果列表,
+        此时返回值只包含记录数与元数据。启用解析进程池时,解析与提取在工作进程中完成,
+        记录按页面中的顺序返回并编号。
+
         返回:
         - 处理后的数据字典。
         """
         try:
-            # 根据模板提取数据
-            selectors = self.template.get('selectors', {})
-            result = self.get_dataBySelector(self.soup or self.data, selectors)
-            
-            # 添加元数据
-            result['_meta'] = {
-                'url': self.request,
-                'job_name': self.job_name,
-                'timestamp': datetime.now().isoformat(),
-                'content_type': self.content_type
-            }
-            
+            meta = self._meta()
+            started = time.perf_counter()
+            kind, extracted = await self._extract(meta)
+            if kind == 'records':
+                count = 0
+                for record in self._timed(extracted, started):
+                    await self._store(record)
+                    count += 1
+                return {'records': count, '_meta': meta}
+            EXTRACT_SECONDS.labels(self.job_name).observe(time.perf_counter() - started)
             # 存储数据
-            if self.storage:
-                await self.storage.save(result, self.job_name)
-            
-            return result
+            await self._store(extracted)
+            return extracted
         except Exception as e:
-            logger.error(f"数据处理失败: {str(e)}")
+            sampled_log.error('process_failed', f"数据处理失败 {self.request}: {str(e)}")
             return {}
 
-    async def close(self):
-        """关闭处理器并清理资源"""
-        if self.task:
-            self.task.cancel()
-            try:
-                await self.task
-            except asyncio.CancelledError:
-                pass
\ No newline at end of file
+    async def extract(self):
+        """
+        解析页面并提取数据,但不写入存储;抓取流水线用它把写入交给单独的存储阶段。
+        解析失败时抛出异常。
+
+        返回:
+        - (结果, 待写入记录的迭代器): 按行提取时记录在迭代时才逐条生成,
+          结果中的记录数随迭代累加,迭代结束后才是整页的记录数。
+        """
+        meta = self._meta()
+        started = time.perf_counter()
+        kind, extracted = await self._extract(meta)
+        if kind == 'records':
+            result = {'records': 0, '_meta': meta}
+            return result, self._counted(self._timed(extracted, started), result)
+        EXTRACT_SECONDS.labels(self.job_name).observe(time.perf_counter() - started)
+        return extracted, iter([extracted])
+
+    @staticmethod
+    def _counted(records, result):
+        """逐条产出记录,同时累加结果中的记录数"""
+        for record in records:
+            result['records'] += 1
+            yield record
+
+    def release(self):
+        """记录全部取出后释放页面及其DOM,之后只能调用 store"""
+        self.page = None
+
+    async def store(self, records):
+        """写入 extract 返回的记录"""
+        for record in records:
+            await self._store(record)
+
+    async def _extract(self, meta):
+        """
+        解析与提取,结果都已附加元数据
+
+        返回:
+        - ('records', 记录迭代器) 或 ('result', 字段字典)
+        """
+        if self.pool is not None:
+            kind, extracted, self.hrefs = await self.pool.extract(
+                self.plan, self.request, self.page.content, self.content_type, self.link_selector
+            )
+            if kind == 'records':
+                return kind, self._with_meta(extracted, meta)
+        else:
+            if self.link_selector and self.soup is not None:
+                values = (self.backend.attr(node, 'href') for node in self.page.select(self.link_selector))
+                self.hrefs = [href for href in values if href]
+            if self.plan.is_row_based:
+                return 'records', self._with_meta(self.plan.iter_records(self.page), meta)
+            # 根据模板提取数据
+            selectors = self.template.get('selectors', {})
+            extracted = self.get_dataBySelector(self.soup if self.soup is not None else self.data, selectors)
+        # 添加元数据
+        extracted['_meta'] = meta
+        return 'result', extracted
+
+    async def process_stream(self, stream):
+        """
+        流式处理JSON响应: 按行选择器边读取边解析,每解析出一条记录立即写入存储。
+
+        参数:
+        - stream: 提供异步 read(n) 方法的响应体,如 aiohttp 响应的 content。
+
+        返回:
+        - 记录数与元数据;读取中途出错时已写入的记录保留,结果中 incomplete 为真。
+          尚未写入任何记录时出错则抛出异常,由调用方决定是否重试。
+        """
+        meta = self._meta()
+        count = 0
+        try:
+            async for record in self.plan.aiter_json_records(stream):
+                record['_meta'] = dict(meta, index=count)
+                await self._store(record)
+                count += 1
+        except Exception as e:
+            if count == 0:
+                raise
+            logger.error(f"流式处理在第 {count} 条记录后中断 {self.request}: {str(e)}")
+            return {'records': count, 'incomplete': True, '_meta': meta}
+        return {'records': count, '_meta': meta}
+
+    def _meta(self):
+        """每条记录携带的页面元数据"""
+        return {
+            'url': self.request,
+            'job_name': self.job_name,
+            'timestamp': datetime.now().isoformat(),
+            'content_type': self.content_type
+        }
+
+    def _timed(self, records, started):
+        """逐条产出记录,提取耗时只计入生成记录的时间,不含写入存储"""
+        elapsed = time.perf_counter() - started
+        records = iter(records)
+        while True:
+            resumed = time.perf_counter()
+            record = next(records, None)
+            elapsed += time.perf_counter() - resumed
+            if record is None:
+                break
+            yield record
+        EXTRACT_SECONDS.labels(self.job_name).observe(elapsed)
+
+    @staticmethod
+    def _with_meta(records, meta):
+        """逐条为记录附加页面元数据及其在页面中的行号"""
+        for index, record in enumerate(records):
+            record['_meta'] = dict(meta, index=index)
+            yield record
+
+    async def _store(self, record):
+        """写入一条数据,兼容同步与异步的存储实现"""
+        if not self.storage:
+            return
+        saved = self.storage.save(self.job_name, record)
+        if inspect.isawaitable(saved):
+            await saved
+        self._records_metric.inc()
@@ -0,0 +1,426 @@
+import hashlib
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl  # 仅在类Unix系统上可用,用于多进程之间的文件锁
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+# 文件头: 魔数(4) 版本(4) 槽位/比特数(8) 哈希个数(4) 保留(4) 元素个数(8) 保留(32)
+_HEADER = struct.Struct('<4sIQIIQ32x')
+_HEADER_SIZE = _HEADER.size
+_BLOOM_MAGIC = b'HBLM'
+_SET_MAGIC = b'HSET'
+_VERSION = 1
+_KEY_SIZE = 16  # 精确集合中每个槽位保存16字节(128位)摘要
+_EMPTY_KEY = bytes(_KEY_SIZE)
+_COUNT_OFFSET = 24  # 元素个数在文件头中的偏移
+_SLICES_OFFSET = 20  # 布隆过滤器: 位数组段数(旧文件中为0,即只有一段)
+_BLOOM_PARAMS = struct.Struct('<Qd')  # 布隆过滤器: 首段容量、总误判率,位于文件头保留区
+_BLOOM_PARAMS_OFFSET = 32
+DEFAULT_CAPACITY = 1000000
+
+
+class DedupStore:
+    """
+    基于内存映射文件的URL去重存储基类。
+
+    path 为空时使用匿名内存映射,状态只存在于当前进程;
+    shared 为 True 时每次写入都会加文件锁,允许多个工作进程共享同一个文件。
+    """
+
+    def __init__(self, path: Optional[str] = None, shared: bool = False):
+        self.path = path
+        self.shared = shared and fcntl is not None and path is not None
+        self._file = None
+        self.mm: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()
+
+    def _map(self, size: int, magic: bytes, slots: int, hashes: int, params: bytes = b''):
+        """
+        打开(必要时创建)映射文件,返回文件头中记录的 (槽位数, 哈希个数)
+        :param params: 新建文件时写入文件头保留区的参数
+        """
+        if self.path is None:
+            self.mm = mmap.mmap(-1, size)
+            _HEADER.pack_into(self.mm, 0, magic, _VERSION, slots, hashes, 0, 0)
+            self.mm[_BLOOM_PARAMS_OFFSET:_BLOOM_PARAMS_OFFSET + len(params)] = params
+            return slots, hashes
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._file = os.fdopen(fd, 'r+b')
+        with _FileLock(fd, True):
+            if os.fstat(fd).st_size < _HEADER_SIZE:
+                self._file.truncate(size)
+                self._file.seek(0)
+                header = bytearray(_HEADER.pack(magic, _VERSION, slots, hashes, 0, 0))
+                header[_BLOOM_PARAMS_OFFSET:_BLOOM_PARAMS_OFFSET + len(params)] = params
+                self._file.write(header)
+                self._file.flush()
+            self.mm = mmap.mmap(fd, 0)
+        file_magic, _, file_slots, file_hashes, _, _ = _HEADER.unpack_from(self.mm, 0)
+        if file_magic != magic:
+            raise ValueError(f"去重文件格式不匹配: {self.path}")
+        if file_slots != slots:
+            logger.info(f"去重文件 {self.path} 沿用已有容量 {file_slots},忽略配置值 {slots}")
+        return file_slots, file_hashes
+
+    def _file_lock(self):
+        """多进程共享时对整个文件加排他锁"""
+        return _FileLock(self._file.fileno() if self._file else None, self.shared)
+
+    @property
+    def count(self) -> int:
+        """已加入的元素个数"""
+        return struct.unpack_from('<Q', self.mm, _COUNT_OFFSET)[0]
+
+    def _incr_count(self):
+        struct.pack_into('<Q', self.mm, _COUNT_OFFSET, self.count + 1)
+
+    def __len__(self) -> int:
+        return self.count
+
+    @staticmethod
+    def _digest(url: str) -> bytes:
+        return hashlib.blake2b(url.encode('utf-8'), digest_size=_KEY_SIZE).digest()
+
+    def check_and_add(self, url: str) -> bool:
+        """
+        检查URL是否已存在,不存在则加入
+        :return: URL是否为新URL
+        """
+        raise NotImplementedError
+
+    def __contains__(self, url: str) -> bool:
+        raise NotImplementedError
+
+    def add(self, url: str) -> bool:
+        """加入URL,返回加入前是否不存在"""
+        return self.check_and_add(url)
+
+    def clear(self):
+        """清空全部URL(重新抓取整个站点时使用);不能在其他进程仍在使用同一文件时调用"""
+        raise NotImplementedError
+
+    def _reset(self, size: int):
+        """清空数据区并把映射调整为 size 字节,保留文件头中的参数(调用方持有锁)"""
+        header = self.mm[:_HEADER_SIZE]
+        self.mm.close()
+        if self._file is not None:
+            # 先截断再扩展,数据区全部为0
+            self._file.truncate(_HEADER_SIZE)
+            self._file.truncate(size)
+            self.mm = mmap.mmap(self._file.fileno(), 0)
+        else:
+            self.mm = mmap.mmap(-1, size)
+        self.mm[:_HEADER_SIZE] = header
+        struct.pack_into('<Q', self.mm, _COUNT_OFFSET, 0)
+
+    def flush(self):
+        """将映射内容同步到磁盘"""
+        if self.mm is not None and self.path is not None:
+            self.mm.flush()
+
+    def close(self):
+        """同步并关闭映射文件"""
+        if self.mm is not None:
+            self.flush()
+            self.mm.close()
+            self.mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class _FileLock:
+    """fcntl 文件锁的上下文管理器,未启用时不做任何事"""
+    __slots__ = ('fd', 'enabled')
+
+    def __init__(self, fd: Optional[int], enabled: bool):
+        self.fd = fd
+        self.enabled = enabled and fd is not None and fcntl is not None
+
+    def __enter__(self):
+        if self.enabled:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        if self.enabled:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN)
+
+
+def _bloom_geometry(capacity: int, error_rate: float, max_bytes: Optional[int] = None) -> Tuple[int, int]:
+    """容纳 capacity 个元素、误判率为 error_rate 的位数组所需的 (比特数, 哈希个数)"""
+    num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+    if max_bytes:
+        num_bits = min(num_bits, max_bytes * 8)
+    num_bits = max(64, num_bits)
+    return num_bits, max(1, round(num_bits / capacity * math.log(2)))
+
+
+class MmapBloomFilter(DedupStore):
+    """
+    可扩容的布隆过滤器,位数组保存在内存映射文件中。
+
+    第一段位数组按 capacity 和 error_rate 确定大小;加入的元素达到各段容量之和时,
+    在文件末尾追加一段容量翻倍、误判率减半的位数组(与 ScalableBloomFilter 的做法相同),
+    各段误判率之和不超过 error_rate。查询依次检查各段,新元素只写入最后一段。
+    指定 max_bytes 时位数组总大小不超过该值,达到上限后不再扩容,误判率随元素增多而升高。
+    """
+
+    GROWTH = 2        # 新一段的容量倍数
+    TIGHTENING = 0.5  # 新一段的误判率系数
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, error_rate: float = 0.001, path: Optional[str] = None,
+                 shared: bool = False, max_bytes: Optional[int] = None):
+        super().__init__(path, shared)
+        self.max_bytes = max_bytes
+        num_bits, num_hashes = _bloom_geometry(capacity, error_rate * self.TIGHTENING, max_bytes)
+        self.num_bits, self.num_hashes = self._map(
+            _HEADER_SIZE + (num_bits + 7) // 8, _BLOOM_MAGIC, num_bits, num_hashes,
+            _BLOOM_PARAMS.pack(capacity, error_rate)
+        )
+        self.capacity, self.error_rate = _BLOOM_PARAMS.unpack_from(self.mm, _BLOOM_PARAMS_OFFSET)
+        # 早期版本的文件没有记录容量,只能按单段使用
+        self.growable = self.capacity > 0
+        if not self.growable:
+            self.capacity, self.error_rate = capacity, error_rate
+        self._full = False  # 已达到 max_bytes 或无法扩容,不再尝试
+        self._load_slices()
+
+    def _load_slices(self):
+        """根据文件头计算各段的 (偏移, 比特数, 哈希个数, 累计容量)"""
+        count = struct.unpack_from('<I', self.mm, _SLICES_OFFSET)[0] or 1
+        self._slices = []
+        offset = _HEADER_SIZE
+        total = 0
+        for index in range(count):
+            if index == 0:
+                num_bits, num_hashes, capacity = self.num_bits, self.num_hashes, self.capacity
+            else:
+                capacity = self.capacity * self.GROWTH ** index
+                num_bits, num_hashes = _bloom_geometry(capacity, self.error_rate * self.TIGHTENING ** (index + 1))
+            total += capacity
+            self._slices.append((offset, num_bits, num_hashes, total))
+            offset += (num_bits + 7) // 8
+
+    def _sync_slices(self):
+        """其他进程追加了新的一段后重新映射"""
+        if (struct.unpack_from('<I', self.mm, _SLICES_OFFSET)[0] or 1) != len(self._slices):
+            self.mm.close()
+            self.mm = mmap.mmap(self._file.fileno(), 0)
+            self._load_slices()
+
+    @staticmethod
+    def _positions(digest: bytes, num_bits: int, num_hashes: int):
+        """双重哈希生成 num_hashes 个比特位置"""
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(num_hashes):
+            yield (h1 + i * h2) % num_bits
+
+    def _in_slice(self, digest: bytes, offset: int, num_bits: int, num_hashes: int) -> bool:
+        mm = self.mm
+        for pos in self._positions(digest, num_bits, num_hashes):
+            if not mm[offset + (pos >> 3)] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def __contains__(self, url: str) -> bool:
+        if self.shared:
+            self._sync_slices()
+        digest = self._digest(url)
+        return any(self._in_slice(digest, *position[:3]) for position in self._slices)
+
+    def check_and_add(self, url: str) -> bool:
+        digest = self._digest(url)
+        with self._lock, self._file_lock():
+            if self.shared:
+                self._sync_slices()
+            for position in self._slices[:-1]:
+                if self._in_slice(digest, *position[:3]):
+                    return False
+            # 最后一段边检查边写入: 所有比特都已置位说明URL已存在
+            mm = self.mm
+            offset, num_bits, num_hashes, total = self._slices[-1]
+            added = False
+            for pos in self._positions(digest, num_bits, num_hashes):
+                index = offset + (pos >> 3)
+                bit = 1 << (pos & 7)
+                byte = mm[index]
+                if not byte & bit:
+                    mm[index] = byte | bit
+                    added = True
+            if not added:
+                return False
+            self._incr_count()
+            if self.count >= total and not self._full:
+                self._grow()
+            return True
+
+    def clear(self):
+        """清空全部URL,恢复为只有第一段的初始大小"""
+        with self._lock, self._file_lock():
+            self._reset(_HEADER_SIZE + (self.num_bits + 7) // 8)
+            struct.pack_into('<I', self.mm, _SLICES_OFFSET, 0)
+            self._full = False
+            self._load_slices()
+
+    def _grow(self):
+        """在末尾追加新的一段位数组(调用方已持有锁)"""
+        index = len(self._slices)
+        num_bits, _ = _bloom_geometry(self.capacity * self.GROWTH ** index,
+                                      self.error_rate * self.TIGHTENING ** (index + 1))
+        offset, last_bits = self._slices[-1][:2]
+        old_size = offset + (last_bits + 7) // 8
+        size = old_size + (num_bits + 7) // 8
+        if not self.growable or (self.max_bytes and size - _HEADER_SIZE > self.max_bytes):
+            self._full = True
+            logger.warning(
+                f"布隆过滤器 {self.path or '<memory>'} 已加入 {self.count} 个URL,超过容量 {self._slices[-1][3]} "
+                f"且不能再扩容,之后新链接被误判为已抓取的概率会逐渐升高;请调大 max_bytes 或改用 exact 模式"
+            )
+            return
+        if self._file is not None:
+            self.mm.close()
+            self._file.truncate(size)
+            self.mm = mmap.mmap(self._file.fileno(), 0)
+        else:
+            mm = mmap.mmap(-1, size)
+            mm[:old_size] = self.mm[:old_size]
+            self.mm.close()
+            self.mm = mm
+        struct.pack_into('<I', self.mm, _SLICES_OFFSET, index + 1)
+        self._load_slices()
+        logger.info(f"布隆过滤器扩容到 {index + 1} 段,容量 {self._slices[-1][3]}: {self.path or '<memory>'}")
+
+
+class MmapUrlSet(DedupStore):
+    """
+    精确去重集合,开放寻址哈希表保存在内存映射文件中。
+
+    每个URL以128位摘要作为键(碰撞概率可以忽略),不会出现布隆过滤器式的误判;
+    装载因子超过 0.7 时表容量翻倍并重新映射,其他共享进程会在下一次访问时发现容量变化。
+    """
+
+    MAX_LOAD = 0.7
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, path: Optional[str] = None, shared: bool = False):
+        super().__init__(path, shared)
+        slots = 1 << max(4, math.ceil(math.log2(capacity / self.MAX_LOAD)))
+        self.slots, _ = self._map(_HEADER_SIZE + slots * _KEY_SIZE, _SET_MAGIC, slots, 0)
+
+    def _sync_slots(self):
+        """容量被其他进程扩大后重新映射"""
+        slots = struct.unpack_from('<Q', self.mm, 8)[0]
+        if slots != self.slots:
+            self.mm.close()
+            self.mm = mmap.mmap(self._file.fileno(), 0)
+            self.slots = slots
+
+    def _find(self, key: bytes) -> int:
+        """返回键所在槽位的偏移;不存在时返回应插入的空槽位偏移的相反数减一"""
+        mm = self.mm
+        mask = self.slots - 1
+        index = int.from_bytes(key[:8], 'little') & mask
+        while True:
+            offset = _HEADER_SIZE + index * _KEY_SIZE
+            if mm[offset:offset + _KEY_SIZE] == key:
+                return offset
+            if mm[offset:offset + _KEY_SIZE] == _EMPTY_KEY:
+                return -offset - 1
+            index = (index + 1) & mask
+
+    def _key(self, url: str) -> bytes:
+        key = self._digest(url)
+        if key == _EMPTY_KEY:  # 全零摘要用于标记空槽位,实际几乎不可能出现
+            key = b'\x01' + key[1:]
+        return key
+
+    def __contains__(self, url: str) -> bool:
+        if self.shared:
+            self._sync_slots()
+        return self._find(self._key(url)) >= 0
+
+    def check_and_add(self, url: str) -> bool:
+        key = self._key(url)
+        with self._lock, self._file_lock():
+            if self.shared:
+                self._sync_slots()
+            offset = self._find(key)
+            if offset >= 0:
+                return False
+            offset = -offset - 1
+            self.mm[offset:offset + _KEY_SIZE] = key
+            self._incr_count()
+            if self.count > self.slots * self.MAX_LOAD:
+                self._grow()
+            return True
+
+    def clear(self):
+        """清空全部URL,保留当前容量"""
+        with self._lock, self._file_lock():
+            if self.shared:
+                self._sync_slots()
+            self._reset(_HEADER_SIZE + self.slots * _KEY_SIZE)
+
+    def _grow(self):
+        """容量翻倍并重新插入全部键(调用方已持有锁)"""
+        old = self.mm[_HEADER_SIZE:_HEADER_SIZE + self.slots * _KEY_SIZE]
+        old_slots = self.slots
+        self.slots *= 2
+        size = _HEADER_SIZE + self.slots * _KEY_SIZE
+        header = self.mm[:_HEADER_SIZE]
+        self.mm.close()
+        if self._file is not None:
+            self._file.truncate(size)
+            self.mm = mmap.mmap(self._file.fileno(), 0)
+            self.mm[_HEADER_SIZE:size] = bytes(size - _HEADER_SIZE)
+        else:
+            self.mm = mmap.mmap(-1, size)
+        self.mm[:_HEADER_SIZE] = header
+        struct.pack_into('<Q', self.mm, 8, self.slots)
+        for i in range(old_slots):
+            key = old[i * _KEY_SIZE:(i + 1) * _KEY_SIZE]
+            if key != _EMPTY_KEY:
+                offset = -self._find(key) - 1
+                self.mm[offset:offset + _KEY_SIZE] = key
+        logger.info(f"去重集合扩容到 {self.slots} 个槽位: {self.path or '<memory>'}")
+
+
+def create_dedup_store(job_name: str, dedup_config: Optional[Dict] = None,
+                       base_path: str = 'data/dedup') -> DedupStore:
+    """
+    根据job的 bloomfilter 配置创建去重存储
+    :param job_name: 任务名称,用于生成默认文件名
+    :param dedup_config: 配置,支持 mode(bloom/exact/memory)、capacity、error_rate、path、shared、max_bytes
+    :param base_path: 默认文件目录
+    """
+    dedup_config = dedup_config or {}
+    mode = dedup_config.get('mode', 'bloom')
+    capacity = dedup_config.get('capacity', DEFAULT_CAPACITY)
+    shared = dedup_config.get('shared', False)
+    safe_name = re.sub(r'[\\/:*?"<>|\s]', '_', job_name)
+    if mode == 'memory':
+        return MmapBloomFilter(capacity, dedup_config.get('error_rate', 0.001),
+                               max_bytes=dedup_config.get('max_bytes'))
+    if mode == 'exact':
+        path = dedup_config.get('path') or os.path.join(base_path, f'{safe_name}.set')
+        return MmapUrlSet(capacity, path, shared)
+    if mode == 'bloom':
+        path = dedup_config.get('path') or os.path.join(base_path, f'{safe_name}.bloom')
+        return MmapBloomFilter(capacity, dedup_config.get('error_rate', 0.001), path, shared,
+                               dedup_config.get('max_bytes'))
+    raise ValueError(f"不支持的去重模式: {mode}")
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.crawl.extraction import ExtractionPlan
+from core.crawl.page import Page
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+# 工作进程内缓存的提取计划: plan_key -> ExtractionPlan
+_worker_plans: Dict[str, ExtractionPlan] = {}
+
+
+def extract_in_worker(plan_key: str, template: Dict, parser: Optional[str], url: str, content: str,
+                      content_type: Optional[str], link_selector: Optional[str]) -> Tuple[str, Any, List[str]]:
+    """
+    在工作进程中解析页面并执行提取计划
+    预编译的选择器对象无法跨进程传递,因此传入模板原文,由工作进程按 plan_key 编译一次后缓存
+    :return: ('records', 记录列表, 链接) 或 ('result', 字段字典, 链接)
+    """
+    plan = _worker_plans.get(plan_key)
+    if plan is None:
+        plan = _worker_plans[plan_key] = ExtractionPlan(template, parser)
+    page = Page(url, content, content_type, parser)
+    hrefs = []
+    if link_selector and not page.is_json:
+        backend = page.backend
+        hrefs = [href for href in (backend.attr(node, 'href') for node in page.select(link_selector)) if href]
+    if plan.is_row_based:
+        return 'records', list(plan.iter_records(page)), hrefs
+    return 'result', plan.extract(page), hrefs
+
+
+class ExtractionPool:
+    """
+    解析/提取进程池。
+
+    事件循环只负责抓取,页面原文和模板被发送到工作进程完成解析与提取,
+    CPU密集的工作可以用满多核;max_in_flight 限制同时在途的页面数,
+    避免抓取速度远高于解析速度时页面原文在内存中堆积。
+    """
+
+    def __init__(self, config: Dict):
+        pool_config = config.get('extraction_pool', {})
+        self.enabled = pool_config.get('enabled', False)
+        self.workers = pool_config.get('workers') or os.cpu_count() or 1
+        self.max_in_flight = pool_config.get('max_in_flight', self.workers * 2)
+        self.start_method = pool_config.get('start_method')
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """首次使用时启动进程池"""
+        if self._executor is None:
+            context = multiprocessing.get_context(self.start_method) if self.start_method else None
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            logger.info(f"解析进程池已启动, 进程数: {self.workers}, 最大在途页面数: {self.max_in_flight}")
+        return self._executor
+
+    async def extract(self, plan: ExtractionPlan, url: str, content: str, content_type: Optional[str],
+                      link_selector: Optional[str] = None) -> Tuple[str, Any, List[str]]:
+        """
+        把页面交给工作进程解析和提取
+        :param plan: 主进程中的提取计划,只传递其模板原文与缓存键
+        :param link_selector: 需要同时提取链接时的选择器
+        :return: 同 extract_in_worker
+        """
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._get_executor(), extract_in_worker,
+                plan.key, plan.template, plan.backend.name, url, content, content_type, link_selector
+            )
+
+    def close(self):
+        """关闭进程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
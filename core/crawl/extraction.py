@@ -0,0 +1,336 @@
+import hashlib
+import json
+import logging
+import re
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from core.crawl.page import Page, ParserBackend, get_parser_backend
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+# JSONPath 表达式编译结果缓存,所有job共用
+_jsonpath_cache: Dict[str, Any] = {}
+
+# 只由 .key / ['key'] / [n] / [*] / .* 组成的简单路径,可以直接编译为步骤列表
+_SIMPLE_PATH = re.compile(r"^\$((\.[A-Za-z_][\w-]*)|(\['[^']+'\])|(\[-?\d+\])|(\[\*\])|(\.\*))*$")
+_PATH_STEP = re.compile(r"\.([A-Za-z_][\w-]*)|\['([^']+)'\]|\[(-?\d+)\]|(\[\*\]|\.\*)")
+
+
+class SimpleJsonPath:
+    """简单JSONPath的直接求值实现,避免通用解析器为每个匹配创建上下文对象"""
+    __slots__ = ('steps',)
+
+    def __init__(self, expression: str):
+        self.steps = []
+        for key, quoted, index, wildcard in _PATH_STEP.findall(expression[1:]):
+            if wildcard:
+                self.steps.append(('*', None))
+            elif index:
+                self.steps.append(('index', int(index)))
+            else:
+                self.steps.append(('key', key or quoted))
+
+    def values(self, data: Any) -> List[Any]:
+        current = [data]
+        for kind, arg in self.steps:
+            matched = []
+            for item in current:
+                if kind == 'key':
+                    if isinstance(item, dict) and arg in item:
+                        matched.append(item[arg])
+                elif kind == 'index':
+                    if isinstance(item, list) and -len(item) <= arg < len(item):
+                        matched.append(item[arg])
+                elif isinstance(item, list):
+                    matched.extend(item)
+                elif isinstance(item, dict):
+                    matched.extend(item.values())
+            current = matched
+        return current
+
+
+class GenericJsonPath:
+    """其他表达式(递归下降、过滤条件等)交给 jsonpath_ng 处理"""
+    __slots__ = ('expression',)
+
+    def __init__(self, expression: str):
+        from jsonpath_ng.ext import parse as parse_jsonpath
+        self.expression = parse_jsonpath(expression)
+
+    def values(self, data: Any) -> List[Any]:
+        return [match.value for match in self.expression.find(data)]
+
+
+def compile_jsonpath(expression: str):
+    """编译(并缓存)JSONPath表达式"""
+    compiled = _jsonpath_cache.get(expression)
+    if compiled is None:
+        if _SIMPLE_PATH.match(expression):
+            compiled = SimpleJsonPath(expression)
+        else:
+            compiled = GenericJsonPath(expression)
+        _jsonpath_cache[expression] = compiled
+    return compiled
+
+
+def jsonpath_to_prefix(expression: str) -> Optional[str]:
+    """
+    把只由 .key 和 [*] 组成的JSONPath转换为 ijson 的前缀(如 $.data[*] -> data.item),
+    其他形式无法在流式解析中匹配,返回 None
+    """
+    if not _SIMPLE_PATH.match(expression):
+        return None
+    parts = []
+    for key, quoted, index, wildcard in _PATH_STEP.findall(expression[1:]):
+        if wildcard == '[*]':
+            parts.append('item')
+        elif (key or quoted) and '.' not in (key or quoted):
+            parts.append(key or quoted)
+        else:
+            return None
+    return '.'.join(parts)
+
+
+def compile_filters(filters: Optional[Dict]) -> List[Callable[[Any], bool]]:
+    """
+    把字段的 filters 配置解析为判定函数列表,值需要通过全部判定才会保留
+    支持: regex(保留匹配的值)、exclude(丢弃匹配的值)、min_length、max_length
+    """
+    predicates = []
+    if not filters:
+        return predicates
+    if filters.get('regex'):
+        pattern = re.compile(filters['regex'])
+        predicates.append(lambda value: pattern.search(str(value)) is not None)
+    if filters.get('exclude'):
+        excluded = re.compile(filters['exclude'])
+        predicates.append(lambda value: excluded.search(str(value)) is None)
+    if filters.get('min_length') is not None:
+        min_length = filters['min_length']
+        predicates.append(lambda value: len(str(value)) >= min_length)
+    if filters.get('max_length') is not None:
+        max_length = filters['max_length']
+        predicates.append(lambda value: len(str(value)) <= max_length)
+    unknown = set(filters) - {'regex', 'exclude', 'min_length', 'max_length'}
+    if unknown:
+        logger.warning(f"忽略不支持的过滤规则: {', '.join(sorted(unknown))}")
+    return predicates
+
+
+class CompiledField:
+    """预编译后的单个字段: CSS选择器与JSONPath均已编译,属性与过滤规则已解析"""
+    __slots__ = ('name', 'selector', 'css', 'jsonpath', 'attr', 'predicates')
+
+    def __init__(self, name: str, config: Any, backend: ParserBackend):
+        if isinstance(config, str):
+            config = {'selector': config}
+        self.name = name
+        self.selector = config.get('selector', '')
+        self.attr = config.get('attr')
+        self.predicates = compile_filters(config.get('filters'))
+        # 以 $ 开头的表达式按JSONPath编译,其余按CSS选择器编译
+        self.css = None
+        self.jsonpath = None
+        if self.selector.startswith('$'):
+            self.jsonpath = compile_jsonpath(self.selector)
+        else:
+            self.css = backend.compile(self.selector)
+
+    def _filter(self, values: List[Any]) -> List[Any]:
+        if not self.predicates:
+            return values
+        return [value for value in values if all(predicate(value) for predicate in self.predicates)]
+
+    def extract(self, page: Page) -> List[Any]:
+        """按页面类型提取该字段的值列表"""
+        if page.is_json:
+            return self.extract_json(page.data)
+        return self.extract_html(page)
+
+    def extract_html(self, page: Page) -> List[Any]:
+        if self.css is None:
+            return []
+        backend = page.backend
+        elements = page.select(self.css)
+        if self.attr:
+            values = [backend.attr(element, self.attr) for element in elements]
+            values = [value for value in values if value]
+        else:
+            values = [backend.text(element) for element in elements]
+        return self._filter(values)
+
+    def extract_json(self, data: Any) -> List[Any]:
+        if self.jsonpath is None:
+            return []
+        matches = self.jsonpath.values(data)
+        if self.attr:
+            values = [item.get(self.attr) if isinstance(item, dict) else None for item in matches]
+            matches = [value for value in values if value is not None]
+        return self._filter(matches)
+
+
+class CompiledRowField:
+    """
+    行内字段: 选择器相对于行节点求值,每行产生一个值(multiple 为真时产生列表)。
+
+    配置示例: {"css": "td:nth-child(1)", "value": "@text"} 或 {"path": "$.name"}
+    value 支持 @text(默认)、@html 以及 @属性名(如 @href)。
+    直接写成字符串时,以 $ 开头的按JSONPath处理;其余的在行选择器为CSS时按CSS选择器处理,
+    行选择器为JSONPath时按相对路径处理(如 "name" 即 $.name)。
+    """
+    __slots__ = ('name', 'css', 'jsonpath', 'value', 'multiple', 'predicates')
+
+    def __init__(self, name: str, config: Any, backend: ParserBackend, html_rows: bool = True,
+                 json_rows: bool = False):
+        """
+        :param name: 字段名
+        :param config: 字段配置
+        :param backend: 解析后端
+        :param html_rows: 行选择器是否包含CSS选择器
+        :param json_rows: 行选择器是否包含JSONPath
+        """
+        if isinstance(config, str):
+            if config.startswith('$'):
+                config = {'path': config}
+            else:
+                config = {'css': config if html_rows else None, 'path': config if json_rows else None}
+        self.name = name
+        css = config.get('css')
+        path = config.get('path')
+        # 未配置css表示取行节点本身
+        self.css = backend.compile(css) if css else None
+        if path and not path.startswith('$'):
+            path = '$.' + path
+        self.jsonpath = compile_jsonpath(path) if path else None
+        self.value = config.get('value', '@text')
+        self.multiple = config.get('multiple', False)
+        self.predicates = compile_filters(config.get('filters'))
+
+    def _pick(self, values: List[Any]) -> Any:
+        if self.predicates:
+            values = [value for value in values if all(predicate(value) for predicate in self.predicates)]
+        if self.multiple:
+            return values
+        return values[0] if values else None
+
+    def from_node(self, backend: ParserBackend, row: Any) -> Any:
+        nodes = backend.select(row, self.css) if self.css is not None else (row,)
+        if self.value == '@text':
+            values = [backend.text(node) for node in nodes]
+        elif self.value == '@html':
+            values = [backend.html(node) for node in nodes]
+        else:
+            name = self.value[1:]
+            values = [value for value in (backend.attr(node, name) for node in nodes) if value is not None]
+        return self._pick(values)
+
+    def from_item(self, item: Any) -> Any:
+        if self.jsonpath is None:
+            return self._pick([item])
+        return self._pick(self.jsonpath.values(item))
+
+
+class ExtractionPlan:
+    """
+    由job模板编译得到的提取计划。
+
+    模板在加载配置时只编译一次,之后每个页面直接复用已编译的选择器和过滤规则,
+    单页开销只与文档大小有关,与模板的复杂程度无关。
+
+    模板有两种形式:
+    - selectors: 字段名到选择器的平铺映射,extract 返回 {字段名: 值列表};
+    - selector + attr: 先用 selector 选出行,再在每行内求 attr 中各字段,
+      iter_records 逐行产出记录,字段缺失时为 None,不会出现列错位。
+    """
+
+    def __init__(self, template: Dict, parser: Optional[str] = None):
+        """
+        :param template: job模板
+        :param parser: 解析后端名称,CSS选择器按该后端的方式预编译
+        """
+        self.template = template
+        self.backend = get_parser_backend(parser)
+        # 模板内容的摘要,供解析进程池按模板缓存编译结果
+        self.key = hashlib.sha1(
+            json.dumps([template, self.backend.name], sort_keys=True, ensure_ascii=False, default=str).encode('utf-8')
+        ).hexdigest()
+        self.fields = [
+            CompiledField(name, config, self.backend)
+            for name, config in template.get('selectors', {}).items()
+        ]
+        self.row_css = None
+        self.row_jsonpath = None
+        self.stream_prefix = None  # 行选择器对应的 ijson 前缀,可以流式解析时才有值
+        self.row_fields: List[CompiledRowField] = []
+        self.row_filters = []
+        row_selector = template.get('selector')
+        if row_selector:
+            if isinstance(row_selector, str):
+                row_selector = {'path': row_selector} if row_selector.startswith('$') else {'css': row_selector}
+            if row_selector.get('css'):
+                self.row_css = self.backend.compile(row_selector['css'])
+            if row_selector.get('path'):
+                self.row_jsonpath = compile_jsonpath(row_selector['path'])
+                self.stream_prefix = jsonpath_to_prefix(row_selector['path'])
+            self.row_fields = [
+                CompiledRowField(name, config, self.backend, self.row_css is not None, self.row_jsonpath is not None)
+                for name, config in template.get('attr', {}).items()
+            ]
+            # 模板级 filters: 包含这些元素的行会被跳过
+            self.row_filters = [
+                self.backend.compile(selector)
+                for selector in template.get('filters', []) if isinstance(selector, str)
+            ]
+
+    @property
+    def is_row_based(self) -> bool:
+        """模板是否为按行提取的形式"""
+        return self.row_css is not None or self.row_jsonpath is not None
+
+    def extract(self, page: Page) -> Dict[str, List[Any]]:
+        """
+        对页面执行提取计划
+        :return: {字段名: 值列表}
+        """
+        if page.backend is not self.backend:
+            # 页面与计划使用的解析后端不同,预编译的选择器不能通用
+            return ExtractionPlan(self.template, page.backend.name).extract(page)
+        if page.is_json:
+            data = page.data
+            return {field.name: field.extract_json(data) for field in self.fields}
+        return {field.name: field.extract_html(page) for field in self.fields}
+
+    def iter_records(self, page: Page) -> Iterator[Dict[str, Any]]:
+        """
+        逐行产出记录,每个行节点只遍历一次,字段选择器相对于行节点求值
+        :param page: 页面对象
+        """
+        if page.backend is not self.backend:
+            yield from ExtractionPlan(self.template, page.backend.name).iter_records(page)
+            return
+        fields = self.row_fields
+        if page.is_json:
+            if self.row_jsonpath is None:
+                return
+            for item in self.row_jsonpath.values(page.data):
+                yield {field.name: field.from_item(item) for field in fields}
+            return
+        if self.row_css is None:
+            return
+        backend = self.backend
+        filters = self.row_filters
+        for row in page.select(self.row_css):
+            if filters and any(backend.select(row, selector) for selector in filters):
+                continue
+            yield {field.name: field.from_node(backend, row) for field in fields}
+
+    async def aiter_json_records(self, stream) -> AsyncIterator[Dict[str, Any]]:
+        """
+        从JSON字节流中边读取边解析,每解析出一行就产出一条记录,内存占用与响应大小无关
+        :param stream: 提供异步 read(n) 方法的对象,如 aiohttp 响应的 content
+        """
+        import ijson
+        fields = self.row_fields
+        async for item in ijson.items(stream, self.stream_prefix, use_float=True):
+            yield {field.name: field.from_item(item) for field in fields}
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Union
+
+from core.crawl.page import Page
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fingerprints (
+    job TEXT NOT NULL,
+    url TEXT NOT NULL,
+    digest BLOB NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job, url)
+) WITHOUT ROWID;
+"""
+
+# 规范化时去掉的内容: 脚本、样式与注释里常带有时间戳、随机令牌等与数据无关的变化
+_VOLATILE = re.compile(r'<script\b.*?</script\s*>|<style\b.*?</style\s*>|<!--.*?-->', re.S | re.I)
+_WHITESPACE = re.compile(r'\s+')
+
+
+class ContentFingerprinter:
+    """
+    计算页面内容指纹。
+
+    默认对整个响应体做规范化(去掉脚本、样式、注释并合并空白)后取16字节的blake2b摘要;
+    配置 region 时只对该区域(HTML为CSS选择器,JSON为JSONPath)的内容取摘要,
+    页面其他部分(广告、访问计数等)的变化不会被视为页面变化。
+    """
+
+    def __init__(self, config: Union[bool, Dict, None]):
+        if not isinstance(config, dict):
+            config = {}
+        self.region = config.get('region')
+        self.ignore = [re.compile(pattern) for pattern in config.get('ignore', [])]
+        self._jsonpath = None
+
+    def _normalize(self, text: str) -> str:
+        text = _VOLATILE.sub('', text)
+        for pattern in self.ignore:
+            text = pattern.sub('', text)
+        return _WHITESPACE.sub(' ', text).strip()
+
+    def _region_text(self, page: Page) -> str:
+        if page.is_json:
+            if self._jsonpath is None:
+                from core.crawl.extraction import compile_jsonpath
+                self._jsonpath = compile_jsonpath(self.region)
+            return json.dumps(self._jsonpath.values(page.data), sort_keys=True, ensure_ascii=False, default=str)
+        backend = page.backend
+        return ''.join(backend.html(node) for node in page.select(self.region))
+
+    def digest(self, page: Page) -> bytes:
+        """计算页面指纹;只有配置了 region 时才需要解析页面"""
+        text = self._region_text(page) if self.region else page.content
+        return hashlib.blake2b(self._normalize(text).encode('utf-8'), digest_size=16).digest()
+
+
+class FingerprintStore:
+    """
+    基于SQLite的内容指纹索引,按 (job, url) 保存最近一次成功处理的页面指纹。
+    """
+
+    def __init__(self, path: str = 'data/fingerprints.db'):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+        self.unchanged = 0
+        self.changed = 0
+
+    def is_unchanged(self, job: str, url: str, digest: bytes) -> bool:
+        """页面指纹是否与上次记录的相同"""
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT digest FROM fingerprints WHERE job = ? AND url = ?', (job, url)
+            ).fetchone()
+        if row is not None and row[0] == digest:
+            self.unchanged += 1
+            return True
+        self.changed += 1
+        return False
+
+    def update(self, job: str, url: str, digest: bytes):
+        """记录页面处理成功后的指纹"""
+        with self._lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO fingerprints (job, url, digest, updated_at) VALUES (?, ?, ?, ?)',
+                (job, url, digest, time.time())
+            )
+
+    def clear(self, job: Optional[str] = None):
+        """清除指纹,下次抓取时页面会被重新处理"""
+        with self._lock:
+            if job is None:
+                self.conn.execute('DELETE FROM fingerprints')
+            else:
+                self.conn.execute('DELETE FROM fingerprints WHERE job = ?', (job,))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM fingerprints').fetchone()[0]
+        return {'entries': entries, 'changed': self.changed, 'unchanged': self.unchanged}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,308 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+# URL状态
+PENDING = 0      # 等待抓取
+IN_PROGRESS = 1  # 已取出、正在抓取
+DONE = 2         # 抓取完成
+FAILED = 3       # 超过重试次数,放弃
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS frontier (
+    job TEXT NOT NULL,
+    url TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    shard INTEGER NOT NULL DEFAULT 0,
+    not_before REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (job, url)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_frontier_next
+    ON frontier (job, state, priority DESC, depth, enqueued_at);
+"""
+_SHARD_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_frontier_shard
+    ON frontier (job, shard, state, priority DESC, depth, enqueued_at);
+"""
+
+
+@lru_cache(maxsize=65536)
+def _host_shard(host: str, shards: int) -> int:
+    # crc32 在各进程、各机器上结果一致(内置 hash 每个进程不同)
+    return zlib.crc32(host.encode('utf-8')) % shards
+
+
+def shard_for(url: str, shards: int) -> int:
+    """URL所属的分片: 按主机名划分,同一主机的URL总在同一分片,由同一个工作进程抓取"""
+    if shards <= 1:
+        return 0
+    try:
+        host = urlsplit(url).hostname or ''
+    except ValueError:
+        host = ''
+    return _host_shard(host, shards)
+
+
+class CrawlFrontier:
+    """
+    基于SQLite的持久化抓取队列。
+
+    记录每个URL所属的job、深度、优先级和状态;按 优先级 > 深度 > 入队时间 的顺序批量出队。
+    使用WAL日志,已提交的入队/完成操作在进程崩溃后依然保留,
+    重新打开时会把上次未完成(IN_PROGRESS)的URL放回待抓取状态,从断点继续。
+    失败后重新排队的URL带有 not_before 时间,到时之前不会被取出。
+
+    shards 大于1时每个URL按主机名记录所属分片,多个工作进程共用同一个队列文件、各自只领取自己的分片;
+    此时只应由协调进程在启动工作进程之前恢复未完成的URL(工作进程以 recover=False 打开)。
+    """
+
+    def __init__(self, path: str = 'data/frontier.db', shards: int = 1, recover: bool = True):
+        """
+        :param path: 队列文件
+        :param shards: 分片数,即共用队列的工作进程数
+        :param recover: 打开时是否把上次未完成的URL放回待抓取状态
+        """
+        self.path = path
+        self.shards = max(1, shards)
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        # 多个进程同时写入时等待对方的事务结束
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+        self._migrate()
+        if recover:
+            self.resume()
+
+    def _migrate(self):
+        """为旧版本的队列文件补上 shard、not_before 列"""
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(frontier)')}
+        if 'shard' not in columns:
+            self.conn.execute('ALTER TABLE frontier ADD COLUMN shard INTEGER NOT NULL DEFAULT 0')
+        if 'not_before' not in columns:
+            self.conn.execute('ALTER TABLE frontier ADD COLUMN not_before REAL NOT NULL DEFAULT 0')
+        self.conn.executescript(_SHARD_INDEX)
+
+    def push(self, job: str, urls: Iterable[str], depth: int, priority: int = 0) -> int:
+        """
+        批量加入URL,已存在的URL会被忽略
+        :param job: 任务名称
+        :param urls: URL列表
+        :param depth: URL所在深度
+        :param priority: 优先级,数值越大越先出队
+        :return: 实际新增的URL数量
+        """
+        now = time.time()
+        rows = [(job, url, depth, priority, now, shard_for(url, self.shards)) for url in urls]
+        if not rows:
+            return 0
+        with self._lock:
+            before = self.conn.total_changes
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO frontier (job, url, depth, priority, enqueued_at, shard) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            self.conn.execute('COMMIT')
+            return self.conn.total_changes - before
+
+    def seed(self, job: str, url: str, priority: int = 0):
+        """加入种子URL;即使它之前已抓取过,也会重新置为待抓取"""
+        with self._lock:
+            self.conn.execute(
+                'INSERT INTO frontier (job, url, depth, priority, enqueued_at, shard) VALUES (?, ?, 0, ?, ?, ?) '
+                'ON CONFLICT (job, url) DO UPDATE SET state = 0, depth = 0, attempts = 0, not_before = 0, '
+                'shard = excluded.shard',
+                (job, url, priority, time.time(), shard_for(url, self.shards))
+            )
+
+    def pop_batch(self, job: str, size: int = 100, shard: Optional[int] = None) -> List[Tuple[str, int]]:
+        """
+        批量取出已到重试时间的待抓取URL并标记为抓取中
+        :param job: 任务名称
+        :param size: 最多取出的数量
+        :param shard: 只取该分片的URL;为空时不区分分片
+        :return: [(url, depth), ...]
+        """
+        now = time.time()
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                if shard is None:
+                    rows = self.conn.execute(
+                        'SELECT url, depth FROM frontier WHERE job = ? AND state = ? AND not_before <= ? '
+                        'ORDER BY priority DESC, depth, enqueued_at LIMIT ?',
+                        (job, PENDING, now, size)
+                    ).fetchall()
+                else:
+                    rows = self.conn.execute(
+                        'SELECT url, depth FROM frontier '
+                        'WHERE job = ? AND shard = ? AND state = ? AND not_before <= ? '
+                        'ORDER BY priority DESC, depth, enqueued_at LIMIT ?',
+                        (job, shard, PENDING, now, size)
+                    ).fetchall()
+                self.conn.executemany(
+                    'UPDATE frontier SET state = ?, attempts = attempts + 1 WHERE job = ? AND url = ?',
+                    [(IN_PROGRESS, job, url) for url, _ in rows]
+                )
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        return rows
+
+    def complete(self, job: str, urls: Iterable[str]):
+        """将URL标记为抓取完成"""
+        self._set_state(job, urls, DONE)
+
+    def fail(self, job: str, urls: Iterable[str], max_attempts: int = 3,
+             retry_delay: float = 0.0, max_retry_delay: float = 300.0):
+        """
+        抓取失败的URL重新排队,超过最大尝试次数后标记为失败
+        :param retry_delay: 第一次失败后等待的秒数,之后每失败一次加倍
+        :param max_retry_delay: 等待时间的上限
+        """
+        now = time.time()
+        with self._lock:
+            self.conn.execute('BEGIN')
+            self.conn.executemany(
+                'UPDATE frontier SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, '
+                'not_before = ? + MIN(?, ? * (1 << MIN(MAX(attempts - 1, 0), 30))) WHERE job = ? AND url = ?',
+                [(max_attempts, FAILED, PENDING, now, max_retry_delay, retry_delay, job, url) for url in urls]
+            )
+            self.conn.execute('COMMIT')
+
+    def postpone(self, job: str, delays: Iterable[Tuple[str, float]]):
+        """
+        请求没有发出(如主机熔断中)的URL放回队列,不计入尝试次数
+        :param delays: [(url, 至少等待的秒数), ...]
+        """
+        now = time.time()
+        with self._lock:
+            self.conn.execute('BEGIN')
+            self.conn.executemany(
+                'UPDATE frontier SET state = ?, attempts = MAX(attempts - 1, 0), not_before = ? '
+                'WHERE job = ? AND url = ?',
+                [(PENDING, now + delay, job, url) for url, delay in delays]
+            )
+            self.conn.execute('COMMIT')
+
+    def abandon(self, job: str, urls: Iterable[str]):
+        """重试也不会成功的URL(如404)直接标记为失败"""
+        self._set_state(job, urls, FAILED)
+
+    def _set_state(self, job: str, urls: Iterable[str], state: int):
+        with self._lock:
+            self.conn.execute('BEGIN')
+            self.conn.executemany(
+                'UPDATE frontier SET state = ? WHERE job = ? AND url = ?',
+                [(state, job, url) for url in urls]
+            )
+            self.conn.execute('COMMIT')
+
+    def resume(self, job: Optional[str] = None, shard: Optional[int] = None) -> int:
+        """
+        把上次中断时仍在抓取中的URL放回待抓取队列,返回恢复的数量
+        :param shard: 只恢复该分片,用于负责它的工作进程异常退出后
+        """
+        with self._lock:
+            if job is None:
+                cursor = self.conn.execute('UPDATE frontier SET state = ? WHERE state = ?', (PENDING, IN_PROGRESS))
+            elif shard is None:
+                cursor = self.conn.execute(
+                    'UPDATE frontier SET state = ? WHERE job = ? AND state = ?', (PENDING, job, IN_PROGRESS)
+                )
+            else:
+                cursor = self.conn.execute(
+                    'UPDATE frontier SET state = ? WHERE job = ? AND shard = ? AND state = ?',
+                    (PENDING, job, shard, IN_PROGRESS)
+                )
+        if cursor.rowcount:
+            logger.info(f"抓取队列恢复了 {cursor.rowcount} 个未完成的URL")
+        return cursor.rowcount
+
+    def reshard(self, job: str) -> int:
+        """
+        按当前分片数重新计算待抓取URL的分片,工作进程数变化后由协调进程在启动工作进程前调用
+        :return: 分片发生变化的URL数量
+        """
+        with self._lock:
+            self.conn.create_function('hermes_shard', 2, shard_for, deterministic=True)
+            cursor = self.conn.execute(
+                'UPDATE frontier SET shard = hermes_shard(url, ?) '
+                'WHERE job = ? AND state = ? AND shard != hermes_shard(url, ?)',
+                (self.shards, job, PENDING, self.shards)
+            )
+        return cursor.rowcount
+
+    def active(self, job: str) -> int:
+        """待抓取与抓取中的URL总数(全部分片);为0时整个job才算抓取完成"""
+        with self._lock:
+            return self.conn.execute(
+                'SELECT COUNT(*) FROM frontier WHERE job = ? AND state IN (?, ?)', (job, PENDING, IN_PROGRESS)
+            ).fetchone()[0]
+
+    def next_retry(self, job: str, shard: Optional[int] = None) -> Optional[float]:
+        """
+        距离最早一个待抓取URL到达重试时间的秒数
+        :return: 已经可以取出时为0;没有待抓取的URL时为 None
+        """
+        query = 'SELECT MIN(not_before) FROM frontier WHERE job = ? AND state = ?'
+        params = (job, PENDING)
+        if shard is not None:
+            query += ' AND shard = ?'
+            params += (shard,)
+        with self._lock:
+            not_before = self.conn.execute(query, params).fetchone()[0]
+        return None if not_before is None else max(0.0, not_before - time.time())
+
+    def pending(self, job: str) -> int:
+        """待抓取的URL数量"""
+        with self._lock:
+            return self.conn.execute(
+                'SELECT COUNT(*) FROM frontier WHERE job = ? AND state = ?', (job, PENDING)
+            ).fetchone()[0]
+
+    def stats(self, job: str) -> Dict[str, int]:
+        """按状态统计某个job的URL数量"""
+        names = {PENDING: 'pending', IN_PROGRESS: 'in_progress', DONE: 'done', FAILED: 'failed'}
+        result = {name: 0 for name in names.values()}
+        with self._lock:
+            for state, count in self.conn.execute(
+                'SELECT state, COUNT(*) FROM frontier WHERE job = ? GROUP BY state', (job,)
+            ):
+                result[names[state]] = count
+        return result
+
+    def clear(self, job: str):
+        """删除某个job的全部队列记录"""
+        with self._lock:
+            self.conn.execute('DELETE FROM frontier WHERE job = ?', (job,))
+
+    def checkpoint(self):
+        """将WAL日志合并回数据库文件"""
+        with self._lock:
+            self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self.conn.close()
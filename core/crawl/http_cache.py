@@ -0,0 +1,196 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from core.crawl.http_client import FetchResult
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS http_cache (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    content_type TEXT,
+    encoding TEXT,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_http_cache_accessed ON http_cache (accessed);
+"""
+
+
+def _header(headers: Dict[str, str], name: str) -> Optional[str]:
+    """大小写不敏感地读取响应头"""
+    value = headers.get(name)
+    if value is None:
+        lowered = name.lower()
+        for key, item in headers.items():
+            if key.lower() == lowered:
+                return item
+    return value
+
+
+class HttpCache:
+    """
+    基于SQLite的HTTP条件请求缓存。
+
+    按URL保存响应的校验信息(ETag / Last-Modified)和响应体。再次抓取同一URL时带上
+    If-None-Match / If-Modified-Since,服务器返回304时直接使用缓存的响应体。
+    缓存总大小超过 max_bytes 时按最近访问时间淘汰(LRU)。
+    """
+
+    def __init__(self, path: str = 'data/http_cache.db', max_bytes: int = 256 * 1024 * 1024,
+                 max_entry_bytes: int = 8 * 1024 * 1024):
+        """
+        :param path: 缓存文件路径
+        :param max_bytes: 缓存响应体的总大小上限
+        :param max_entry_bytes: 单个响应体的大小上限,超过的响应不缓存
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+        self.size = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM http_cache').fetchone()[0]
+        self.hits = 0          # 服务器返回304,使用缓存
+        self.misses = 0        # 服务器返回完整响应
+        self.stores = 0
+        self.evictions = 0
+        self.bytes_saved = 0   # 因304而不必重新下载的字节数
+
+    def validators(self, url: str) -> Dict[str, str]:
+        """返回该URL的条件请求头,没有缓存时为空"""
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT etag, last_modified FROM http_cache WHERE url = ?', (url,)
+            ).fetchone()
+        if row is None:
+            return {}
+        headers = {}
+        if row[0]:
+            headers['If-None-Match'] = row[0]
+        if row[1]:
+            headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def revalidated(self, url: str, result: FetchResult) -> FetchResult:
+        """
+        处理304响应: 刷新访问时间和校验信息,返回带缓存响应体的结果(状态码仍为304)
+        """
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT content_type, encoding, body FROM http_cache WHERE url = ?', (url,)
+            ).fetchone()
+            if row is None:
+                # 条件请求发出后缓存项已被淘汰
+                logger.debug(f"304响应对应的缓存项已不存在: {url}")
+                return result
+            etag = _header(result.headers, 'ETag')
+            last_modified = _header(result.headers, 'Last-Modified')
+            self.conn.execute(
+                'UPDATE http_cache SET accessed = ?, etag = COALESCE(?, etag), '
+                'last_modified = COALESCE(?, last_modified) WHERE url = ?',
+                (now, etag, last_modified, url)
+            )
+        self.hits += 1
+        self.bytes_saved += len(row[2])
+        return FetchResult(url=result.url, status=304, headers=result.headers, content=row[2],
+                           content_type=row[0] or '', encoding=row[1])
+
+    def miss(self, result: FetchResult) -> bool:
+        """记录一次完整响应(未使用缓存),返回它是否可以缓存"""
+        self.misses += 1
+        return self.cacheable(result)
+
+    def cacheable(self, result: FetchResult) -> bool:
+        """200响应、带有校验信息且响应体不超过 max_entry_bytes 时可以缓存"""
+        if result.status != 200:
+            return False
+        if not (_header(result.headers, 'ETag') or _header(result.headers, 'Last-Modified')):
+            return False
+        return len(result.content or b'') <= self.max_entry_bytes
+
+    def store(self, url: str, result: FetchResult) -> bool:
+        """
+        保存完整响应;没有校验信息或响应体过大时不缓存
+        :return: 是否已缓存
+        """
+        if not self.cacheable(result):
+            return False
+        etag = _header(result.headers, 'ETag')
+        last_modified = _header(result.headers, 'Last-Modified')
+        body = result.content
+        if isinstance(body, str):
+            body = body.encode(result.encoding or 'utf-8', errors='replace')
+        if len(body) > self.max_entry_bytes:
+            return False
+        with self._lock:
+            old = self.conn.execute('SELECT size FROM http_cache WHERE url = ?', (url,)).fetchone()
+            self.conn.execute(
+                'INSERT OR REPLACE INTO http_cache '
+                '(url, etag, last_modified, content_type, encoding, body, size, accessed) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, etag, last_modified, result.content_type, result.encoding, body, len(body), time.time())
+            )
+            self.size += len(body) - (old[0] if old else 0)
+            self.stores += 1
+            if self.size > self.max_bytes:
+                self._evict()
+        return True
+
+    def _evict(self):
+        """按最近访问时间淘汰,直到总大小降到上限的90%以下(调用方持有锁)"""
+        target = self.max_bytes * 0.9
+        self.conn.execute('BEGIN')
+        try:
+            for url, size in self.conn.execute(
+                'SELECT url, size FROM http_cache ORDER BY accessed'
+            ).fetchall():
+                if self.size <= target:
+                    break
+                self.conn.execute('DELETE FROM http_cache WHERE url = ?', (url,))
+                self.size -= size
+                self.evictions += 1
+            self.conn.execute('COMMIT')
+        except Exception:
+            self.conn.execute('ROLLBACK')
+            raise
+
+    def stats(self) -> Dict:
+        """命中/未命中等计数"""
+        with self._lock:
+            entries = self.conn.execute('SELECT COUNT(*) FROM http_cache').fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'entries': entries,
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'bytes_saved': self.bytes_saved,
+        }
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self.conn.execute('DELETE FROM http_cache')
+            self.size = 0
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
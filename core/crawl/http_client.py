@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Union
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+# 在页面头部查找 <meta charset> 声明,用于响应头未给出编码时的兜底
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.I)
+
+
+class FetchResult:
+    """一次抓取得到的响应"""
+    __slots__ = ('url', 'status', 'headers', 'content', 'content_type', 'encoding', '_text')
+
+    def __init__(self, url: str, status: int = 200, headers: Optional[Dict[str, str]] = None,
+                 content: Union[str, bytes] = b'', content_type: str = '', encoding: Optional[str] = None):
+        """
+        :param url: 最终响应对应的URL
+        :param status: HTTP状态码
+        :param headers: 响应头
+        :param content: 响应体,可以是原始字节或已解码的文本
+        :param content_type: 内容类型
+        :param encoding: 响应体编码,为空时自动探测
+        """
+        self.url = url
+        self.status = status
+        self.headers = headers or {}
+        self.content = content
+        self.content_type = content_type
+        self.encoding = encoding
+        self._text = content if isinstance(content, str) else None
+
+    @property
+    def text(self) -> str:
+        """按响应编码解码后的文本"""
+        if self._text is None:
+            encoding = self.encoding or self._sniff_charset() or 'utf-8'
+            try:
+                self._text = self.content.decode(encoding, errors='replace')
+            except LookupError:
+                self._text = self.content.decode('utf-8', errors='replace')
+        return self._text
+
+    def _sniff_charset(self) -> Optional[str]:
+        """从页面前2KB的meta标签中探测编码"""
+        match = _META_CHARSET.search(self.content[:2048])
+        return match.group(1).decode('ascii') if match else None
+
+
+class AsyncHttpClient:
+    """
+    基于aiohttp的非阻塞HTTP客户端。
+
+    所有请求共用一个连接器,连接器内部按主机维护keep-alive连接池;
+    响应体以分块方式流式读取,超过上限的响应会被中止,避免大页面占满内存。
+    """
+
+    def __init__(self, config: Dict):
+        request_config = config.get('request', {})
+        http_config = config.get('http', {})
+        self.verify = request_config.get('verify', True)
+        self.total_timeout = request_config.get('timeout', 30)
+        self.connect_timeout = http_config.get('connect_timeout', 10)
+        self.read_timeout = http_config.get('read_timeout', self.total_timeout)
+        self.limit = http_config.get('limit', 100)  # 全部主机的连接总数上限
+        self.limit_per_host = http_config.get('limit_per_host', 10)  # 单主机连接上限
+        self.keepalive_timeout = http_config.get('keepalive_timeout', 30)
+        self.max_body_size = http_config.get('max_body_size', 50 * 1024 * 1024)
+        self.chunk_size = http_config.get('chunk_size', 64 * 1024)
+        self.session = None  # aiohttp.ClientSession,第一次请求时创建
+        self._lock = asyncio.Lock()
+
+    async def _get_session(self):
+        """在当前事件循环中延迟创建会话,aiohttp 也在此时才导入"""
+        if self.session is None or self.session.closed:
+            async with self._lock:
+                if self.session is None or self.session.closed:
+                    import aiohttp
+                    connector = aiohttp.TCPConnector(
+                        limit=self.limit,
+                        limit_per_host=self.limit_per_host,
+                        keepalive_timeout=self.keepalive_timeout,
+                        ttl_dns_cache=300,
+                        ssl=None if self.verify else False
+                    )
+                    timeout = aiohttp.ClientTimeout(
+                        total=self.total_timeout,
+                        connect=self.connect_timeout,
+                        sock_read=self.read_timeout
+                    )
+                    self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self.session
+
+    @asynccontextmanager
+    async def open(self, url: str, headers: Optional[Dict[str, str]] = None, stream: bool = False):
+        """
+        发送GET请求并返回尚未读取响应体的响应,供调用方流式读取 response.content
+        :param url: 目标URL
+        :param headers: 请求头
+        :param stream: 为True时不限制总耗时,只保留连接与读取超时,大响应可以边读边处理
+        """
+        session = await self._get_session()
+        kwargs = {}
+        if stream:
+            import aiohttp
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=None, connect=self.connect_timeout,
+                                                      sock_read=self.read_timeout)
+        async with session.get(url, headers=headers, **kwargs) as response:
+            response.raise_for_status()
+            yield response
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchResult:
+        """
+        发送GET请求并流式读取响应体
+        :param url: 目标URL
+        :param headers: 请求头
+        :return: 抓取结果
+        """
+        async with self.open(url, headers) as response:
+            body = bytearray()
+            async for chunk in response.content.iter_chunked(self.chunk_size):
+                body.extend(chunk)
+                if len(body) > self.max_body_size:
+                    raise ValueError(f"响应体超过上限 {self.max_body_size} 字节: {url}")
+            return FetchResult(
+                url=str(response.url),
+                status=response.status,
+                headers=dict(response.headers),
+                content=bytes(body),
+                content_type=response.headers.get('content-type', ''),
+                encoding=response.charset
+            )
+
+    async def close(self):
+        """关闭会话及其连接池"""
+        if self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+
+
+class RequestsClient:
+    """
+    基于 requests 的HTTP客户端。
+
+    requests 是阻塞的,请求在专用线程池中执行: 慢主机或不可用的主机只占用线程,
+    不会卡住事件循环,也不会占满 asyncio.to_thread 使用的默认线程池。
+    所有线程共用一个会话,会话按主机复用keep-alive连接。
+    """
+
+    def __init__(self, config: Dict):
+        import requests
+        request_config = config.get('request', {})
+        self.timeout = request_config.get('timeout', 30)
+        self.threads = request_config.get('threads', 32)  # 同时进行的请求数上限
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=100, pool_maxsize=max(100, self.threads))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(self.threads, thread_name_prefix='hermes-requests')
+
+    def _get(self, url: str, headers: Optional[Dict[str, str]]) -> FetchResult:
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+        return FetchResult(
+            url=response.url,
+            status=response.status_code,
+            headers=dict(response.headers),
+            content=response.content,
+            content_type=response.headers.get('content-type', ''),
+            encoding=response.encoding or response.apparent_encoding
+        )
+
+    async def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchResult:
+        """
+        在线程池中发送GET请求
+        :param url: 目标URL
+        :param headers: 请求头
+        :return: 抓取结果
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._get, url, headers)
+
+    def close(self):
+        """关闭会话;正在进行的请求在各自线程中结束"""
+        self.executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,275 @@
+import html
+import logging
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Union
+from urllib.parse import quote, urljoin, urlsplit
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+# 默认去掉的跟踪参数;另外所有 utm_ 开头的参数都会被去掉
+TRACKING_PARAMS = frozenset({
+    'gclid', 'dclid', 'gbraid', 'wbraid', 'fbclid', 'msclkid', 'yclid', 'igshid',
+    'mc_cid', 'mc_eid', '_ga', '_gl', 'spm',
+})
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# 单次扫描页面: 跳过脚本、样式和注释,记录 <base href>,取出 <a>/<area> 的 href
+_LINK_SCAN = re.compile(
+    r'<script\b.*?</script\s*>|<style\b.*?</style\s*>|<!--.*?-->'
+    r'|<(base|a|area)\b[^>]*?\shref\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))',
+    re.S | re.I
+)
+_PERCENT_ESCAPE = re.compile(r'%[0-9a-fA-F]{2}')
+_CONTROL = re.compile(r'[\t\r\n]')
+# 路径与查询参数中需要百分号编码的字符(空格、非ASCII字符等);已有的百分号编码保持不变
+_UNSAFE = re.compile(r"[^A-Za-z0-9/%:@!$&'()*+,;=\-._~?]")
+_SAFE = "/%:@!$&'()*+,;=-._~?"
+
+
+def _upper_escape(match) -> str:
+    return match.group(0).upper()
+
+
+def _normalize_escapes(text: str) -> str:
+    """编码需要编码的字符,并把百分号编码统一为大写"""
+    if _UNSAFE.search(text):
+        text = quote(text, safe=_SAFE)
+    if '%' in text:
+        text = _PERCENT_ESCAPE.sub(_upper_escape, text)
+    return text
+
+
+def _remove_dot_segments(path: str) -> str:
+    """按 RFC 3986 去掉路径中的 . 和 .. 段"""
+    if '.' not in path:
+        return path
+    segments = path.split('/')
+    if '.' not in segments and '..' not in segments:
+        return path
+    output = []
+    for segment in segments[1:]:
+        if segment == '..':
+            if output:
+                output.pop()
+        elif segment != '.':
+            output.append(segment)
+    if segments[-1] in ('.', '..'):
+        # /a/b/.. 保留末尾的斜杠
+        output.append('')
+    return '/' + '/'.join(output)
+
+
+@lru_cache(maxsize=4096)
+def _origin(base: str) -> str:
+    """页面URL的 协议://主机 部分,用于拼接以 / 开头的链接"""
+    parts = urlsplit(base)
+    return f'{parts.scheme}://{parts.netloc}'
+
+
+def _ascii_host(host: str) -> str:
+    """非ASCII的国际化域名转换为 punycode(xn--)形式,与DNS和HTTP请求中使用的主机名一致"""
+    if host.isascii():
+        return host
+    try:
+        return host.encode('idna').decode('ascii')
+    except UnicodeError:
+        # 无法转换的主机名(如标签过长)保持原样
+        return host
+
+
+@lru_cache(maxsize=4096)
+def _canonical_netloc(scheme: str, netloc: str) -> Optional[str]:
+    """
+    主机名转小写(国际化域名转为 punycode)并去掉默认端口;用户信息区分大小写,保持原样。
+    同一站点的链接反复出现,结果按主机缓存
+    """
+    try:
+        parts = urlsplit(f'{scheme}://{netloc}')
+        host = parts.hostname
+        port = parts.port
+    except ValueError:
+        # 端口非数字、IPv6地址格式错误等
+        return None
+    if not host:
+        return None
+    host = _ascii_host(host.rstrip('.'))
+    if ':' in host:
+        host = f'[{host}]'
+    if '@' in netloc:
+        host = netloc.rpartition('@')[0] + '@' + host
+    if port is not None and port != _DEFAULT_PORTS[scheme]:
+        host = f'{host}:{port}'
+    return host
+
+
+def canonicalize_url(url: str, base: Optional[str] = None,
+                     strip_params: Iterable[str] = TRACKING_PARAMS) -> Optional[str]:
+    """
+    把链接转换为规范形式,同一资源的不同写法得到同一个URL
+    - 相对链接按 base 转为绝对URL,去掉 #片段和路径中的 . / .. 段
+    - 协议和主机名转小写,国际化域名转为 punycode,去掉默认端口,空路径补为 /;用户信息保持原样
+    - 查询参数去掉跟踪参数后排序,百分号编码统一为大写;参数值本身不解码、不改写
+    - 不处理HTML实体: 从页面原文中取出的链接由调用方先解码,DOM给出的属性值已经解码过
+    :param url: 原始链接
+    :param base: 链接所在页面的URL
+    :param strip_params: 需要去掉的查询参数名
+    :return: 规范化的URL;不是 http/https 链接(如 javascript:、mailto:)或无法解析时返回 None
+    """
+    url = url.strip()
+    if not url or url[0] == '#':
+        return None
+    if '\n' in url or '\r' in url or '\t' in url:
+        url = _CONTROL.sub('', url)
+    if base and '://' not in url[:8]:
+        if url[0] == '/' and url[:2] != '//':
+            url = _origin(base) + url
+        else:
+            url = urljoin(base, url)
+    scheme, separator, rest = url.partition('://')
+    scheme = scheme.lower()
+    if not separator or scheme not in _DEFAULT_PORTS:
+        return None
+    rest = rest.partition('#')[0]
+    end = len(rest)
+    for delimiter in '/?':
+        index = rest.find(delimiter)
+        if 0 <= index < end:
+            end = index
+    netloc = _canonical_netloc(scheme, rest[:end])
+    if netloc is None:
+        return None
+    path, _, query = rest[end:].partition('?')
+    path = _normalize_escapes(_remove_dot_segments(path)) if path else '/'
+    if query:
+        params = [
+            param for param in _normalize_escapes(query).split('&')
+            if param and not _is_stripped(param.partition('=')[0], strip_params)
+        ]
+        params.sort()
+        query = '&'.join(params)
+    return f'{scheme}://{netloc}{path}?{query}' if query else f'{scheme}://{netloc}{path}'
+
+
+def _is_stripped(name: str, strip_params) -> bool:
+    return name in strip_params or name.startswith('utm_')
+
+
+class LinkScope:
+    """
+    任务的链接范围规则。
+
+    - domains: 允许的域名,子域名同样允许;"*" 表示不限制。未配置时只允许种子URL所在的站点
+    - include: 正则列表,配置后URL至少要匹配其中一个
+    - exclude: 正则列表,匹配其中任何一个的URL被丢弃
+    """
+
+    def __init__(self, config: Dict, seeds: Union[str, List[str], None] = None):
+        domains = config.get('domains')
+        if domains is None:
+            if isinstance(seeds, str):
+                seeds = [seeds]
+            domains = [urlsplit(seed).hostname or '' for seed in seeds or []]
+            # 从 www.example.com 出发时,同样允许 example.com 的其他子域名
+            domains = [domain[4:] if domain.startswith('www.') else domain for domain in domains if domain]
+        self.any_domain = not domains or '*' in domains
+        self.domains = tuple(_ascii_host(domain.lower().lstrip('.')) for domain in domains if domain != '*')
+        self.include = [re.compile(pattern) for pattern in config.get('include', [])]
+        self.exclude = [re.compile(pattern) for pattern in config.get('exclude', [])]
+        self._hosts: Dict[str, bool] = {}  # 主机 -> 是否在域名范围内
+
+    def allows(self, url: str) -> bool:
+        """规范化后的URL是否在范围内"""
+        if not self.any_domain:
+            # 规范化后的URL形如 scheme://host[:port]/...
+            netloc = url.partition('://')[2].partition('/')[0]
+            allowed = self._hosts.get(netloc)
+            if allowed is None:
+                host = urlsplit(url).hostname or ''
+                allowed = any(host == domain or host.endswith('.' + domain) for domain in self.domains)
+                if len(self._hosts) >= 10000:
+                    self._hosts.clear()
+                self._hosts[netloc] = allowed
+            if not allowed:
+                return False
+        if self.include and not any(pattern.search(url) for pattern in self.include):
+            return False
+        return not any(pattern.search(url) for pattern in self.exclude)
+
+
+class LinkExtractor:
+    """
+    链接发现: 从页面中取出链接,规范化并按任务的范围规则过滤,结果再交给去重存储。
+
+    extract 直接用正则扫描页面原文取出 <a>/<area> 的 href,不构建DOM,href 中的HTML实体在这里解码;
+    模板配置了自定义链接选择器时,由DOM选出的 href(解析器已解码过实体)经 filter 做同样的规范化与过滤。
+    """
+
+    def __init__(self, config: Optional[Dict] = None, seeds: Union[str, List[str], None] = None):
+        """
+        :param config: 任务的 scope 配置,另可用 strip_params 追加要去掉的查询参数
+        :param seeds: 任务的种子URL,用于确定默认的域名范围
+        """
+        config = config or {}
+        self.scope = LinkScope(config, seeds)
+        self.strip_params = TRACKING_PARAMS | frozenset(config.get('strip_params', []))
+        self.found = 0         # 页面中的原始链接数
+        self.invalid = 0       # 非 http/https 或无法解析的链接
+        self.out_of_scope = 0  # 被范围规则丢弃的链接
+        self.kept = 0
+
+    def extract(self, content: str, base_url: str) -> List[str]:
+        """
+        从HTML原文中提取链接
+        :param content: 页面HTML
+        :param base_url: 页面的最终URL,页面中有 <base href> 时以其为准
+        :return: 规范化后、在范围内的链接,按页面中的顺序排列且不重复
+        """
+        hrefs = []
+        base = base_url
+        for match in _LINK_SCAN.finditer(content):
+            tag = match.group(1)
+            if tag is None:
+                continue
+            href = match.group(2) if match.group(2) is not None else match.group(3) or match.group(4) or ''
+            if '&' in href:
+                # 原文中的属性值未经解析器解码,如 &amp; 需要还原为 &
+                href = html.unescape(href)
+            if tag.lower() == 'base':
+                base = urljoin(base_url, href.strip()) if href.strip() else base
+            else:
+                hrefs.append(href)
+        return self._accept(hrefs, base)
+
+    def filter(self, hrefs: Iterable[str], base_url: str) -> List[str]:
+        """规范化并过滤由其他方式(如CSS选择器)取得的链接"""
+        return self._accept(hrefs, base_url)
+
+    def _accept(self, hrefs: Iterable[str], base: str) -> List[str]:
+        seen = set()
+        links = []
+        for href in hrefs:
+            self.found += 1
+            url = canonicalize_url(href, base, self.strip_params)
+            if url is None:
+                self.invalid += 1
+                continue
+            if url in seen:
+                continue
+            seen.add(url)
+            if not self.scope.allows(url):
+                self.out_of_scope += 1
+                continue
+            self.kept += 1
+            links.append(url)
+        return links
+
+    def stats(self) -> Dict:
+        return {
+            'found': self.found,
+            'invalid': self.invalid,
+            'out_of_scope': self.out_of_scope,
+            'kept': self.kept,
+        }
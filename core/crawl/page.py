@@ -0,0 +1,230 @@
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from core.monitor.metrics import PARSE_SECONDS
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+
+class ParserBackend:
+    """
+    HTML解析后端的统一接口。
+
+    各后端直接操作自身的原生节点类型,不额外包装,
+    上层只通过 select/text/attr 访问节点,因此可以按job切换解析器。
+    """
+    name = ''
+
+    def parse(self, content: str) -> Any:
+        """解析文档,返回根节点"""
+        raise NotImplementedError
+
+    def compile(self, selector: str) -> Any:
+        """预编译CSS选择器;不支持预编译的后端直接返回原字符串"""
+        return selector
+
+    def select(self, node: Any, selector: Any) -> List[Any]:
+        """在节点下执行CSS选择器(字符串或 compile 的结果)"""
+        raise NotImplementedError
+
+    def text(self, node: Any) -> str:
+        """节点内全部文本,每段文本去掉首尾空白后拼接"""
+        raise NotImplementedError
+
+    def attr(self, node: Any, name: str) -> Optional[str]:
+        """节点属性值,不存在时返回 None"""
+        raise NotImplementedError
+
+    def html(self, node: Any) -> str:
+        """节点的HTML源码"""
+        raise NotImplementedError
+
+
+class BeautifulSoupBackend(ParserBackend):
+    """BeautifulSoup 后端,可选用 html.parser 或 lxml 作为树构建器"""
+
+    def __init__(self, features: str = 'html.parser'):
+        from bs4 import BeautifulSoup
+        self._soup_class = BeautifulSoup
+        self.features = features
+        self.name = features if features == 'html.parser' else f'bs4-{features}'
+
+    def parse(self, content: str):
+        return self._soup_class(content, self.features)
+
+    def compile(self, selector: str):
+        import soupsieve
+        return soupsieve.compile(selector)
+
+    def select(self, node, selector):
+        if isinstance(selector, str):
+            return node.select(selector)
+        return selector.select(node)
+
+    def text(self, node) -> str:
+        return node.get_text(strip=True)
+
+    def attr(self, node, name: str) -> Optional[str]:
+        value = node.get(name)
+        # class 等多值属性在 BeautifulSoup 中是列表
+        return ' '.join(value) if isinstance(value, list) else value
+
+    def html(self, node) -> str:
+        return str(node)
+
+
+class LxmlBackend(ParserBackend):
+    """lxml.html 原生后端,CSS选择器通过 cssselect 转换为XPath"""
+    name = 'lxml'
+
+    def __init__(self):
+        import lxml.html
+        from cssselect import GenericTranslator
+        from lxml import etree
+        self._lxml_html = lxml.html
+        self._etree = etree
+        self._translator = GenericTranslator()
+
+    def parse(self, content: str):
+        if not content.strip():
+            return self._lxml_html.fromstring('<html></html>')
+        if isinstance(content, str) and content.lstrip().startswith('<?xml'):
+            # 带编码声明的字符串无法直接交给lxml解析
+            content = content.encode('utf-8')
+        return self._lxml_html.document_fromstring(content)
+
+    def compile(self, selector: str):
+        return self._etree.XPath(self._translator.css_to_xpath(selector))
+
+    def select(self, node, selector):
+        if isinstance(selector, str):
+            selector = self.compile(selector)
+        return selector(node)
+
+    def text(self, node) -> str:
+        return ''.join(part.strip() for part in node.itertext())
+
+    def attr(self, node, name: str) -> Optional[str]:
+        return node.get(name)
+
+    def html(self, node) -> str:
+        return self._lxml_html.tostring(node, encoding='unicode')
+
+
+class SelectolaxBackend(ParserBackend):
+    """selectolax(Lexbor) 后端,解析和选择器都在C层完成"""
+    name = 'selectolax'
+
+    def __init__(self):
+        try:
+            from selectolax.lexbor import LexborHTMLParser as HTMLParser
+        except ImportError:  # 旧版本 selectolax 只有 Modest 引擎
+            from selectolax.parser import HTMLParser
+        self._parser_class = HTMLParser
+
+    def parse(self, content: str):
+        return self._parser_class(content)
+
+    def select(self, node, selector):
+        return node.css(selector)
+
+    def text(self, node) -> str:
+        return node.text(deep=True, separator='', strip=True)
+
+    def attr(self, node, name: str) -> Optional[str]:
+        return node.attributes.get(name)
+
+    def html(self, node) -> str:
+        return node.html
+
+
+# 解析后端注册表: 名称 -> 创建函数,对应的第三方库只在首次使用时导入
+PARSER_BACKENDS = {
+    'html.parser': lambda: BeautifulSoupBackend('html.parser'),
+    'bs4-lxml': lambda: BeautifulSoupBackend('lxml'),
+    'lxml': LxmlBackend,
+    'selectolax': SelectolaxBackend
+}
+_backend_instances: Dict[str, ParserBackend] = {}
+
+
+def get_parser_backend(name: Optional[str] = None) -> ParserBackend:
+    """
+    获取解析后端实例(同名后端全局复用)
+    :param name: 后端名称,默认 html.parser
+    """
+    name = name or 'html.parser'
+    backend = _backend_instances.get(name)
+    if backend is None:
+        factory = PARSER_BACKENDS.get(name)
+        if factory is None:
+            raise ValueError(f"不支持的解析器: {name}")
+        backend = _backend_instances[name] = factory()
+    return backend
+
+
+class Page:
+    """
+    一次抓取得到的页面。
+
+    文档在第一次访问时解析,之后字段提取和链接发现共用同一棵DOM(或同一份JSON数据),
+    避免同一页面被重复解析。
+    """
+
+    def __init__(self, url: str, content: str, content_type: Optional[str] = None,
+                 parser: Optional[str] = None):
+        """
+        :param url: 页面URL
+        :param content: 页面内容
+        :param content_type: 内容类型
+        :param parser: 解析后端名称
+        """
+        self.url = url
+        self.content = content
+        self.content_type = content_type or ''
+        self.backend = get_parser_backend(parser)
+        self._document = None
+        self._data = None
+        self._parsed = False
+
+    @property
+    def is_json(self) -> bool:
+        self._parse()
+        return self._data is not None
+
+    @property
+    def data(self) -> Optional[Any]:
+        """JSON内容解析后的数据,非JSON页面为 None"""
+        self._parse()
+        return self._data
+
+    @property
+    def document(self) -> Optional[Any]:
+        """HTML内容解析后的根节点,JSON页面为 None"""
+        self._parse()
+        return self._document
+
+    def _parse(self):
+        if self._parsed:
+            return
+        self._parsed = True
+        started = time.perf_counter()
+        if 'json' in self.content_type.lower():
+            try:
+                self._data = json.loads(self.content)
+                PARSE_SECONDS.labels('json').observe(time.perf_counter() - started)
+                return
+            except json.JSONDecodeError:
+                logger.error("JSON解析失败，尝试作为HTML处理")
+        self._document = self.backend.parse(self.content)
+        PARSE_SECONDS.labels(self.backend.name).observe(time.perf_counter() - started)
+
+    def select(self, selector: Any) -> List[Any]:
+        """在文档根节点上执行CSS选择器"""
+        document = self.document
+        if document is None:
+            return []
+        return self.backend.select(document, selector)
@@ -0,0 +1,373 @@
+import asyncio
+import logging
+import time
+from itertools import islice
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional
+
+from core.monitor.log_sampler import LogSampler
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+# 每个页面都可能出现的日志按类别限流
+sampled_log = LogSampler(logger)
+
+# 通知worker退出的标记
+_STOP = object()
+
+
+class PageTask:
+    """流水线中的一个页面,各阶段的中间结果都保存在这里"""
+    __slots__ = ('url', 'job_name', 'depth', 'fetched', 'cache_entry', 'processor', 'digest', 'follow_links',
+                 'link_selector', 'result', 'new_links', 'pending', 'failed', 'retry_in', 'permanent')
+
+    def __init__(self, url: str, job_name: str, depth: int = 0):
+        self.url = url
+        self.job_name = job_name
+        self.depth = depth
+        self.fetched = None        # 抓取结果 FetchResult
+        self.cache_entry = None    # 等待写入HTTP缓存的响应,页面处理成功后才写入
+        self.processor = None      # 页面的 DataProcessor
+        self.digest = None         # 内容指纹,存储成功后记录
+        self.follow_links = False
+        self.link_selector = None  # 自定义链接选择器;为空时从页面原文中提取链接
+        self.result = {}
+        self.new_links = []
+        self.pending = 0           # 尚未结束的部分: 解析本身以及每一批等待写入的记录
+        self.failed = False        # 任何一部分失败,页面都重新排队
+        self.retry_in = None       # 主机熔断中、请求没有发出时,距离恢复探测的秒数;这次不计入尝试次数
+        self.permanent = False     # 服务器给出了重试也不会成功的响应(如404),不再重新排队
+
+
+class StoreBatch:
+    """交给存储阶段的一批记录"""
+    __slots__ = ('task', 'records')
+
+    def __init__(self, task: PageTask, records: List[Dict]):
+        self.task = task
+        self.records = records
+
+    @property
+    def url(self) -> str:
+        return self.task.url
+
+
+def _batched(records: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    """按 size 条一批取出记录,同一时间只有一批在内存中"""
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Stage:
+    """
+    流水线的一个阶段: 固定数量的worker从有界队列中取出页面处理。
+
+    队列满时上一阶段的 put 会等待,下游处理不过来时上游自然放慢,内存中的页面数有上限。
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[None]], workers: int, queue_size: int,
+                 on_error: Optional[Callable[[Any], None]] = None):
+        """
+        :param name: 阶段名称
+        :param handler: 处理一个页面的协程函数,负责把页面交给下一阶段
+        :param workers: worker数量
+        :param queue_size: 输入队列的容量
+        :param on_error: handler 抛出异常后对该页面的处理,保证页面不会丢在半路
+        """
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue = asyncio.Queue(max(1, queue_size))
+        self.on_error = on_error
+        self.busy = 0
+        self.processed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.blocked_time = 0.0  # 上游因本阶段队列已满而等待的时间
+        self.started = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self, prefix: str = ''):
+        """
+        :param prefix: worker任务名的前缀,任务名为 <prefix>:<阶段>,性能分析时据此区分job
+        """
+        self.started = time.monotonic()
+        name = f'{prefix}:{self.name}' if prefix else self.name
+        self._tasks = [asyncio.create_task(self._work(), name=name) for _ in range(self.workers)]
+
+    async def put(self, item):
+        """放入页面;队列已满时等待"""
+        if self.queue.full():
+            started = time.perf_counter()
+            await self.queue.put(item)
+            self.blocked_time += time.perf_counter() - started
+        else:
+            self.queue.put_nowait(item)
+
+    async def _work(self):
+        while True:
+            item = await self.queue.get()
+            if item is _STOP:
+                return
+            self.busy += 1
+            started = time.perf_counter()
+            try:
+                await self.handler(item)
+            except Exception as e:
+                self.failed += 1
+                sampled_log.error(f'{self.name}_failed',
+                                  f"流水线阶段 {self.name} 处理失败 {getattr(item, 'url', '')}: {str(e)}")
+                if self.on_error is not None:
+                    self.on_error(item)
+            finally:
+                self.busy -= 1
+                self.busy_time += time.perf_counter() - started
+                self.processed += 1
+
+    async def stop(self):
+        """等待队列中已有的页面处理完后停止worker"""
+        for _ in self._tasks:
+            await self.queue.put(_STOP)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict:
+        elapsed = time.monotonic() - self.started if self.started else 0.0
+        return {
+            'workers': self.workers,
+            'queued': self.queue.qsize(),
+            'capacity': self.queue.maxsize,
+            'busy': self.busy,
+            'processed': self.processed,
+            'failed': self.failed,
+            # worker处于处理状态的时间占比(含等待下一阶段队列的时间)
+            'utilization': self.busy_time / (elapsed * self.workers) if elapsed else 0.0,
+            # 上游等待本阶段队列的总秒数;数值持续增长说明本阶段是瓶颈
+            'backpressure': self.blocked_time,
+        }
+
+
+class CrawlPipeline:
+    """
+    抓取 -> 解析/提取 -> 存储 三段式流水线。
+
+    各阶段之间是有界队列,每个阶段有独立的worker数: 存储慢时解析阶段的 put 会等待,
+    进而让抓取阶段停止领取新页面;抓取也不必等在大页面的解析之后。
+    整站抓取时从持久化队列领取URL,同时在途的页面数不超过 max_in_flight。
+    """
+
+    def __init__(self, crawler, config: Dict):
+        pipeline_config = config.get('pipeline', {})
+        pool_workers = crawler.extraction_pool.workers if crawler.extraction_pool else 0
+        self.crawler = crawler
+        self.max_in_flight = pipeline_config.get('max_in_flight', 200)
+        frontier_config = config.get('frontier', {})
+        self.max_attempts = frontier_config.get('max_attempts', 3)
+        self.retry_delay = frontier_config.get('retry_delay', 5)  # 失败后重新排队的等待秒数,每失败一次加倍
+        self.max_retry_delay = frontier_config.get('max_retry_delay', 300)
+        self.store_batch = max(1, pipeline_config.get('store_batch', 500))  # 每批交给存储阶段的记录数
+        self.fetch = Stage('fetch', self._fetch, pipeline_config.get('fetch_workers', 32),
+                           pipeline_config.get('fetch_queue', 64), self._failed)
+        # 页面在事件循环中解析时多个worker并不会更快;使用解析进程池时按进程数并行
+        self.parse = Stage('parse', self._parse,
+                           pipeline_config.get('parse_workers', pool_workers * 2 or 1),
+                           pipeline_config.get('parse_queue', 16), self._failed)
+        self.store = Stage('store', self._store, pipeline_config.get('store_workers', 2),
+                           pipeline_config.get('store_queue', 16), self._store_failed)
+        self.stages = (self.fetch, self.parse, self.store)
+        self.in_flight = 0
+        self._completed: List[str] = []
+        self._failures: List[PageTask] = []
+        self._progress = asyncio.Event()
+        self._on_links: Optional[Callable[[PageTask], Awaitable[None]]] = None
+
+    async def _fetch(self, task: PageTask):
+        crawler = self.crawler
+        job_config = crawler.job_configs[task.job_name]
+        if crawler._streams(task.job_name, job_config):
+            # 流式处理的接口边下载边写入,不经过后两个阶段
+            task.result = await crawler._process_stream(
+                task.url, task.job_name, job_config, crawler.extraction_plans[task.job_name], task
+            )
+            if task.result:
+                self._done(task)
+            else:
+                self._failed(task)
+            return
+        task.fetched = await crawler._fetch(task.url, job_config.get('method', 'requests'), task.job_name, task=task)
+        await self.parse.put(task)
+
+    async def _parse(self, task: PageTask):
+        crawler = self.crawler
+        skipped = await crawler._prepare_page(task, crawler.job_configs[task.job_name])
+        if skipped is not None:
+            task.result = skipped
+            # 未变化的页面已经处理过;未获取到内容(抓取失败或响应为空)时返回空字典,页面重新排队
+            if skipped:
+                self._done(task)
+            else:
+                self._failed(task)
+            return
+        task.pending = 1
+        try:
+            task.result, records = await task.processor.extract()
+        except Exception as e:
+            task.failed = True
+            records = ()
+            sampled_log.error('extract_failed', f"数据处理失败 {task.url}: {str(e)}")
+        try:
+            task.new_links = crawler._discover_links(task)
+            if task.new_links and self._on_links is not None:
+                # 子链接在页面确认完成之前入队,中途退出也不会丢失
+                await self._on_links(task)
+            # 记录边生成边按批交给存储阶段;存储跟不上时在这里等待,整页的记录不会同时留在内存中
+            for batch in _batched(records, self.store_batch):
+                task.pending += 1
+                await self.store.put(StoreBatch(task, batch))
+        except Exception as e:
+            task.failed = True
+            sampled_log.error('extract_failed', f"数据处理失败 {task.url}: {str(e)}")
+        finally:
+            # 记录已全部取出,页面原文与DOM先行释放
+            task.fetched = None
+            task.processor.release()
+        await self._settle(task)
+
+    async def _store(self, batch: StoreBatch):
+        await batch.task.processor.store(batch.records)
+        batch.records = None
+        await self._settle(batch.task)
+
+    def _store_failed(self, batch: StoreBatch):
+        task = batch.task
+        task.failed = True
+        task.pending -= 1
+        if not task.pending:
+            self._failed(task)
+
+    async def _settle(self, task: PageTask):
+        """页面的一部分结束;全部结束后,全部成功的页面记录内容指纹与缓存校验信息并标记完成"""
+        task.pending -= 1
+        if task.pending:
+            return
+        if task.failed:
+            self._failed(task)
+            return
+        try:
+            await self.crawler._remember_page(task)
+        except Exception as e:
+            # 数据已经写入,指纹或校验信息没有记下只会让下次多抓取、提取一遍
+            sampled_log.error('remember_failed', f"记录内容指纹或缓存失败 {task.url}: {str(e)}")
+        self._done(task)
+
+    def _done(self, task: PageTask):
+        self.in_flight -= 1
+        self._completed.append(task.url)
+        self._progress.set()
+
+    def _failed(self, task: PageTask):
+        # 失败的页面交还抓取队列重新排队,超过 max_attempts 次后不再抓取
+        self.in_flight -= 1
+        self._failures.append(task)
+        self._progress.set()
+
+    def _requeue(self, frontier, job_name: str, failures: List[PageTask]) -> int:
+        """
+        失败的页面交还抓取队列(在线程中执行): 熔断中未发出的请求等主机恢复后再试且不计入尝试次数,
+        永久性错误不再重试,其余按指数退避等待后重试
+        :return: 实际发出过请求的页面数
+        """
+        postponed = [
+            (task.url, max(task.retry_in, self.retry_delay)) for task in failures if task.retry_in is not None
+        ]
+        abandoned = [task.url for task in failures if task.retry_in is None and task.permanent]
+        retried = [task.url for task in failures if task.retry_in is None and not task.permanent]
+        if postponed:
+            frontier.postpone(job_name, postponed)
+        if abandoned:
+            frontier.abandon(job_name, abandoned)
+        if retried:
+            frontier.fail(job_name, retried, self.max_attempts, self.retry_delay, self.max_retry_delay)
+        return len(abandoned) + len(retried)
+
+    def start(self, job_name: str = ''):
+        for stage in self.stages:
+            stage.start(job_name)
+
+    async def stop(self):
+        for stage in self.stages:
+            await stage.stop()
+
+    async def crawl(self, job_name: str, frontier, batch_size: int = 50, checkpoint_every: int = 1000,
+                    shard: Optional[int] = None, poll_interval: float = 0.5) -> int:
+        """
+        从持久化队列领取URL并送入流水线,直到队列为空且没有在途页面
+        :param job_name: 任务名称
+        :param frontier: 抓取队列
+        :param batch_size: 每次从队列领取的数量
+        :param checkpoint_every: 每处理多少个URL做一次检查点
+        :param shard: 只领取该分片的URL(多进程模式);此时要等全部分片都没有待抓取的URL才结束
+        :param poll_interval: 本分片暂时为空时,等待其他进程发现新链接的轮询间隔
+        :return: 处理的URL数量
+        """
+        async def push_links(task: PageTask):
+            await asyncio.to_thread(frontier.push, job_name, task.new_links, task.depth + 1)
+
+        self._on_links = push_links
+        processed = 0
+        next_checkpoint = checkpoint_every
+        self.start(job_name)
+        try:
+            while True:
+                if self._failures:
+                    failures, self._failures = self._failures, []
+                    processed += await asyncio.to_thread(self._requeue, frontier, job_name, failures)
+                if self._completed:
+                    completed, self._completed = self._completed, []
+                    await asyncio.to_thread(frontier.complete, job_name, completed)
+                    processed += len(completed)
+                    if processed >= next_checkpoint:
+                        next_checkpoint += checkpoint_every
+                        await asyncio.to_thread(frontier.checkpoint)
+                        logger.info(f"任务 {job_name} 已处理 {processed} 个URL, 队列状态: {frontier.stats(job_name)}, "
+                                    f"流水线: {self.stats()}")
+                room = self.max_in_flight - self.in_flight
+                batch = []
+                if room > 0:
+                    batch = await asyncio.to_thread(frontier.pop_batch, job_name, min(batch_size, room), shard)
+                if batch:
+                    self.in_flight += len(batch)
+                    for url, depth in batch:
+                        # 抓取队列已满时在这里等待,领取速度跟随下游的处理速度
+                        await self.fetch.put(PageTask(url, job_name, depth))
+                    continue
+                if self.in_flight == 0 and not self._completed and not self._failures:
+                    retry_in = await asyncio.to_thread(frontier.next_retry, job_name, shard)
+                    if shard is None:
+                        if retry_in is None:
+                            break
+                        # 失败的URL还没到重试时间
+                        await asyncio.sleep(retry_in)
+                        continue
+                    if retry_in is None and not await asyncio.to_thread(frontier.active, job_name):
+                        break
+                    # 其他进程仍在抓取,它们可能发现属于本分片的链接
+                    await asyncio.sleep(poll_interval if retry_in is None else min(retry_in, poll_interval))
+                    continue
+                self._progress.clear()
+                if self.in_flight and not self._completed and not self._failures:
+                    await self._progress.wait()
+        finally:
+            await self.stop()
+            self._on_links = None
+        return processed
+
+    def stats(self) -> Dict:
+        """各阶段的队列深度与利用率"""
+        return {
+            'in_flight': self.in_flight,
+            **{stage.name: stage.stats() for stage in self.stages},
+        }
@@ -0,0 +1,394 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from core.monitor.metrics import AIMD_ADJUSTMENTS, SLOT_WAIT_SECONDS, host_label
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+# 单主机默认礼貌策略,可被全局 politeness 配置和 job 级 politeness 配置覆盖
+DEFAULT_POLICY = {
+    'concurrency': 8,   # 单主机同时进行的请求数(开启 adaptive 时为初始值)
+    'min_delay': 0.0,   # 同一主机相邻两次请求的最小间隔(秒)
+    'rate': None,       # 令牌桶速率(请求/秒),为空表示不限速
+    'burst': 1,         # 令牌桶容量,允许的突发请求数
+    'adaptive': False,  # 是否根据响应延迟和限流/超时反馈自动调整并发
+    'min_concurrency': 1,
+    'max_concurrency': 64,
+    'latency_tolerance': 1.5,  # 平均延迟超过基线的倍数后不再增加并发,并逐步减小;0表示不看延迟
+    'backoff': 0.5             # 遇到429/503或超时时并发乘以该系数
+}
+
+# 请求结果分类
+OK = 'ok'                # 成功(包括304和4xx等与服务器负载无关的结果)
+THROTTLED = 'throttled'  # 429 / 503,服务器要求降速
+TIMEOUT = 'timeout'      # 超时
+ERROR = 'error'          # 其他错误,不作为调整并发的依据
+CANCELLED = 'cancelled'
+
+
+def classify_exception(error: BaseException) -> str:
+    """根据抓取时抛出的异常判断请求结果,兼容 requests / aiohttp / 浏览器驱动的异常类型"""
+    if isinstance(error, asyncio.CancelledError):
+        return CANCELLED
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)) or 'Timeout' in type(error).__name__:
+        return TIMEOUT
+    status = getattr(error, 'status', None)
+    if status is None:
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None)
+    if status in (429, 503):
+        return THROTTLED
+    return ERROR
+
+
+class TokenBucket:
+    """令牌桶限速器,按预约方式计算下一个令牌可用前需要等待的时间"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = float(rate)
+        self.capacity = max(1, int(burst))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+
+    def reserve(self, now: float) -> float:
+        """
+        预约一个令牌
+        :param now: 当前单调时间
+        :return: 需要等待的秒数,0表示可以立即发出请求
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        # 令牌被预支,等待时间与欠下的令牌数成正比
+        return -self.tokens / self.rate
+
+
+class ConcurrencyLimiter:
+    """可在运行中调整上限的并发限制器,按先来先得的顺序分配槽位"""
+
+    def __init__(self, limit: int):
+        self.limit = max(1, int(limit))
+        self.active = 0
+        self.waiters = deque()
+
+    async def acquire(self):
+        """占用一个槽位,槽位已满时排队等待"""
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 槽位已经分配给了本协程,取消时需要归还
+                self.release()
+            else:
+                self.waiters.remove(waiter)
+            raise
+
+    def release(self):
+        """归还槽位并唤醒排队者"""
+        self.active -= 1
+        self.wake()
+
+    def wake(self):
+        """在并发上限允许的范围内唤醒排队者(上限调大后也需要调用)"""
+        while self.waiters and self.active < self.limit:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+
+    @property
+    def saturated(self) -> bool:
+        """槽位已用满或有请求在排队"""
+        return self.active >= self.limit or bool(self.waiters)
+
+
+class AimdController:
+    """
+    加性增、乘性减(AIMD)的并发控制器。
+
+    槽位用满的情况下,每成功完成 limit 个请求把并发加1;收到429/503或超时时把并发乘以 backoff;
+    平均延迟超过基线(观测到的最小延迟)的 latency_tolerance 倍时说明对方开始排队,并发减1。
+    每次减小后等待两个平均延迟的冷却时间,同一批在途请求的失败只会触发一次减小,期间也不增加。
+    """
+
+    def __init__(self, policy: Dict, floor: Optional[int] = None, ceiling: Optional[int] = None,
+                 scope: str = 'host'):
+        self.floor = max(1, int(floor if floor is not None else policy.get('min_concurrency', 1)))
+        self.ceiling = max(self.floor, int(ceiling if ceiling is not None else policy.get('max_concurrency', 64)))
+        self.latency_tolerance = float(policy.get('latency_tolerance', 1.5))
+        self.backoff = float(policy.get('backoff', 0.5))
+        self.ewma_latency: Optional[float] = None
+        self.min_latency: Optional[float] = None
+        self._samples = 0
+        self._successes = 0
+        self._cooldown_until = 0.0
+        self.increases = 0
+        self.decreases = 0
+        self.throttled = 0
+        self.timeouts = 0
+        self._increased = AIMD_ADJUSTMENTS.labels(scope, 'increase')
+        self._decreased = AIMD_ADJUSTMENTS.labels(scope, 'decrease')
+
+    def _observe_latency(self, latency: float):
+        self.ewma_latency = latency if self.ewma_latency is None else self.ewma_latency * 0.8 + latency * 0.2
+        self._samples += 1
+        if self.min_latency is None or latency < self.min_latency:
+            self.min_latency = latency
+        elif self._samples % 1000 == 0:
+            # 定期以当前平均延迟重新设定基线,适应对方服务能力的长期变化
+            self.min_latency = self.ewma_latency
+
+    def _decrease(self, limiter: ConcurrencyLimiter, now: float, factor: Optional[float]):
+        if now < self._cooldown_until:
+            return
+        if factor is None:
+            new_limit = limiter.limit - 1
+        else:
+            new_limit = int(limiter.limit * factor)
+        new_limit = max(self.floor, new_limit)
+        if new_limit < limiter.limit:
+            limiter.limit = new_limit
+            self.decreases += 1
+            self._decreased.inc()
+        self._successes = 0
+        # 减小前发出的请求大约在两个平均延迟内完成,期间的反馈不再触发调整
+        self._cooldown_until = now + max(2 * (self.ewma_latency or 0.0), 0.05)
+
+    def record(self, limiter: ConcurrencyLimiter, outcome: str, latency: float):
+        """
+        根据一次请求的结果调整限制器的上限
+        :param limiter: 被调整的限制器
+        :param outcome: 请求结果(OK / THROTTLED / TIMEOUT / ERROR)
+        :param latency: 请求耗时(秒)
+        """
+        now = time.monotonic()
+        if outcome == THROTTLED:
+            self.throttled += 1
+            self._decrease(limiter, now, self.backoff)
+        elif outcome == TIMEOUT:
+            self.timeouts += 1
+            self._decrease(limiter, now, self.backoff)
+        elif outcome == OK:
+            self._observe_latency(latency)
+            if self.latency_tolerance > 0 and self.ewma_latency > self.min_latency * self.latency_tolerance:
+                self._decrease(limiter, now, None)
+            elif limiter.saturated and limiter.limit < self.ceiling and now >= self._cooldown_until:
+                self._successes += 1
+                if self._successes >= limiter.limit:
+                    self._successes = 0
+                    limiter.limit += 1
+                    self.increases += 1
+                    self._increased.inc()
+                    limiter.wake()
+
+    def stats(self) -> Dict:
+        return {
+            'floor': self.floor,
+            'ceiling': self.ceiling,
+            'ewma_latency': self.ewma_latency,
+            'min_latency': self.min_latency,
+            'increases': self.increases,
+            'decreases': self.decreases,
+            'throttled': self.throttled,
+            'timeouts': self.timeouts,
+        }
+
+
+class HostState(ConcurrencyLimiter):
+    """单个主机(按job区分)的并发槽位与节流状态"""
+
+    def __init__(self, policy: Dict):
+        super().__init__(policy['concurrency'])
+        self.min_delay = float(policy.get('min_delay') or 0)
+        self.bucket = TokenBucket(policy['rate'], policy.get('burst', 1)) if policy.get('rate') else None
+        self.controller = AimdController(policy) if policy.get('adaptive') else None
+        if self.controller is not None:
+            self.limit = min(max(self.limit, self.controller.floor), self.controller.ceiling)
+        self.next_allowed = 0.0
+        self.requests = 0
+
+    @property
+    def idle(self) -> bool:
+        return self.active == 0 and not self.waiters and self.next_allowed <= time.monotonic()
+
+    def reserve_delay(self) -> float:
+        """根据最小间隔和令牌桶预约本次请求的发出时间,返回需要等待的秒数"""
+        now = time.monotonic()
+        delay = max(0.0, self.next_allowed - now)
+        if self.bucket:
+            delay = max(delay, self.bucket.reserve(now))
+        self.next_allowed = now + delay + self.min_delay
+        self.requests += 1
+        return delay
+
+
+class PolitenessScheduler:
+    """
+    按主机调度请求的礼貌调度器,替代原先所有job共享的 asyncio.Semaphore(10)。
+
+    每个主机拥有一份所有job共享的并发上限、最小请求间隔和令牌桶(按全局 politeness 策略),
+    多个job同时抓取同一网站时合计不超过这份预算;设置了自己 politeness 的job,
+    在此之上再叠加一层 (job, 主机) 的限制,只能比共享预算更严格。
+    只有通过主机节流、真正可以发出的请求才会去竞争全局并发槽位,
+    因此慢主机上排队的请求不会占住全局槽位,就绪的主机总是优先得到连接。
+    """
+
+    def __init__(self, config: Dict):
+        crawler_config = config.get('crawler', {})
+        self.max_hosts = crawler_config.get('max_tracked_hosts', 10000)
+        self._global = ConcurrencyLimiter(crawler_config.get('concurrency', 100))
+        # 全局并发只根据超时调整: 大面积超时通常说明本机带宽或连接资源已经饱和
+        self._global_controller = None
+        if crawler_config.get('adaptive'):
+            self._global_controller = AimdController(
+                dict(crawler_config, latency_tolerance=0),
+                crawler_config.get('min_concurrency', 10),
+                crawler_config.get('max_concurrency', self._global.limit * 4),
+                scope='global'
+            )
+        self._default_policy = dict(DEFAULT_POLICY, **config.get('politeness', {}))
+        # 只记录设置了自己 politeness 的job
+        self._job_policies: Dict[str, Dict] = {}
+        for job in config.get('jobs', []):
+            self.add_job(job)
+        self._hosts: Dict[str, HostState] = {}                  # 主机 -> 所有job共享的状态
+        self._job_hosts: Dict[Tuple[str, str], HostState] = {}  # (job, 主机) -> job自己的附加限制
+
+    def add_job(self, job: Dict):
+        """注册或更新某个job的礼貌策略"""
+        if job.get('politeness'):
+            self._job_policies[job['name']] = dict(self._default_policy, **job['politeness'])
+        else:
+            self._job_policies.pop(job['name'], None)
+
+    def _host_state(self, host: str) -> HostState:
+        """获取(必要时创建)主机的共享状态"""
+        state = self._hosts.get(host)
+        if state is None:
+            if len(self._hosts) >= self.max_hosts:
+                self._prune()
+            state = self._hosts[host] = HostState(self._default_policy)
+        return state
+
+    def _job_state(self, host: str, job_name: Optional[str]) -> Optional[HostState]:
+        """获取job在该主机上的附加限制;job没有自己的 politeness 时为 None"""
+        policy = self._job_policies.get(job_name)
+        if policy is None:
+            return None
+        key = (job_name, host)
+        state = self._job_hosts.get(key)
+        if state is None:
+            if len(self._job_hosts) >= self.max_hosts:
+                self._prune()
+            state = self._job_hosts[key] = HostState(policy)
+        return state
+
+    def _prune(self):
+        """清理已空闲的主机状态,防止长时间运行后无限增长"""
+        for states in (self._hosts, self._job_hosts):
+            for key in [key for key, state in states.items() if state.idle]:
+                del states[key]
+
+    @asynccontextmanager
+    async def slot(self, url: str, job_name: Optional[str] = None):
+        """
+        获取一次请求的发送许可
+        :param url: 目标URL
+        :param job_name: 任务名称,用于叠加job自己的礼貌策略
+        """
+        host = urlsplit(url).netloc.lower()
+        job_state = self._job_state(host, job_name)
+        state = self._host_state(host)
+        waited = time.monotonic()
+        # 先通过job自己的限制,job内排队的请求不占用主机的共享槽位
+        if job_state is not None:
+            await job_state.acquire()
+        try:
+            await state.acquire()
+            try:
+                delay = state.reserve_delay()
+                if job_state is not None:
+                    delay = max(delay, job_state.reserve_delay())
+                    # 两层都以实际发出时间计算下一次请求的最小间隔
+                    sent = time.monotonic() + delay
+                    for layer in (state, job_state):
+                        layer.next_allowed = max(layer.next_allowed, sent + layer.min_delay)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await self._global.acquire()
+                try:
+                    started = time.monotonic()
+                    SLOT_WAIT_SECONDS.labels(host_label(url)).observe(started - waited)
+                    outcome = OK
+                    try:
+                        yield
+                    except BaseException as e:
+                        outcome = classify_exception(e)
+                        raise
+                    finally:
+                        self._record(state, job_state, outcome, time.monotonic() - started)
+                finally:
+                    self._global.release()
+            finally:
+                state.release()
+        finally:
+            if job_state is not None:
+                job_state.release()
+
+    def defer(self, url: str, seconds: float):
+        """让该主机接下来的请求至少等待 seconds 秒(服务器返回 Retry-After 时使用),对所有job生效"""
+        state = self._host_state(urlsplit(url).netloc.lower())
+        state.next_allowed = max(state.next_allowed, time.monotonic() + seconds)
+
+    def _record(self, state: HostState, job_state: Optional[HostState], outcome: str, latency: float):
+        """把请求结果反馈给主机、job与全局的并发控制器"""
+        for layer in (state, job_state):
+            if layer is not None and layer.controller is not None:
+                layer.controller.record(layer, outcome, latency)
+        if self._global_controller is not None and outcome in (OK, TIMEOUT):
+            # 单个主机的限流(429/503)与延迟与本机负载无关,不参与全局调整
+            self._global_controller.record(self._global, outcome, latency)
+
+    @property
+    def global_limit(self) -> int:
+        return self._global.limit
+
+    @staticmethod
+    def _state_stats(state: HostState) -> Dict:
+        entry = {
+            'limit': state.limit,
+            'active': state.active,
+            'waiting': len(state.waiters),
+            'requests': state.requests
+        }
+        if state.controller is not None:
+            entry['adaptive'] = state.controller.stats()
+        return entry
+
+    def stats(self) -> Dict:
+        """返回调度器当前状态,便于监控"""
+        stats = {
+            'global_limit': self._global.limit,
+            'global_active': self._global.active,
+            'global_waiting': len(self._global.waiters),
+            'hosts': {host: self._state_stats(state) for host, state in self._hosts.items()},
+            'job_hosts': {
+                f'{job_name}|{host}': self._state_stats(state) for (job_name, host), state in self._job_hosts.items()
+            }
+        }
+        if self._global_controller is not None:
+            stats['global_adaptive'] = self._global_controller.stats()
+        return stats
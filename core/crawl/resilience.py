@@ -0,0 +1,259 @@
+import asyncio
+import email.utils
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+# 熔断器状态
+CLOSED = 'closed'        # 正常放行
+OPEN = 'open'            # 主机被判定为不可用,请求直接失败
+HALF_OPEN = 'half_open'  # 冷却结束,放行少量探测请求
+
+# 默认重试的HTTP状态码
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    """主机的熔断器处于打开状态,请求未发出"""
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"主机 {host} 已熔断, {retry_in:.0f}秒后重新探测")
+        self.host = host
+        self.retry_in = retry_in
+
+
+def _status_of(error: BaseException) -> Optional[int]:
+    """取出HTTP错误的状态码(aiohttp 为 status,requests 为 response.status_code)"""
+    status = getattr(error, 'status', None)
+    if status is None:
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def _headers_of(error: BaseException) -> Dict:
+    headers = getattr(error, 'headers', None)
+    if headers is None:
+        response = getattr(error, 'response', None)
+        headers = getattr(response, 'headers', None)
+    return headers or {}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头,支持秒数和HTTP日期两种格式"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class CircuitBreaker:
+    """
+    单个主机的熔断器。
+
+    连续失败 failure_threshold 次后打开,reset_timeout 秒内的请求直接失败;
+    冷却结束后进入半开状态,只放行 half_open_probes 个探测请求,探测成功则关闭,
+    失败则重新打开,且冷却时间加倍(不超过 max_reset_timeout)。
+    """
+
+    def __init__(self, host: str, config: Dict):
+        self.host = host
+        self.failure_threshold = config.get('failure_threshold', 5)
+        self.base_reset_timeout = config.get('reset_timeout', 30)
+        self.max_reset_timeout = config.get('max_reset_timeout', 300)
+        self.half_open_probes = config.get('half_open_probes', 1)
+        self.state = CLOSED
+        self.failures = 0
+        self.reset_timeout = self.base_reset_timeout
+        self.opened_at = 0.0
+        self.probes = 0
+        self.rejected = 0
+        self.trips = 0
+
+    def before_request(self):
+        """请求发出前调用;熔断中时抛出 CircuitOpenError"""
+        if self.state == CLOSED:
+            return
+        now = time.monotonic()
+        if self.state == OPEN:
+            remaining = self.opened_at + self.reset_timeout - now
+            if remaining > 0:
+                self.rejected += 1
+                raise CircuitOpenError(self.host, remaining)
+            self.state = HALF_OPEN
+            self.probes = 0
+        if self.probes >= self.half_open_probes:
+            # 探测请求尚未返回,其余请求继续快速失败
+            self.rejected += 1
+            raise CircuitOpenError(self.host, 0)
+        self.probes += 1
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info(f"主机 {self.host} 已恢复")
+        self.state = CLOSED
+        self.failures = 0
+        self.reset_timeout = self.base_reset_timeout
+
+    def record_failure(self):
+        now = time.monotonic()
+        if self.state == HALF_OPEN:
+            # 探测失败,延长冷却时间
+            self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+            self._open(now)
+            return
+        self.failures += 1
+        if self.state == CLOSED and self.failures >= self.failure_threshold:
+            self._open(now)
+
+    def release_probe(self):
+        """探测请求既未成功也未失败(如被取消)时归还探测名额"""
+        if self.state == HALF_OPEN and self.probes > 0:
+            self.probes -= 1
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self.opened_at = now
+        self.trips += 1
+        logger.warning(f"主机 {self.host} 连续失败,熔断 {self.reset_timeout:.0f} 秒")
+
+    def stats(self) -> Dict:
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'reset_timeout': self.reset_timeout,
+            'trips': self.trips,
+            'rejected': self.rejected,
+        }
+
+
+class ResilientFetcher:
+    """
+    抓取的重试与熔断层。
+
+    每次尝试前先检查主机的熔断器,熔断中的主机直接失败,不占用连接和并发槽位;
+    可重试的错误(超时、连接错误、429/5xx)按指数退避加随机抖动重试,
+    服务器给出 Retry-After 时按其要求等待。重试的等待发生在并发槽位之外。
+    """
+
+    def __init__(self, config: Dict):
+        request_config = config.get('request', {})
+        self.retries = request_config.get('retries', 3)
+        self.backoff_base = request_config.get('backoff_base', 0.5)
+        self.backoff_max = request_config.get('backoff_max', 30)
+        self.max_retry_after = request_config.get('max_retry_after', 120)
+        self.retry_statuses = set(request_config.get('retry_statuses', RETRY_STATUSES))
+        self.breaker_config = config.get('circuit_breaker', {})
+        self.breaker_enabled = self.breaker_config.get('enabled', True)
+        self.max_hosts = config.get('crawler', {}).get('max_tracked_hosts', 10000)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.attempts = 0
+        self.retried = 0
+        self.failed = 0
+
+    def breaker(self, url: str) -> Optional[CircuitBreaker]:
+        """URL所属主机的熔断器"""
+        if not self.breaker_enabled:
+            return None
+        host = urlsplit(url).netloc.lower()
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            if len(self._breakers) >= self.max_hosts:
+                # 只保留仍有失败记录的主机
+                self._breakers = {
+                    key: value for key, value in self._breakers.items()
+                    if value.state != CLOSED or value.failures
+                }
+            breaker = self._breakers[host] = CircuitBreaker(host, self.breaker_config)
+        return breaker
+
+    def classify(self, error: BaseException) -> Tuple[bool, bool, Optional[float]]:
+        """
+        判断一次失败
+        :return: (是否重试, 是否计入主机故障, 服务器要求的等待秒数)
+        """
+        status = _status_of(error)
+        if status is not None:
+            retry_after = None
+            if status in (429, 503):
+                retry_after = parse_retry_after(_headers_of(error).get('Retry-After'))
+            return status in self.retry_statuses, status >= 500, retry_after
+        if isinstance(error, (ValueError, TypeError, KeyError)):
+            # 响应体过大、参数错误等,重试也不会成功
+            return False, False, None
+        # 超时、连接错误以及浏览器驱动的异常都视为暂时性故障
+        return True, True, None
+
+    def backoff(self, attempt: int) -> float:
+        """第 attempt 次重试前的等待时间: 指数退避 + 完全随机抖动"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def call(self, url: str, attempt_fn: Callable[[], Awaitable[Any]],
+                   on_retry_after: Optional[Callable[[float], None]] = None) -> Any:
+        """
+        执行一次带重试与熔断的抓取
+        :param url: 目标URL,用于选择熔断器
+        :param attempt_fn: 执行单次抓取的协程函数,失败时抛出异常
+        :param on_retry_after: 服务器要求等待时的回调,用于让同一主机的其他请求一起等待
+        :return: attempt_fn 的返回值;全部尝试失败时抛出最后一次的异常
+        """
+        breaker = self.breaker(url)
+        attempt = 0
+        while True:
+            if breaker is not None:
+                breaker.before_request()
+            self.attempts += 1
+            try:
+                result = await attempt_fn()
+            except asyncio.CancelledError:
+                if breaker is not None:
+                    breaker.release_probe()
+                raise
+            except Exception as e:
+                retryable, host_failure, retry_after = self.classify(e)
+                if breaker is not None:
+                    if host_failure:
+                        breaker.record_failure()
+                    else:
+                        # 主机给出了响应(如404),说明主机本身可用
+                        breaker.record_success()
+                if not retryable or attempt >= self.retries:
+                    self.failed += 1
+                    raise
+                if retry_after is not None:
+                    delay = min(retry_after, self.max_retry_after)
+                    if on_retry_after is not None:
+                        on_retry_after(delay)
+                else:
+                    delay = self.backoff(attempt)
+                attempt += 1
+                self.retried += 1
+                logger.debug(f"第 {attempt} 次重试 {url}, {delay:.2f}秒后: {str(e)}")
+                await asyncio.sleep(delay)
+                continue
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+    def stats(self) -> Dict:
+        return {
+            'attempts': self.attempts,
+            'retried': self.retried,
+            'failed': self.failed,
+            'hosts': {
+                host: breaker.stats()
+                for host, breaker in self._breakers.items()
+                if breaker.state != CLOSED or breaker.failures
+            }
+        }
@@ -0,0 +1,282 @@
+import asyncio
+import copy
+import inspect
+import logging
+import multiprocessing
+import os
+import queue
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+
+from core.crawl.dedup import create_dedup_store
+from core.crawl.frontier import CrawlFrontier
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+# 工作进程发给协调进程的消息类型
+_RECORDS = 'records'
+_DONE = 'done'
+
+
+class QueueStorage:
+    """
+    工作进程使用的存储: 记录按表缓冲后成批发给协调进程,由协调进程写入统一的存储。
+    队列已满时发送会等待,协调进程写入跟不上时工作进程随之放慢。
+    """
+
+    def __init__(self, channel, batch_size: int = 500, flush_interval: float = 1.0):
+        """
+        :param channel: 发往协调进程的 multiprocessing 队列
+        :param batch_size: 每批记录数
+        :param flush_interval: 缓冲中的记录最长停留时间(秒)
+        """
+        self.channel = channel
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffers: Dict[str, List[Dict]] = defaultdict(list)
+        self.last_send = time.monotonic()
+        self.sent = 0
+
+    async def save(self, table_name: str, data: Dict):
+        buffer = self.buffers[table_name]
+        buffer.append(data)
+        if len(buffer) >= self.batch_size or time.monotonic() - self.last_send >= self.flush_interval:
+            await self.flush()
+
+    async def save_many(self, table_name: str, records):
+        for record in records:
+            await self.save(table_name, record)
+
+    async def flush(self):
+        for table_name in list(self.buffers):
+            batch = self.buffers.pop(table_name)
+            if batch:
+                await asyncio.to_thread(self.channel.put, (_RECORDS, table_name, batch))
+                self.sent += len(batch)
+        self.last_send = time.monotonic()
+
+    async def close(self):
+        await self.flush()
+
+
+def worker_config(config: Dict, job_name: str, shard: int, shards: int) -> Dict:
+    """
+    工作进程使用的配置: 只保留要抓取的job,队列与去重存储按多进程共享的方式打开
+    :param config: 完整配置
+    :param job_name: 任务名称
+    :param shard: 工作进程负责的分片
+    :param shards: 分片总数
+    """
+    config = copy.deepcopy(config)
+    config['jobs'] = [job for job in config.get('jobs', []) if job.get('name') == job_name]
+    # 断点恢复与重新分片只由协调进程执行,避免工作进程把其他进程正在抓取的URL放回队列
+    config['frontier'] = dict(config.get('frontier', {}), shards=shards, recover=False)
+    for job in config['jobs']:
+        dedup_config = dict(job.get('bloomfilter', {}))
+        if dedup_config.get('mode') == 'memory':
+            # 匿名内存无法在进程之间共享
+            dedup_config['mode'] = 'bloom'
+        dedup_config['shared'] = True
+        job['bloomfilter'] = dedup_config
+    archive_config = config.get('archive')
+    if archive_config:
+        # 存档分段文件只能由一个进程追加,每个分片使用单独的目录
+        config['archive'] = dict(archive_config, path=os.path.join(archive_config.get('path', 'data/archive'),
+                                                                    f'shard-{shard:03d}'))
+    return config
+
+
+def _worker_main(config: Dict, job_name: str, shard: int, shards: int, channel, log_level: int):
+    """工作进程入口: 运行自己的事件循环与 WebCrawler,只抓取本分片的URL"""
+    logging.basicConfig(
+        level=log_level,
+        format=f'%(asctime)s - worker-{shard} - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    async def run():
+        from core.crawl.crawler import WebCrawler
+
+        workers_config = config.get('workers', {})
+        storage = QueueStorage(channel, workers_config.get('batch_size', 500),
+                               workers_config.get('flush_interval', 1.0))
+        crawler = WebCrawler(worker_config(config, job_name, shard, shards), storage)
+        processed = 0
+        try:
+            await crawler.initialize()
+            processed = await crawler.crawl_shard(job_name, shard, workers_config.get('poll_interval', 0.5))
+        finally:
+            await storage.close()
+            await crawler.close()
+        return processed
+
+    processed = 0
+    try:
+        processed = asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.error(f"工作进程 {shard} 异常退出: {str(e)}")
+    finally:
+        channel.put((_DONE, shard, processed))
+
+
+class WorkerCoordinator:
+    """
+    多进程抓取的协调进程。
+
+    一台机器上启动 workers 个工作进程,每个进程运行自己的事件循环和 WebCrawler。
+    URL按主机名分片,同一主机只由一个进程抓取,按主机的礼貌策略依然有效;
+    所有进程共用同一个持久化队列(SQLite)和去重文件,新发现的链接写入队列时按主机分到对应的进程。
+    各进程提取的记录发回协调进程,由协调进程写入配置中的存储。
+    工作进程没有正常结束就退出(如被系统杀掉)时,协调进程把它领取后未完成的URL放回队列并重新启动它,
+    同一分片重启超过 max_restarts 次后停止整个抓取,剩余的URL留在队列中,下次运行时继续。
+
+    跨机器扩展时分片的划分方式不变(见 frontier.shard_for),需要把队列和去重存储换成各节点都能访问的服务。
+    """
+
+    def __init__(self, config: Dict, storage, workers: Optional[int] = None):
+        """
+        :param config: 完整配置
+        :param storage: 汇总记录的存储
+        :param workers: 工作进程数,默认为 workers.processes 或CPU核数
+        """
+        self.config = config
+        self.storage = storage
+        workers_config = config.get('workers', {})
+        self.workers = workers or workers_config.get('processes') or os.cpu_count() or 1
+        self.queue_size = workers_config.get('queue_size', 64)  # 等待写入的批次数上限
+        self.max_restarts = workers_config.get('max_restarts', 3)  # 每个分片的工作进程最多重启几次
+        self.records = 0
+        self.processed: Dict[int, int] = {}
+        self.restarts: Dict[int, int] = defaultdict(int)
+        self._processes: Dict[int, multiprocessing.process.BaseProcess] = {}
+        self._exited: Set[int] = set()
+
+    def _prepare(self, job_name: str, resume: bool) -> CrawlFrontier:
+        """恢复上次未完成的URL、按当前进程数重新分片并放入种子URL;不续爬时先清空队列与去重文件"""
+        job_config = next(job for job in self.config.get('jobs', []) if job.get('name') == job_name)
+        frontier_config = self.config.get('frontier', {})
+        frontier = CrawlFrontier(frontier_config.get('path', 'data/frontier.db'), self.workers)
+        if not resume:
+            frontier.clear(job_name)
+            # 工作进程启动前清空它们共享的去重文件,与队列保持一致
+            shared_job = worker_config(self.config, job_name, 0, self.workers)['jobs'][0]
+            dedup_store = create_dedup_store(job_name, shared_job.get('bloomfilter', {}),
+                                             self.config.get('dedup', {}).get('path', 'data/dedup'))
+            try:
+                dedup_store.clear()
+            finally:
+                dedup_store.close()
+        if not resume or not frontier.pending(job_name):
+            frontier.seed(job_name, job_config['url'])
+        else:
+            moved = frontier.reshard(job_name)
+            logger.info(f"任务 {job_name} 从断点继续抓取, 重新分片 {moved} 个URL")
+        return frontier
+
+    async def _save(self, table_name: str, records: List[Dict]):
+        """写入一批记录,兼容同步与异步、有无批量接口的存储实现"""
+        save_many = getattr(self.storage, 'save_many', None)
+        if save_many is not None:
+            saved = save_many(table_name, records)
+            if inspect.isawaitable(saved):
+                await saved
+        else:
+            for record in records:
+                saved = self.storage.save(table_name, record)
+                if inspect.isawaitable(saved):
+                    await saved
+        self.records += len(records)
+
+    def _start_worker(self, context, job_name: str, shard: int, channel):
+        process = context.Process(target=_worker_main, name=f'hermes-worker-{shard}',
+                                  args=(self.config, job_name, shard, self.workers, channel,
+                                        logging.getLogger().getEffectiveLevel()))
+        process.start()
+        self._processes[shard] = process
+
+    async def _replace_dead_workers(self, context, job_name: str, channel, frontier: CrawlFrontier) -> bool:
+        """
+        重启没有发出 _DONE 就退出的工作进程,它领取的URL先放回队列,否则会一直处于抓取中,
+        其他进程也会一直等待这些URL完成
+        :return: 为 False 时有分片重启次数已用完,应停止抓取
+        """
+        exited = {
+            shard for shard, process in self._processes.items()
+            if shard not in self.processed and not process.is_alive()
+        }
+        # 进程退出前发出的消息可能还在队列中,连续两次检查都已退出才认定它没有正常结束
+        dead, self._exited = exited & self._exited, exited
+        for shard in sorted(dead):
+            process = self._processes[shard]
+            if self.restarts[shard] >= self.max_restarts:
+                logger.error(f"工作进程 {shard} 已重启 {self.restarts[shard]} 次仍然异常退出, 停止抓取, "
+                             f"剩余的URL留在队列中, 下次运行时继续")
+                return False
+            recovered = await asyncio.to_thread(frontier.resume, job_name, shard)
+            self.restarts[shard] += 1
+            self._exited.discard(shard)
+            logger.error(f"工作进程 {shard} 意外退出(exitcode={process.exitcode}), "
+                         f"放回 {recovered} 个未完成的URL并重新启动")
+            self._start_worker(context, job_name, shard, channel)
+        return True
+
+    async def _drain(self, channel):
+        """写入停止抓取时仍在队列中的记录"""
+        while True:
+            try:
+                message = channel.get_nowait()
+            except queue.Empty:
+                return
+            if message[0] == _RECORDS:
+                await self._save(message[1], message[2])
+
+    async def run(self, job_name: str, resume: bool = True) -> int:
+        """
+        用多个工作进程抓取整个站点,直到全部分片都没有待抓取的URL
+        :param job_name: 任务名称
+        :param resume: 是否从上次中断的位置继续
+        :return: 全部进程处理的URL数量
+        """
+        if not any(job.get('name') == job_name for job in self.config.get('jobs', [])):
+            logger.error(f"job_config 未找到: {job_name}")
+            return 0
+        started = time.perf_counter()
+        frontier = await asyncio.to_thread(self._prepare, job_name, resume)
+        # spawn 方式启动的进程不继承父进程的线程与事件循环
+        context = multiprocessing.get_context('spawn')
+        channel = context.Queue(self.queue_size)
+        self._processes, self._exited = {}, set()
+        for shard in range(self.workers):
+            self._start_worker(context, job_name, shard, channel)
+        logger.info(f"任务 {job_name} 已启动 {self.workers} 个工作进程")
+        try:
+            while len(self.processed) < self.workers:
+                try:
+                    message = await asyncio.to_thread(channel.get, True, 1.0)
+                except queue.Empty:
+                    if not await self._replace_dead_workers(context, job_name, channel, frontier):
+                        for process in self._processes.values():
+                            process.terminate()
+                        await self._drain(channel)
+                        break
+                    continue
+                if message[0] == _RECORDS:
+                    await self._save(message[1], message[2])
+                else:
+                    self.processed[message[1]] = message[2]
+        finally:
+            for process in self._processes.values():
+                await asyncio.to_thread(process.join, 10)
+                if process.is_alive():
+                    process.terminate()
+            stats = await asyncio.to_thread(frontier.stats, job_name)
+            await asyncio.to_thread(frontier.close)
+        total = sum(self.processed.values())
+        elapsed = time.perf_counter() - started
+        logger.info(f"任务 {job_name} 多进程抓取完成, 共处理 {total} 个URL, 写入 {self.records} 条记录, "
+                    f"耗时 {elapsed:.1f}s, 各进程: {dict(sorted(self.processed.items()))}, "
+                    f"重启次数: {dict(self.restarts)}, 队列状态: {stats}")
+        return total
@@ -0,0 +1,19 @@
+# 按需导入: 只记录指标时不加载 fastapi
+_EXPORTS = {
+    'REGISTRY': '.metrics',
+    'LogSampler': '.log_sampler',
+    'create_metrics_router': '.api',
+    'create_profiler_router': '.api',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
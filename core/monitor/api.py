@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
+
+from core.monitor.metrics import CONTENT_TYPE, REGISTRY
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+# 采集时根据各组件的当前状态重新设置的指标
+PIPELINE_QUEUED = REGISTRY.gauge('hermes_pipeline_queued', '流水线各阶段队列中的页面数', ('job', 'stage'))
+PIPELINE_BUSY = REGISTRY.gauge('hermes_pipeline_busy_workers', '流水线各阶段正在处理的worker数', ('job', 'stage'))
+PIPELINE_BACKPRESSURE = REGISTRY.gauge(
+    'hermes_pipeline_backpressure_seconds', '上游因该阶段队列已满而等待的累计时间', ('job', 'stage')
+)
+GLOBAL_ACTIVE = REGISTRY.gauge('hermes_global_active_requests', '所有主机正在进行的请求数')
+GLOBAL_WAITING = REGISTRY.gauge('hermes_global_waiting_requests', '等待全局并发槽位的请求数')
+GLOBAL_LIMIT = REGISTRY.gauge('hermes_global_concurrency_limit', '全局并发上限,开启 crawler.adaptive 时随AIMD调整')
+HOST_ACTIVE = REGISTRY.gauge('hermes_host_active_requests', '各主机正在进行的请求数', ('job', 'host'))
+HOST_WAITING = REGISTRY.gauge('hermes_host_waiting_requests', '各主机等待并发槽位的请求数', ('job', 'host'))
+HOST_LIMIT = REGISTRY.gauge('hermes_host_concurrency_limit', '各主机当前的并发上限', ('job', 'host'))
+CIRCUIT_OPEN = REGISTRY.gauge('hermes_circuit_open', '处于熔断(open)或半开探测(half_open)状态的主机', ('host', 'state'))
+RETRIES = REGISTRY.gauge('hermes_fetch_retries', '抓取重试的累计次数')
+DEDUP_ENTRIES = REGISTRY.gauge('hermes_dedup_entries', '去重存储中的URL数', ('job',))
+HTTP_CACHE_HIT_RATIO = REGISTRY.gauge('hermes_http_cache_hit_ratio', 'HTTP条件请求缓存的命中率')
+STORAGE_BUFFERED = REGISTRY.gauge('hermes_storage_buffered_bytes', '文件存储缓冲中尚未写盘的字节数', ('table',))
+
+
+async def collect_crawler_metrics(crawler):
+    """把爬虫各组件的当前状态写入对应的指标,在每次采集时调用;需要查询数据库的部分在线程中执行"""
+    for metric in (PIPELINE_QUEUED, PIPELINE_BUSY, PIPELINE_BACKPRESSURE, HOST_ACTIVE, HOST_WAITING, HOST_LIMIT,
+                   CIRCUIT_OPEN, DEDUP_ENTRIES, STORAGE_BUFFERED):
+        # 已结束的流水线和已回收的主机不再输出
+        metric.clear()
+    for job_name, stats in crawler.pipeline_stats().items():
+        for stage in ('fetch', 'parse', 'store'):
+            PIPELINE_QUEUED.labels(job_name, stage).set(stats[stage]['queued'])
+            PIPELINE_BUSY.labels(job_name, stage).set(stats[stage]['busy'])
+            PIPELINE_BACKPRESSURE.labels(job_name, stage).set(stats[stage]['backpressure'])
+    politeness = crawler.politeness.stats()
+    GLOBAL_ACTIVE.set(politeness['global_active'])
+    GLOBAL_WAITING.set(politeness['global_waiting'])
+    GLOBAL_LIMIT.set(politeness['global_limit'])
+    # 主机共享的预算不带 job 标签,job自己的附加限制带 job 标签
+    hosts = [('', host_name, host) for host_name, host in politeness['hosts'].items()]
+    hosts += [(*key.split('|', 1), host) for key, host in politeness['job_hosts'].items()]
+    for job_name, host_name, host in hosts:
+        HOST_ACTIVE.labels(job_name, host_name).set(host['active'])
+        HOST_WAITING.labels(job_name, host_name).set(host['waiting'])
+        HOST_LIMIT.labels(job_name, host_name).set(host['limit'])
+    resilience = crawler.resilience.stats()
+    RETRIES.set(resilience['retried'])
+    for host_name, breaker in resilience['hosts'].items():
+        if breaker['state'] != 'closed':
+            CIRCUIT_OPEN.labels(host_name, breaker['state']).set(1)
+    for job_name, dedup_store in crawler.bloom_filters.items():
+        DEDUP_ENTRIES.labels(job_name).set(len(dedup_store))
+    if crawler.http_cache is not None:
+        HTTP_CACHE_HIT_RATIO.set((await asyncio.to_thread(crawler.http_cache.stats))['hit_rate'])
+    storage_stats = getattr(crawler.storage, 'stats', None)
+    if storage_stats is not None:
+        for table, stats in storage_stats().items():
+            if isinstance(stats, dict) and 'buffered_bytes' in stats:
+                STORAGE_BUFFERED.labels(table).set(stats['buffered_bytes'])
+
+
+def create_metrics_router(crawler=None, path: str = '/metrics') -> APIRouter:
+    """
+    创建提供 Prometheus 采集接口的路由
+    :param crawler: 爬虫实例,传入时每次采集前读取流水线、主机并发等当前状态
+    :param path: 接口路径
+    """
+    router = APIRouter()
+
+    @router.get(path, include_in_schema=False)
+    async def metrics() -> Response:
+        if crawler is not None:
+            try:
+                await collect_crawler_metrics(crawler)
+            except Exception as e:
+                # 状态读取失败时仍然返回已有的计数
+                logger.error(f"读取爬虫状态失败: {str(e)}")
+        return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+    return router
+
+
+def create_profiler_router(max_seconds: float = 120, path: str = '/profile') -> APIRouter:
+    """
+    创建按需性能分析的路由: 请求期间对正在运行的事件循环做限时分析,结束后返回结果
+    :param max_seconds: 单次分析的最长时间
+    :param path: 接口路径
+    """
+    router = APIRouter()
+
+    @router.get(path, include_in_schema=False)
+    async def run_profile(seconds: float = 10, mode: str = 'sampling', format: Optional[str] = None,
+                          job: Optional[str] = None, interval: float = 0.005,
+                          block_threshold: float = 0.1) -> Response:
+        """
+        :param seconds: 分析时长
+        :param mode: sampling(采样,开销小)或 cprofile(记录全部函数调用)
+        :param format: sampling 支持 json(默认) / folded(火焰图折叠栈);cprofile 支持 text(默认) / prof(pstats文件)
+        :param job: 只统计该job的流水线任务(仅 sampling)
+        :param interval: 采样间隔(秒)
+        :param block_threshold: 记为事件循环阻塞的最短时间(秒)
+        """
+        from core.monitor.profiler import ProfilerBusyError, profile
+
+        formats = {'sampling': ('json', 'folded'), 'cprofile': ('text', 'prof')}
+        if mode in formats and format is None:
+            format = formats[mode][0]
+        if mode not in formats or format not in formats[mode]:
+            raise HTTPException(400, f"不支持的分析方式或格式: {mode} / {format}")
+        if not 0 < seconds <= max_seconds:
+            raise HTTPException(400, f"分析时长须在 0 到 {max_seconds} 秒之间")
+        options = {'interval': max(interval, 0.001), 'job': job, 'block_threshold': block_threshold}
+        try:
+            result = await profile(seconds, mode, **(options if mode == 'sampling' else {}))
+        except ProfilerBusyError as e:
+            raise HTTPException(409, str(e))
+        if format == 'folded':
+            return PlainTextResponse(result.folded())
+        if format == 'text':
+            return PlainTextResponse(result.text())
+        if format == 'prof':
+            return Response(result.dump(), media_type='application/octet-stream',
+                            headers={'Content-Disposition': 'attachment; filename="hermes.prof"'})
+        return JSONResponse(result.summary())
+
+    return router
@@ -0,0 +1,59 @@
+import logging
+import threading
+import time
+from typing import Dict, List
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+
+class LogSampler:
+    """
+    热路径日志的限流: 同一类日志每个时间窗口只输出前 burst 条,其余只计数,
+    下个窗口第一次输出时附带被省略的条数。
+
+    一个主机不可用时每个URL都会失败,逐条输出会淹没日志并拖慢抓取;
+    限流后仍能看到每类问题的样例和总量,准确的计数见 /metrics。
+    """
+
+    def __init__(self, target: logging.Logger, interval: float = 60.0, burst: int = 5):
+        """
+        :param target: 输出日志的logger
+        :param interval: 时间窗口(秒)
+        :param burst: 每个窗口内每类日志最多输出的条数
+        """
+        self.target = target
+        self.interval = interval
+        self.burst = burst
+        self._windows: Dict[str, List] = {}  # 类别 -> [窗口开始时间, 已输出条数, 省略条数]
+        self._lock = threading.Lock()
+
+    def log(self, level: int, key: str, message: str):
+        """
+        :param level: 日志级别
+        :param key: 日志类别,同一类别共享配额(如 'fetch_failed')
+        :param message: 日志内容
+        """
+        if not self.target.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window is not None else 0
+                window = self._windows[key] = [now, 0, 0]
+            else:
+                suppressed = 0
+            if window[1] >= self.burst:
+                window[2] += 1
+                return
+            window[1] += 1
+        if suppressed:
+            message = f"{message} (前 {self.interval:.0f} 秒内另有 {suppressed} 条同类日志被省略)"
+        self.target.log(level, message)
+
+    def warning(self, key: str, message: str):
+        self.log(logging.WARNING, key, message)
+
+    def error(self, key: str, message: str):
+        self.log(logging.ERROR, key, message)
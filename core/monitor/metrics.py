@@ -0,0 +1,266 @@
+import logging
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+# Prometheus 文本格式的 Content-Type
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 延迟类指标默认的分桶上界(秒)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# 标签组合超过上限后归入该值,避免按主机等标签无限增长
+OVERFLOW_LABEL = 'other'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个为 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+
+class Metric:
+    """
+    一个指标及其按标签区分的序列。
+
+    labels() 返回的子序列可以保存下来反复使用,热路径上只剩一次加锁的加法;
+    标签组合数超过 max_series 后,新的组合都记入标签值为 other 的序列。
+    """
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), max_series: int = 1000):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.max_series = max_series
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **named):
+        """按标签值取得子序列,不存在时创建"""
+        if named:
+            values = tuple(named[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    if len(self._children) >= self.max_series:
+                        key = (OVERFLOW_LABEL,) * len(self.labelnames)
+                        child = self._children.get(key)
+                    if child is None:
+                        child = self._children[key] = self._new_child()
+        return child
+
+    def clear(self):
+        """删除全部序列,用于每次采集时重新设置的指标"""
+        with self._lock:
+            self._children = {}
+
+    def _label_text(self, key: Tuple[str, ...], extra: str = '') -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return '{' + ','.join(pairs) + '}' if pairs else ''
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            children = sorted(self._children.items())
+        for key, child in children:
+            lines.extend(self._render_child(key, child))
+        return lines
+
+    def _render_child(self, key, child) -> Iterable[str]:
+        yield f'{self.name}{self._label_text(key)} {_format_value(child.value)}'
+
+
+class Counter(Metric):
+    """只增不减的计数"""
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    """可增可减的当前值,如队列深度"""
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    """按分桶统计的分布,如延迟;可由 _sum / _count 计算平均值,由分桶估算分位数"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, max_series: int = 1000):
+        super().__init__(name, documentation, labelnames, max_series)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _render_child(self, key, child) -> Iterable[str]:
+        with child._lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = 'le="' + _format_value(float(bound)) + '"'
+            yield f'{self.name}_bucket{self._label_text(key, le)} {cumulative}'
+        yield f'{self.name}_sum{self._label_text(key)} {_format_value(total)}'
+        yield f'{self.name}_count{self._label_text(key)} {count}'
+
+
+class MetricsRegistry:
+    """进程内的全部指标;同名指标只创建一次,模块被重复导入时得到同一个对象"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"指标 {name} 已注册为 {metric.kind}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Counter:
+        return self._register(Counter, name, documentation, labelnames, **kwargs)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames, **kwargs)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, **kwargs)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Prometheus 文本格式的全部指标"""
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+
+def host_label(url: str) -> str:
+    """URL中的主机名,用作指标标签"""
+    return _hostname(url.partition('://')[2].partition('/')[0].partition('?')[0])
+
+
+@lru_cache(maxsize=4096)
+def _hostname(netloc: str) -> str:
+    try:
+        return urlsplit(f'//{netloc}').hostname or ''
+    except ValueError:
+        return ''
+
+
+# 抓取
+FETCH_SECONDS = REGISTRY.histogram(
+    'hermes_fetch_seconds', '单次抓取(含重试中的每一次尝试)的耗时', ('host', 'method'), max_series=500
+)
+FETCH_BYTES = REGISTRY.counter(
+    'hermes_fetch_bytes_total', '抓取到的响应体字节数', ('host', 'method'), max_series=500
+)
+FETCH_RESPONSES = REGISTRY.counter(
+    'hermes_fetch_responses_total', '按状态码统计的抓取结果;未收到响应时为 timeout / error',
+    ('host', 'method', 'status'), max_series=2000
+)
+SLOT_WAIT_SECONDS = REGISTRY.histogram(
+    'hermes_slot_wait_seconds', '等待主机与全局并发槽位(含最小间隔与限速)的时间', ('host',), max_series=500
+)
+AIMD_ADJUSTMENTS = REGISTRY.counter(
+    'hermes_aimd_adjustments_total', '自适应并发上限的调整次数;scope 为 global(全局)或 host(主机)',
+    ('scope', 'direction')
+)
+# 解析与提取
+PARSE_SECONDS = REGISTRY.histogram('hermes_parse_seconds', '页面解析为DOM或JSON的耗时', ('parser',))
+EXTRACT_SECONDS = REGISTRY.histogram('hermes_extract_seconds', '页面字段提取的耗时(含解析)', ('job',))
+RECORDS = REGISTRY.counter('hermes_records_total', '写入存储的记录数', ('job',))
+# 存储
+STORAGE_FLUSH_SECONDS = REGISTRY.histogram('hermes_storage_flush_seconds', '存储一次批量写入的耗时', ('storage', 'table'))
+STORAGE_FLUSHED_RECORDS = REGISTRY.counter(
+    'hermes_storage_flushed_records_total', '存储批量写入的记录数', ('storage', 'table')
+)
+# 去重
+DEDUP_CHECKS = REGISTRY.counter(
+    'hermes_dedup_checks_total', '链接去重检查次数;result 为 seen 的比例即去重命中率', ('job', 'result')
+)
@@ -0,0 +1,226 @@
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+# 默认任务名 Task-123 没有意义,改用协程名
+_DEFAULT_TASK_NAME = re.compile(r'^Task-\d+$')
+
+
+class ProfilerBusyError(RuntimeError):
+    """同一时间只能运行一次性能分析"""
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    # 只保留最后两级路径,火焰图中更易读
+    short = os.sep.join(filename.split(os.sep)[-2:])
+    return f'{code.co_name} ({short}:{code.co_firstlineno})'.replace(';', ',')
+
+
+def _task_label(task: Optional[asyncio.Task]) -> str:
+    if task is None:
+        return '(event loop)'
+    name = task.get_name()
+    if _DEFAULT_TASK_NAME.match(name):
+        coro = task.get_coro()
+        name = getattr(coro, '__qualname__', None) or name
+    return f'task {name}'.replace(';', ',')
+
+
+class SamplingProfiler:
+    """
+    采样式性能分析: 后台线程按固定间隔读取事件循环线程的调用栈,统计为火焰图可用的折叠栈
+    (每行 "根;...;叶 次数",可直接交给 flamegraph.pl、speedscope 等工具)。
+
+    栈的根节点是采样时事件循环正在执行的任务,整站抓取流水线的任务名为 <job>:<阶段>,
+    可以只保留某个job的样本。
+
+    同时通过心跳检测事件循环的阻塞: 每个采样间隔向事件循环投递一个回调,
+    回调迟迟不执行说明事件循环正被同步代码(如 requests 的 session.get、大页面解析)占用,
+    阻塞超过 block_threshold 的事件连同期间最常见的调用栈一并记录。
+
+    只在 run 期间有后台线程与心跳,其余时间没有任何开销。
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float = 0.005,
+                 job: Optional[str] = None, block_threshold: float = 0.1):
+        """
+        :param loop: 要分析的事件循环(须在其线程中调用 run)
+        :param interval: 采样间隔(秒)
+        :param job: 只统计该job的流水线任务;为空时统计全部
+        :param block_threshold: 记为阻塞事件的最短阻塞时间(秒)
+        """
+        self.loop = loop
+        self.interval = interval
+        self.job = job
+        self.block_threshold = block_threshold
+        self.stacks: Counter = Counter()
+        self.tasks: Counter = Counter()
+        self.samples = 0
+        self.blocking: List[Dict] = []
+        self.duration = 0.0
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._beat_sent = 0.0   # 尚未执行的心跳的投递时间,0 表示没有
+        self._block_stacks: Counter = Counter()
+        self._block_task = None
+
+    def _stack(self, frame) -> Tuple[str, ...]:
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        return tuple(labels)
+
+    def _beat(self):
+        """在事件循环中执行的心跳,计算从投递到执行的延迟"""
+        sent, self._beat_sent = self._beat_sent, 0.0
+        lag = time.perf_counter() - sent
+        if lag >= self.block_threshold and self._block_stacks:
+            stack, count = self._block_stacks.most_common(1)[0]
+            self.blocking.append({
+                'seconds': round(lag, 4),
+                'task': self._block_task,
+                'samples': count,
+                # 最内层的几帧最能说明阻塞的原因
+                'stack': list(stack[-12:]),
+            })
+        self._block_stacks = Counter()
+        self._block_task = None
+
+    def _sample(self):
+        frame = sys._current_frames().get(self._thread_id)
+        if frame is None:
+            return
+        task_label = _task_label(asyncio.current_task(self.loop))
+        stack = self._stack(frame)
+        if self._beat_sent and time.perf_counter() - self._beat_sent >= self.interval:
+            # 心跳未按时执行期间采到的栈,即阻塞事件循环的代码;阻塞影响所有job,不按job过滤
+            self._block_stacks[stack] += 1
+            self._block_task = task_label
+        if self.job and not task_label.startswith(f'task {self.job}:'):
+            return
+        self.samples += 1
+        self.tasks[task_label] += 1
+        self.stacks[(task_label,) + stack] += 1
+
+    def _sampler(self):
+        next_beat = 0.0
+        while not self._stop.wait(self.interval):
+            self._sample()
+            now = time.perf_counter()
+            if not self._beat_sent and now >= next_beat:
+                self._beat_sent = now
+                next_beat = now + self.interval
+                try:
+                    self.loop.call_soon_threadsafe(self._beat)
+                except RuntimeError:
+                    # 事件循环已关闭
+                    return
+
+    async def run(self, seconds: float) -> 'SamplingProfiler':
+        """在当前事件循环中采样 seconds 秒"""
+        self._thread_id = threading.get_ident()
+        started = time.perf_counter()
+        thread = threading.Thread(target=self._sampler, name='hermes-profiler', daemon=True)
+        thread.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self._stop.set()
+            await asyncio.to_thread(thread.join)
+            self.duration = time.perf_counter() - started
+        return self
+
+    def folded(self) -> str:
+        """折叠栈格式的结果"""
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, top: int = 30) -> Dict:
+        """采样统计、各任务占比、最耗时的函数(自身时间)与阻塞事件"""
+        own = Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+        return {
+            'mode': 'sampling',
+            'seconds': round(self.duration, 3),
+            'interval': self.interval,
+            'job': self.job,
+            'samples': self.samples,
+            'tasks': dict(self.tasks.most_common()),
+            'top_functions': [
+                {'function': label, 'samples': count, 'ratio': round(count / self.samples, 4)}
+                for label, count in own.most_common(top)
+            ] if self.samples else [],
+            'blocking': sorted(self.blocking, key=lambda event: -event['seconds']),
+        }
+
+
+class CProfileSession:
+    """
+    确定性性能分析: 在事件循环线程中启用 cProfile,记录期间该线程上的全部函数调用。
+    开销明显高于采样,结果可以导出为 .prof 文件交给 snakeviz 等工具查看。
+    """
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.duration = 0.0
+
+    async def run(self, seconds: float) -> 'CProfileSession':
+        started = time.perf_counter()
+        self.profile.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.profile.disable()
+            self.duration = time.perf_counter() - started
+        return self
+
+    def text(self, top: int = 50, sort: str = 'cumulative') -> str:
+        output = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=output)
+        stats.sort_stats(sort).print_stats(top)
+        return output.getvalue()
+
+    def dump(self) -> bytes:
+        """pstats 二进制格式的结果"""
+        import marshal
+        self.profile.create_stats()
+        return marshal.dumps(self.profile.stats)
+
+
+_running = threading.Lock()
+
+
+async def profile(seconds: float, mode: str = 'sampling', **options):
+    """
+    对当前事件循环做一次限时的性能分析
+    :param seconds: 持续时间(秒)
+    :param mode: 'sampling' 或 'cprofile'
+    :param options: 传给 SamplingProfiler 的参数(interval、job、block_threshold)
+    :return: 分析结束的 SamplingProfiler 或 CProfileSession
+    """
+    if mode not in ('sampling', 'cprofile'):
+        raise ValueError(f"不支持的分析方式: {mode}")
+    if not _running.acquire(blocking=False):
+        raise ProfilerBusyError("已有性能分析正在运行")
+    try:
+        logger.info(f"开始性能分析: {mode}, {seconds} 秒")
+        if mode == 'cprofile':
+            return await CProfileSession().run(seconds)
+        return await SamplingProfiler(asyncio.get_running_loop(), **options).run(seconds)
+    finally:
+        _running.release()
@@ -1,4 +1,11 @@
 from .storage_factory import StorageFactory
 from .data_storage import DataStorage
 from .file_storage import FileStorage
-from .mongodb_storage import MongoDBStorage
\ No newline at end of file
+
+
+def __getattr__(name):
+    # MongoDBStorage 依赖 pymongo,只在被用到时导入
+    if name == 'MongoDBStorage':
+        from .mongodb_storage import MongoDBStorage
+        return MongoDBStorage
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,11 +1,20 @@
 import logging
-from typing import Dict
+from typing import Dict, Iterable
 
 # 获取logger实例,用于日志记录
 logger = logging.getLogger(__name__)
 
 class DataStorage:
     """数据存储抽象类,定义保存数据的接口"""
-    def save(self, data: Dict):
+    async def save(self, table_name: str, data: Dict):
         # 抽象方法,子类必须实现
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    async def save_many(self, table_name: str, records: Iterable[Dict]):
+        """批量保存数据,子类可以覆盖为真正的批量写入"""
+        for record in records:
+            await self.save(table_name, record)
+
+    async def close(self):
+        """关闭存储,写入尚未落盘的数据"""
+        pass
\ No newline at end of file
@@ -1,39 +1,220 @@
+import asyncio
+import gzip
 import json
-from urllib.parse import urlparse
 import logging
 import os
-from typing import Dict
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
 from .data_storage import DataStorage
+from core.monitor.metrics import STORAGE_FLUSH_SECONDS, STORAGE_FLUSHED_RECORDS
 
 # 获取logger实例,用于日志记录
 logger = logging.getLogger(__name__)
 
+# 压缩方式对应的文件后缀
+_SUFFIXES = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+
+class SegmentWriter:
+    """
+    单个表的缓冲写入器。
+
+    记录先以JSON行的形式累积在内存中,缓冲达到 flush_bytes 或距上次写盘超过 flush_interval 时
+    一次性写入;文件写入在线程中执行,不阻塞事件循环。
+    设置 rotate_bytes / rotate_seconds 后按大小或时间切换到新的分段文件,可选gzip或zstd压缩。
+    """
+
+    def __init__(self, base_path: str, table_name: str, config: Dict):
+        self.base_path = base_path
+        self.table_name = table_name
+        self.flush_bytes = config.get('flush_bytes', 1024 * 1024)
+        self.flush_interval = config.get('flush_interval', 1.0)
+        self.rotate_bytes = config.get('rotate_bytes') or 0
+        self.rotate_seconds = config.get('rotate_seconds') or 0
+        self.compression = config.get('compression') or None
+        if self.compression not in _SUFFIXES:
+            logger.error(f"不支持的压缩方式: {self.compression},改为不压缩")
+            self.compression = None
+        self.buffer: List[str] = []
+        self.buffered_bytes = 0
+        self.last_flush = time.monotonic()
+        self.records = 0
+        self.flushes = 0
+        self._lock = asyncio.Lock()
+        self._file = None
+        self._raw_file = None
+        self._segment_path: Optional[str] = None
+        self._segment_bytes = 0
+        self._segment_started = 0.0
+        self._segment_seq = 0
+        self._flush_seconds = STORAGE_FLUSH_SECONDS.labels('file', table_name)
+        self._flushed_records = STORAGE_FLUSHED_RECORDS.labels('file', table_name)
+
+    def append(self, line: str) -> bool:
+        """加入一行,返回是否已达到写盘阈值"""
+        self.buffer.append(line)
+        self.buffered_bytes += len(line)
+        self.records += 1
+        return self.buffered_bytes >= self.flush_bytes
+
+    @property
+    def due(self) -> bool:
+        """缓冲中有数据且已超过写盘间隔"""
+        return bool(self.buffer) and time.monotonic() - self.last_flush >= self.flush_interval
+
+    async def flush(self):
+        """把缓冲写入文件"""
+        async with self._lock:
+            if not self.buffer:
+                return
+            lines, self.buffer, self.buffered_bytes = self.buffer, [], 0
+            self.last_flush = time.monotonic()
+            started = time.perf_counter()
+            await asyncio.to_thread(self._write, ''.join(lines).encode('utf-8'))
+            self._flush_seconds.observe(time.perf_counter() - started)
+            self._flushed_records.inc(len(lines))
+            self.flushes += 1
+            logger.debug(f"{self.table_name}: 写入 {len(lines)} 条记录到 {self._segment_path}")
+
+    def _segment_name(self) -> str:
+        """生成分段文件名;不分段也不压缩时保持原有的 <表名>.txt"""
+        suffix = _SUFFIXES[self.compression]
+        if not self.rotate_bytes and not self.rotate_seconds:
+            return f'{self.table_name}.txt{suffix}'
+        self._segment_seq += 1
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        return f'{self.table_name}.{stamp}.{self._segment_seq:04d}.txt{suffix}'
+
+    def _need_rotate(self) -> bool:
+        if self._file is None:
+            return True
+        if self.rotate_bytes and self._segment_bytes >= self.rotate_bytes:
+            return True
+        return bool(self.rotate_seconds) and time.monotonic() - self._segment_started >= self.rotate_seconds
+
+    def _open_segment(self):
+        self._close_segment()
+        os.makedirs(self.base_path, exist_ok=True)
+        self._segment_path = os.path.join(self.base_path, self._segment_name())
+        self._raw_file = open(self._segment_path, 'ab')
+        if self.compression == 'gzip':
+            self._file = gzip.GzipFile(fileobj=self._raw_file, mode='ab')
+        elif self.compression == 'zstd':
+            import zstandard
+            self._file = zstandard.ZstdCompressor().stream_writer(self._raw_file, closefd=False)
+            self._zstd_flush_block = zstandard.FLUSH_BLOCK
+        else:
+            self._file = self._raw_file
+        self._segment_bytes = 0
+        self._segment_started = time.monotonic()
+
+    def _write(self, data: bytes):
+        """在工作线程中执行的实际写入"""
+        if self._need_rotate():
+            self._open_segment()
+        self._file.write(data)
+        if self.compression == 'gzip':
+            self._file.flush()  # 写出完整的压缩块,进程崩溃时已写入的部分仍可解压
+        elif self.compression == 'zstd':
+            self._file.flush(self._zstd_flush_block)
+        self._raw_file.flush()
+        self._segment_bytes += len(data)
+
+    def _close_segment(self):
+        if self._file is not None and self._file is not self._raw_file:
+            self._file.close()
+        if self._raw_file is not None:
+            self._raw_file.close()
+        self._file = self._raw_file = None
+
+    async def close(self):
+        """写入剩余缓冲并关闭当前分段"""
+        await self.flush()
+        async with self._lock:
+            await asyncio.to_thread(self._close_segment)
+
+
 class FileStorage(DataStorage):
-    """文件存储实现"""
+    """文件存储实现,按表缓冲写入,写盘在后台线程中完成"""
     def __init__(self, storage_config=None):
         self.storage_config = storage_config or {}
         self.base_path = self.storage_config.get('path', 'data')
-    def save(self, table_name: str, data: Dict):
+        self.writers: Dict[str, SegmentWriter] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    def _writer(self, table_name: str) -> SegmentWriter:
+        writer = self.writers.get(table_name)
+        if writer is None:
+            writer = self.writers[table_name] = SegmentWriter(self.base_path, table_name, self.storage_config)
+        if self._flusher is None:
+            # 首次写入时启动定时写盘任务,保证低频写入的数据也能及时落盘
+            self._stopping = asyncio.Event()
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_periodically())
+        return writer
+
+    async def save(self, table_name: str, data: Dict):
         """保存数据到文件
 
         Args:
+            table_name (str): 表名,对应文件名前缀
             data (Dict): 需要保存的数据字典,包含url等信息
         """
+        await self.save_many(table_name, (data,))
+
+    async def save_many(self, table_name: str, records: Iterable[Dict]):
+        """批量保存数据,缓冲达到阈值时写盘"""
         try:
-            # 检查并创建 data 目录
-            if not os.path.exists('data'):
-                os.makedirs('data')
-            # 根据数据中的url生成文件名
-            filename = table_name + '.txt'
-            # 打开文件,准备写入
-            with open(f'data/{filename}', 'a', encoding='utf-8') as f:
-                # 将数据保存为JSON格式到文件中,确保非ASCII字符能正确处理
-                f.write(json.dumps(data, ensure_ascii=False) + '\n')
-            # 记录日志,数据保存成功
-            logger.info(f"数据已保存到 {filename}")
+            writer = self._writer(table_name)
+            full = False
+            for record in records:
+                # 将数据保存为JSON格式,确保非ASCII字符能正确处理
+                full = writer.append(json.dumps(record, ensure_ascii=False, default=str) + '\n') or full
+            if full:
+                await writer.flush()
         except Exception as e:
             # 异常处理,记录日志,数据保存失败
             logger.error(f"文件存储失败: {str(e)}")
+
+    async def _flush_periodically(self):
+        """按 flush_interval 检查并写入到期的缓冲,close() 发出停止信号后退出"""
+        interval = self.storage_config.get('flush_interval', 1.0)
+        while True:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            for writer in list(self.writers.values()):
+                if writer.due:
+                    try:
+                        await writer.flush()
+                    except Exception as e:
+                        logger.error(f"文件存储写盘失败 {writer.table_name}: {str(e)}")
+
+    async def flush(self):
+        """立即写入所有缓冲"""
+        for writer in list(self.writers.values()):
+            await writer.flush()
+
+    def stats(self) -> Dict:
+        """各表的写入统计"""
+        return {
+            name: {'records': writer.records, 'flushes': writer.flushes, 'buffered_bytes': writer.buffered_bytes}
+            for name, writer in self.writers.items()
+        }
+
     async def close(self):
-        """关闭文件存储，由于使用了with语句自动关闭文件，这里不需要额外操作"""
-        pass
\ No newline at end of file
+        """停止定时写盘,写入剩余缓冲并关闭所有文件"""
+        if self._flusher is not None:
+            # 不能直接取消:取消只会中断等待,线程中的写入仍在进行,随后关闭文件会与它冲突。
+            # 发出停止信号并等待正在进行的写盘完成
+            self._stopping.set()
+            await self._flusher
+            self._flusher = self._stopping = None
+        for writer in list(self.writers.values()):
+            try:
+                await writer.close()
+            except Exception as e:
+                logger.error(f"关闭文件存储失败 {writer.table_name}: {str(e)}")
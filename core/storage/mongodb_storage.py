@@ -1,9 +1,25 @@
-from pymongo import MongoClient, errors
-from typing import Any, Dict, List, Optional
+import asyncio
+import logging
 import time
+from pymongo import MongoClient, errors
+from typing import Any, Dict, Iterable, List, Optional
+from .data_storage import DataStorage
+from core.monitor.metrics import STORAGE_FLUSH_SECONDS, STORAGE_FLUSHED_RECORDS
+
+# 获取logger实例,用于日志记录
+logger = logging.getLogger(__name__)
+
+class MongoDBStorage(DataStorage):
+    """
+    MongoDB 存储。
+
+    save/save_many 面向事件循环: 记录先按集合缓冲,达到 batch_size 或等待超过 flush_interval 时
+    以无序 insert_many 成批写入,驱动调用在线程中执行;同时在途的批次数受 max_in_flight 限制,
+    MongoDB 跟不上时调用方会在 save 处等待,从而对抓取形成反压。
+    """
 
-class MongoDBStorage:
-    def __init__(self, uri: str, db_name: str, username: Optional[str] = None, password: Optional[str] = None):
+    def __init__(self, uri: str, db_name: str, username: Optional[str] = None, password: Optional[str] = None,
+                 batch_size: int = 1000, flush_interval: float = 0.5, max_in_flight: int = 4):
         """
         初始化 MongoDB 存储类。
 
@@ -11,11 +27,42 @@ class MongoDBStorage:
         :param db_name: 数据库名称。
         :param username: 用户名。
         :param password: 密码。
+        :param batch_size: 每批写入的最大记录数。
+        :param flush_interval: 记录在缓冲中的最长停留时间(秒)。
+        :param max_in_flight: 同时写入中的批次上限。
         """
         if username and password:
             uri = f"mongodb://{username}:{password}@{uri.split('://')[1]}"
         self.client = MongoClient(uri)
         self.db = self.client[db_name]
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_in_flight = max_in_flight
+        self.max_buffered = batch_size * max_in_flight  # 单个集合缓冲的记录数上限
+        self._buffers: Dict[str, List[Dict]] = {}
+        self._oldest: Dict[str, float] = {}
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._flusher: Optional[asyncio.Task] = None
+        self._tasks = set()  # 后台发起的写入任务
+        self._scheduled = set()  # 已有后台写入任务的集合
+        self.inserted = 0
+        self.failed = 0
+        self.batches = 0
+
+    @classmethod
+    def from_config(cls, storage_config: Dict) -> 'MongoDBStorage':
+        """根据 config.json 中的 storage 配置创建实例"""
+        uri = storage_config.get('uri') or \
+            f"mongodb://{storage_config.get('host', 'localhost')}:{storage_config.get('port', 27017)}/"
+        return cls(
+            uri=uri,
+            db_name=storage_config.get('database', 'hermes'),
+            username=storage_config.get('username') or None,
+            password=storage_config.get('password') or None,
+            batch_size=storage_config.get('batch_size', 1000),
+            flush_interval=storage_config.get('flush_interval', 0.5),
+            max_in_flight=storage_config.get('max_in_flight', 4)
+        )
 
     def connect(self):
         """
@@ -33,11 +80,94 @@ class MongoDBStorage:
         """
         self.client.close()
 
-    def save(self, table_name: str, data: Dict):
+    async def save(self, table_name: str, data: Dict):
+        """缓冲一条记录,缓冲满时等待写入(反压)"""
+        await self.save_many(table_name, (data,))
+
+    async def save_many(self, table_name: str, records: Iterable[Dict]):
+        """
+        缓冲多条记录并在达到批量大小时写入。
+
+        :param table_name: 集合名称。
+        :param records: 记录列表。
+        """
+        buffer = self._buffers.setdefault(table_name, [])
+        if not buffer:
+            self._oldest[table_name] = time.monotonic()
+        buffer.extend(records)
+        if self._flusher is None:
+            # 首次写入时启动按时间写入的后台任务
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_periodically())
+        if len(buffer) >= self.batch_size and table_name not in self._scheduled:
+            # 凑满一批后在后台写入,调用方不必等待
+            self._scheduled.add(table_name)
+            task = asyncio.get_running_loop().create_task(self._flush_collection(table_name))
+            self._tasks.add(task)
+            task.add_done_callback(lambda done: (self._tasks.discard(done), self._scheduled.discard(table_name)))
+        if len(buffer) >= self.max_buffered:
+            # 积压过多时等待写入完成,让上游放慢
+            await self._flush_collection(table_name)
+
+    async def _flush_collection(self, table_name: str):
+        """把一个集合的缓冲按 batch_size 分批写入"""
+        while self._buffers.get(table_name):
+            buffer = self._buffers[table_name]
+            batch, self._buffers[table_name] = buffer[:self.batch_size], buffer[self.batch_size:]
+            self._oldest[table_name] = time.monotonic()
+            async with self._in_flight:
+                started = time.perf_counter()
+                inserted, failed = await asyncio.to_thread(self._insert_batch, table_name, batch)
+                STORAGE_FLUSH_SECONDS.labels('mongodb', table_name).observe(time.perf_counter() - started)
+            STORAGE_FLUSHED_RECORDS.labels('mongodb', table_name).inc(inserted)
+            self.inserted += inserted
+            self.failed += failed
+            self.batches += 1
+
+    def _insert_batch(self, table_name: str, batch: List[Dict]):
+        """
+        在线程中执行的无序批量写入;单条失败(如主键冲突)不影响同批其他记录
+        :return: (写入成功数, 失败数)
+        """
         try:
-            self.db[table_name].insert_one(data)
+            result = self.db[table_name].insert_many(batch, ordered=False)
+            return len(result.inserted_ids), 0
+        except errors.BulkWriteError as e:
+            details = e.details or {}
+            failed = len(details.get('writeErrors', []))
+            logger.error(f"批量写入 {table_name} 部分失败: {failed} 条")
+            return details.get('nInserted', 0), failed
         except errors.PyMongoError as e:
             logger.error(f"Error saving data to MongoDB: {e}")
+            return 0, len(batch)
+
+    async def _flush_periodically(self):
+        """把停留超过 flush_interval 的缓冲写入"""
+        while True:
+            await asyncio.sleep(self.flush_interval / 2)
+            now = time.monotonic()
+            for table_name, buffer in list(self._buffers.items()):
+                if buffer and now - self._oldest.get(table_name, now) >= self.flush_interval:
+                    try:
+                        await self._flush_collection(table_name)
+                    except Exception as e:
+                        logger.error(f"MongoDB 定时写入失败 {table_name}: {e}")
+
+    async def flush(self):
+        """立即写入所有缓冲"""
+        for table_name in list(self._buffers):
+            await self._flush_collection(table_name)
+        # 等待后台发起的批次全部完成
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> Dict:
+        """写入统计"""
+        return {
+            'inserted': self.inserted,
+            'failed': self.failed,
+            'batches': self.batches,
+            'buffered': sum(len(buffer) for buffer in self._buffers.values())
+        }
 
     def insert_one(self, collection_name: str, document: Dict[str, Any]) -> Optional[str]:
         """
@@ -159,8 +289,18 @@ class MongoDBStorage:
             logger.error(f"Error deleting documents: {e}")
             return 0
 
-    def close(self):
+    async def close(self):
         """
-        关闭数据库连接。
+        写入剩余缓冲并关闭数据库连接。
         """
-        self.client.close()
\ No newline at end of file
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        try:
+            await self.flush()
+        finally:
+            await asyncio.to_thread(self.client.close)
\ No newline at end of file
@@ -1,13 +1,29 @@
 # storage_factory.py
 import logging
-from typing import Dict
+import re
+from importlib import import_module
+from typing import Type
 from .data_storage import DataStorage
-from .file_storage import FileStorage
-from .mongodb_storage import MongoDBStorage  # 导入 MongoDBStorage
 
 # 获取logger实例,用于日志记录
 logger = logging.getLogger(__name__)
 
+# 存储类型 -> 实现类所在的模块与类名;实现模块在第一次创建该类型的存储时才导入
+STORAGE_BACKENDS = {
+    'file': ('core.storage.file_storage', 'FileStorage'),
+    'mongodb': ('core.storage.mongodb_storage', 'MongoDBStorage'),
+}
+
+
+def get_storage_class(storage_type: str) -> Type[DataStorage]:
+    """按存储类型导入并返回实现类"""
+    entry = STORAGE_BACKENDS.get(storage_type)
+    if entry is None:
+        raise ValueError(f"不支持的存储类型: {storage_type}")
+    module, name = entry
+    return getattr(import_module(module), name)
+
+
 class StorageFactory:
     def __init__(self, config):
         self.config = config
@@ -16,11 +32,13 @@ class StorageFactory:
         """根据配置创建存储实例"""
         storage_config = self.config.get('storage', {})
         storage_type = storage_config.get('type', 'file')
-
-        if storage_type == 'mongodb':
-            return MongoDBStorage(storage_config)
-        else:
-            return FileStorage(storage_config)
+        if storage_type not in STORAGE_BACKENDS:
+            logger.warning(f"不支持的存储类型: {storage_type},改用文件存储")
+            storage_type = 'file'
+        storage_class = get_storage_class(storage_type)
+        if hasattr(storage_class, 'from_config'):
+            return storage_class.from_config(storage_config)
+        return storage_class(storage_config)
     @staticmethod
     def create(storage_type: str = 'file', **kwargs) -> DataStorage:
         """根据存储类型创建并返回相应的存储实例
@@ -37,16 +55,18 @@ class StorageFactory:
         """
         if storage_type == 'file':
             # 如果请求的是文件存储类型,则返回FileStorage实例
-            return FileStorage()
+            return get_storage_class('file')()
         elif storage_type == 'mongodb':
             # 如果请求的是 MongoDB 存储类型,则返回 MongoDBStorage 实例
             uri = kwargs.get('uri', 'mongodb://localhost:27017/')
             db_name = kwargs.get('db_name', 'hermes')
             username = kwargs.get('username', None)
             password = kwargs.get('password', None)
-    
-            print(f"创建 MongoDBStorage 实例, URI: {uri}, 数据库名称: {db_name}")
-            return MongoDBStorage(uri=uri, db_name=db_name, username=username, password=password)
+
+            # 连接地址中可能带有用户名和密码,日志中隐去
+            safe_uri = re.sub(r'//[^/@]+@', '//***@', uri)
+            logger.debug(f"创建 MongoDBStorage 实例, URI: {safe_uri}, 数据库名称: {db_name}")
+            return get_storage_class('mongodb')(uri=uri, db_name=db_name, username=username, password=password)
         # 可扩展其他存储类型
         else:
             raise ValueError(f"不支持的存储类型: {storage_type}")
\ No newline at end of file
@@ -1,3 +1,5 @@
+import time
+_STARTED = time.perf_counter()  # 启动计时的起点,包含导入模块的时间
 import asyncio
 import logging
 from core import WebCrawler, TaskScheduler, StorageFactory
@@ -8,6 +10,25 @@ import uvicorn
 # 添加项目根目录到Python路径
 # sys.path.append(str(Path(__file__).parent))
 
+
+class StartupTimer:
+    """记录启动过程中各阶段的耗时"""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.last = started
+        self.stages = []
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def report(self):
+        detail = ', '.join(f"{stage} {elapsed * 1000:.0f}ms" for stage, elapsed in self.stages)
+        logging.info(f"启动完成, 总耗时 {(self.last - self.started) * 1000:.0f}ms ({detail})")
+
+
 async def main():
     try:
         # 配置日志
@@ -16,19 +37,27 @@ async def main():
             format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
             handlers=[logging.FileHandler('system.log'), logging.StreamHandler()]
         )
+        timer = StartupTimer(_STARTED)
+        timer.mark('导入模块')
 
         # 加载配置
         config = ConfigLoader.load_config('config/config.json')
         if not config:
             logging.error("Failed to load configuration")
             return
+        timer.mark('加载配置')
 
         # 初始化存储
         storage_factory = StorageFactory(config)
         storage = storage_factory.create_storage()
+        timer.mark('初始化存储')
 
         # 初始化爬虫和调度器
         crawler = WebCrawler(config, storage)
+        timer.mark('初始化爬虫')
+        # 只启动任务实际用到的抓取后端,例如没有任务使用浏览器时不会启动浏览器
+        await crawler.initialize()
+        timer.mark('启动抓取后端')
         scheduler = TaskScheduler(crawler, storage)  # 修改这里，传入storage参数
 
         # 添加任务到调度器
@@ -37,10 +66,18 @@ async def main():
 
         # 启动调度器
         scheduler.start()
+        timer.mark('启动调度器')
+        timer.report()
 
         # 初始化API模块的全局实例
         from core.web.api import init_instances
         init_instances(crawler, storage)
+        # 挂载 Prometheus 采集接口 /metrics 与按需性能分析接口 /profile
+        from core.monitor import create_metrics_router, create_profiler_router
+        app.include_router(create_metrics_router(crawler))
+        monitor_config = config.get('monitor', {})
+        if monitor_config.get('profiling', True):
+            app.include_router(create_profiler_router(monitor_config.get('max_profile_seconds', 120)))
 
         # 启动FastAPI服务
         config = uvicorn.Config(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,108 @@
+import socket
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        self.server.hits[path] += 1
+        route = self.server.routes.get(path)
+        if route is None:
+            status, headers, body = 404, {}, b''
+        elif callable(route):
+            status, headers, body = route(self)
+        else:
+            status, headers, body = route
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        headers = {'Content-Type': 'text/html; charset=utf-8', **headers}
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalSite:
+    """测试用的本地HTTP站点: routes 为 路径 -> (状态码, 响应头, 响应体) 或接收请求处理器的函数"""
+
+    def __init__(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.routes = {}
+        self.server.hits = Counter()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def routes(self):
+        return self.server.routes
+
+    @property
+    def hits(self):
+        return self.server.hits
+
+    def url(self, path: str = '/') -> str:
+        return f'http://127.0.0.1:{self.server.server_port}{path}'
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MemoryStorage:
+    """把记录保存在内存中的存储"""
+
+    def __init__(self):
+        self.records = []
+
+    async def save(self, table_name, data):
+        self.records.append((table_name, data))
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def storage():
+    return MemoryStorage()
+
+
+@pytest.fixture
+def site():
+    local_site = LocalSite()
+    yield local_site
+    local_site.close()
+
+
+@pytest.fixture
+def blackhole():
+    """只建立连接、从不响应的主机,请求只能等到超时"""
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(64)
+    yield f'http://127.0.0.1:{listener.getsockname()[1]}'
+    listener.close()
+
+
+@pytest.fixture
+def crawler_config(tmp_path):
+    """不依赖 config/config.json 的最小爬虫配置,数据文件都写入临时目录"""
+    return {
+        'dedup': {'path': str(tmp_path / 'dedup')},
+        'frontier': {'path': str(tmp_path / 'frontier.db')},
+        'http_cache': {'path': str(tmp_path / 'http_cache.db')},
+        'fingerprint': {'path': str(tmp_path / 'fingerprint.db')},
+        'archive': {'path': str(tmp_path / 'archive')},
+        'jobs': [],
+    }
@@ -0,0 +1,133 @@
+import asyncio
+import gzip
+import os
+
+import pytest
+
+from core.crawl.archive import ResponseArchive
+from core.crawl.crawler import WebCrawler
+from core.crawl.http_client import FetchResult
+
+
+@pytest.fixture
+def archive(tmp_path):
+    response_archive = ResponseArchive(str(tmp_path / 'archive'))
+    yield response_archive
+    response_archive.close()
+
+
+@pytest.mark.parametrize('header', ['Content-Type', 'content-type', 'CONTENT-TYPE'])
+def test_replay_keeps_content_type_and_charset(archive, header):
+    body = '<html>价格</html>'.encode('gbk')
+    archive.record('job', 'http://example.com/', FetchResult(
+        'http://example.com/', 200, {header: 'text/html; charset=gbk'}, body
+    ))
+    replayed = archive.lookup('job', 'http://example.com/')
+    assert replayed.content_type == 'text/html; charset=gbk'
+    assert replayed.text == '<html>价格</html>'
+
+
+@pytest.mark.parametrize('compression', [None, 'gzip', 'zstd'])
+def test_recorded_responses_replay_after_reopen(tmp_path, compression):
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    path = str(tmp_path / 'archive')
+    archive = ResponseArchive(path, segment_bytes=2048, compression=compression)
+    for i in range(20):
+        archive.record('job', f'http://example.com/{i}', FetchResult(
+            f'http://example.com/{i}?final', 200 if i else 404,
+            {'Content-Type': 'application/json', 'ETag': f'"{i}"', 'Content-Length': '999'},
+            f'{{"page": {i}, "body": "{"x" * 200}"}}'.encode('utf-8')
+        ))
+    # 同一页面再次存档时回放最新的响应
+    archive.record('job', 'http://example.com/3', FetchResult('http://example.com/3', 200, {}, b'newer'))
+    archive.close()
+
+    archive = ResponseArchive(path, segment_bytes=2048, compression=compression)
+    try:
+        assert archive.stats()['segments'] > 1
+        first = archive.lookup('job', 'http://example.com/0')
+        assert first.status == 404
+        assert first.url == 'http://example.com/0?final'
+        assert first.content_type == 'application/json'
+        assert first.headers['ETag'] == '"0"'
+        replayed = archive.lookup('job', 'http://example.com/7')
+        assert replayed.text.startswith('{"page": 7, ')
+        assert archive.lookup('job', 'http://example.com/3').text == 'newer'
+        assert archive.lookup('job', 'http://example.com/missing') is None
+        assert archive.lookup('other', 'http://example.com/7') is None
+        urls = [url for batch in archive.urls('job', batch_size=6) for url in batch]
+        assert sorted(urls) == sorted(f'http://example.com/{i}' for i in range(20))
+        # 按存档位置顺序返回,重新存档的页面排在最后
+        assert urls[-1] == 'http://example.com/3'
+    finally:
+        archive.close()
+
+
+def test_segments_are_readable_as_warc(archive):
+    archive.record('job', 'http://example.com/', FetchResult('http://example.com/', 200, {}, b'<html>a</html>'))
+    archive.record('job', 'http://example.com/b', FetchResult('http://example.com/b', 200, {}, b'<html>b</html>'))
+    name = next(name for name in os.listdir(archive.path) if name.endswith('.warc.gz'))
+    with gzip.open(os.path.join(archive.path, name)) as f:
+        data = f.read()
+    assert data.count(b'WARC/1.1\r\n') == 2
+    assert b'WARC-Target-URI: http://example.com/b' in data
+
+
+def test_crawl_replays_archive_without_network(site, crawler_config, storage):
+    site.routes['/'] = (200, {}, '<html><table><tr><td class="n">archived</td></tr></table></html>')
+    crawler_config['jobs'] = [{
+        'name': 'site',
+        'url': site.url('/'),
+        'bloomfilter': {'mode': 'memory'},
+        'template': {'selector': {'css': 'tr'}, 'attr': {'n': {'css': 'td.n'}}},
+    }]
+
+    async def run(mode):
+        crawler_config['archive']['mode'] = mode
+        crawler = WebCrawler(crawler_config, storage)
+        try:
+            return await crawler.process_url(site.url('/'), 'site')
+        finally:
+            await crawler.close()
+
+    asyncio.run(run('record'))
+    site.routes['/'] = (200, {}, '<html><table><tr><td class="n">live</td></tr></table></html>')
+    asyncio.run(run('replay'))
+    assert site.hits['/'] == 1
+    assert [record['n'] for _, record in storage.records] == ['archived', 'archived']
+
+
+def test_reextract_does_not_replay_live_fetches(site, crawler_config, storage):
+    """重新提取期间,同一job的正常抓取仍然访问网络"""
+    site.routes['/'] = (200, {}, '<html><table><tr><td class="n">archived</td></tr></table></html>')
+    site.routes['/live'] = (200, {}, 'live')
+    crawler_config['archive']['mode'] = 'record'
+    crawler_config['jobs'] = [{
+        'name': 'site',
+        'url': site.url('/'),
+        'bloomfilter': {'mode': 'memory'},
+        'template': {'selector': {'css': 'tr'}, 'attr': {'n': {'css': 'td.n'}}},
+    }]
+    crawler = WebCrawler(crawler_config, storage)
+    live = []
+    save = storage.save
+
+    async def save_and_fetch(table_name, data):
+        await save(table_name, data)
+        live.append(await crawler.fetch(site.url('/live'), 'requests', 'site'))
+
+    async def main():
+        try:
+            await crawler.process_url(site.url('/'), 'site')
+            # 之后的抓取不再存档,重新提取只会读到上面记录的页面
+            crawler_config['archive']['mode'] = None
+            storage.save = save_and_fetch
+            return await crawler.reextract('site')
+        finally:
+            await crawler.close()
+
+    assert asyncio.run(main()) == 1
+    assert site.hits['/'] == 1
+    assert live == [('live', 'text/html; charset=utf-8')]
+    assert [record['n'] for _, record in storage.records] == ['archived', 'archived']
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import sys
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).parent.parent / 'benchmarks'))
+
+import suite  # noqa: E402
+from synthetic_site import SyntheticSite  # noqa: E402
+
+PAGES = 21  # fanout 4 的链接图: 1 + 4 + 16
+
+
+@pytest.fixture
+def synthetic_site():
+    site = SyntheticSite(PAGES, rows=5, page_limits={'large': 3}).start()
+    yield site
+    site.stop()
+
+
+def _get(url):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def test_site_serves_link_tree_and_api(synthetic_site):
+    assert list(synthetic_site.children('site', 0)) == [1, 2, 3, 4]
+    assert list(synthetic_site.children('site', 5)) == []
+    status, body = _get(synthetic_site.url('site', 4))
+    assert status == 200
+    assert body.count(b'<tr>') == 5
+    assert b'href="/site/20"' in body
+    status, body = _get(synthetic_site.url('api', 2))
+    assert [item['id'] for item in json.loads(body)['data']] == [10, 11, 12, 13, 14]
+    assert _get(synthetic_site.url('site', PAGES))[0] == 404
+    assert _get(synthetic_site.url('large', 3))[0] == 404
+
+
+def test_flaky_pages_fail_once_until_reset(synthetic_site):
+    assert _get(synthetic_site.url('flaky', 5))[0] == 503
+    assert _get(synthetic_site.url('flaky', 5))[0] == 200
+    assert _get(synthetic_site.url('flaky', 7))[0] == 500
+    assert _get(synthetic_site.url('flaky', 1))[0] == 200
+    assert synthetic_site.errors == 2
+    synthetic_site.reset()
+    assert (synthetic_site.requests, synthetic_site.errors) == (0, 0)
+    assert _get(synthetic_site.url('flaky', 5))[0] == 503
+
+
+@pytest.mark.parametrize('scenario, method', [
+    ('html_crawl', 'requests'),
+    ('html_crawl', 'aiohttp'),
+    ('flaky', 'aiohttp'),
+    ('json_api', 'requests'),
+    ('json_stream', 'aiohttp'),
+])
+def test_scenario_visits_every_page_once(synthetic_site, scenario, method):
+    result = asyncio.run(suite.run_scenario({
+        'scenario': scenario, 'method': method, 'storage': 'null', 'base_url': synthetic_site.base_url,
+        'pages': PAGES, 'concurrency': 4,
+    }))
+    assert result['pages'] == PAGES
+    assert result['records'] == PAGES * 5
+    assert result['failures'] == 0
+    # 链接的重复写法被规范化后只抓取一次,失败的页面重试后成功
+    assert synthetic_site.requests == PAGES + synthetic_site.errors
+    assert result['retries'] == synthetic_site.errors
+    assert result['pages_per_sec'] > 0
+
+
+def test_compare_reports_change_in_the_better_direction(tmp_path, capsys):
+    baseline = tmp_path / 'baseline.json'
+    old = {'scenario': 'html_crawl', 'method': 'aiohttp', 'storage': 'null',
+           'pages_per_sec': 100.0, 'latency_p99_ms': 20.0}
+    baseline.write_text(json.dumps({'results': [old]}), encoding='utf-8')
+    suite.compare([dict(old, pages_per_sec=150.0, latency_p99_ms=30.0)], str(baseline))
+    output = capsys.readouterr().out
+    assert 'pages_per_sec +50.0%' in output
+    assert 'latency_p99_ms -50.0%' in output
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+from core.crawl.browser_pool import PlaywrightPool
+
+
+class FakePage:
+    def __init__(self):
+        self.routes = []
+        self.closed = False
+
+    def set_default_navigation_timeout(self, timeout):
+        self.timeout = timeout
+
+    async def route(self, pattern, handler):
+        self.routes.append(handler)
+
+    async def unroute(self, pattern, handler):
+        self.routes.remove(handler)
+
+    async def goto(self, url, wait_until=None):
+        self.url = url
+
+    async def content(self):
+        return f'<html>{self.url}</html>'
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self.pages = []
+        self.closed = False
+
+    async def new_page(self):
+        if self.browser.page_failures:
+            self.browser.page_failures -= 1
+            raise RuntimeError('Target closed')
+        page = FakePage()
+        self.pages.append(page)
+        return page
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+        self.page_failures = 0
+
+    async def new_context(self):
+        context = FakeContext(self)
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        pass
+
+
+async def _pool(**config):
+    pool = PlaywrightPool({'browser': {'playwright': config}})
+    pool._browser = FakeBrowser()
+    pool._idle = asyncio.Queue()
+    for _ in range(pool.contexts):
+        await pool._open_context()
+    return pool
+
+
+def _pages(pool):
+    return [page for context in pool._browser.contexts for page in context.pages]
+
+
+def test_requests_are_routed_only_while_resources_are_blocked():
+    async def main():
+        pool = await _pool(contexts=1, pages_per_context=1)
+        assert await pool.fetch('http://a/') == '<html>http://a/</html>'
+        page = _pages(pool)[0]
+        assert page.routes == []
+        await pool.fetch('http://a/', ['image'])
+        assert len(page.routes) == 1
+        await pool.fetch('http://a/')
+        assert page.routes == []
+
+    asyncio.run(main())
+
+
+def test_failed_reopen_is_restored_on_next_acquire():
+    async def main():
+        pool = await _pool(contexts=1, pages_per_context=2, page_max_navigations=1)
+        pool._browser.page_failures = 1
+        await pool.fetch('http://a/')
+        assert pool.stats()['live_pages'] == 1
+        assert pool.reopen_failures == 1
+        # 两个标签页都要能借出,否则第二个会一直等待
+        await asyncio.gather(pool.fetch('http://a/1'), pool.fetch('http://a/2'))
+        assert pool.stats()['live_pages'] == 2
+        assert len(pool._browser.contexts) == 2
+
+    asyncio.run(main())
+
+
+def test_failed_context_rebuild_is_restored_on_next_acquire():
+    async def main():
+        pool = await _pool(contexts=1, pages_per_context=1, context_max_navigations=1)
+        old = pool._browser.contexts[0]
+        pool._browser.page_failures = 1
+        await pool.fetch('http://a/')
+        assert old.closed
+        assert pool.live_pages == 0
+        assert pool._browser.contexts[1].closed
+        assert await pool.fetch('http://a/2') == '<html>http://a/2</html>'
+        assert pool.live_pages == 1
+
+    asyncio.run(main())
+
+
+def test_acquire_times_out_when_no_page_is_free():
+    async def main():
+        pool = await _pool(contexts=1, pages_per_context=1, acquire_timeout=0.05)
+        async with pool.page():
+            with pytest.raises(asyncio.TimeoutError):
+                async with pool.page():
+                    pass
+        assert await pool.fetch('http://a/') == '<html>http://a/</html>'
+
+    asyncio.run(main())
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+
+import pytest
+
+from core.crawl.crawler import WebCrawler
+from core.crawl.dedup import MmapBloomFilter, MmapUrlSet, create_dedup_store
+from core.crawl.workers import WorkerCoordinator
+
+URLS = [f'http://example.com/page/{i}' for i in range(2000)]
+
+
+@pytest.mark.parametrize('mode', ['bloom', 'exact'])
+def test_seen_urls_survive_reopen(tmp_path, mode):
+    config = {'mode': mode, 'capacity': 5000}
+    store = create_dedup_store('job', config, str(tmp_path))
+    assert all(store.check_and_add(url) for url in URLS)
+    assert not any(store.check_and_add(url) for url in URLS)
+    store.close()
+
+    store = create_dedup_store('job', config, str(tmp_path))
+    try:
+        assert len(store) == len(URLS)
+        assert all(url in store for url in URLS)
+        assert not store.check_and_add(URLS[0])
+        assert store.check_and_add('http://example.com/new')
+    finally:
+        store.close()
+
+
+def test_memory_mode_is_not_persisted(tmp_path):
+    store = create_dedup_store('job', {'mode': 'memory'}, str(tmp_path))
+    assert isinstance(store, MmapBloomFilter)
+    assert store.check_and_add(URLS[0])
+    store.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_exact_set_grows_without_false_positives(tmp_path):
+    path = str(tmp_path / 'urls.set')
+    store = MmapUrlSet(capacity=16, path=path)
+    initial_slots = store.slots
+    assert all(store.check_and_add(url) for url in URLS)
+    assert store.slots > initial_slots
+    # 扩容后已有的URL仍然存在,没加入过的URL一个也不会被误判
+    assert all(url in store for url in URLS)
+    assert not any(f'http://example.com/other/{i}' in store for i in range(5000))
+    store.close()
+
+    store = MmapUrlSet(capacity=16, path=path)
+    try:
+        assert store.slots > initial_slots
+        assert len(store) == len(URLS)
+        assert URLS[-1] in store
+    finally:
+        store.close()
+
+
+def test_shared_stores_see_each_others_urls(tmp_path):
+    path = str(tmp_path / 'urls.set')
+    first = MmapUrlSet(capacity=16, path=path, shared=True)
+    second = MmapUrlSet(capacity=16, path=path, shared=True)
+    try:
+        assert first.check_and_add(URLS[0])
+        assert not second.check_and_add(URLS[0])
+        # 一方扩容后另一方重新映射,仍能看到全部URL
+        assert all(first.check_and_add(url) for url in URLS[1:])
+        assert all(url in second for url in URLS)
+    finally:
+        first.close()
+        second.close()
+
+
+def test_bloom_filter_grows_past_capacity(tmp_path):
+    path = str(tmp_path / 'urls.bloom')
+    store = MmapBloomFilter(capacity=1000, error_rate=0.001, path=path)
+    urls = [f'http://example.com/item/{i}' for i in range(20000)]
+    # 超过容量20倍后,新URL被误判为已存在的比例仍在误判率附近
+    assert sum(store.check_and_add(url) for url in urls) > len(urls) * 0.995
+    assert len(store._slices) > 1
+    store.close()
+
+    store = MmapBloomFilter(capacity=1000, error_rate=0.001, path=path)
+    try:
+        assert len(store._slices) > 1
+        assert all(url in store for url in urls)
+        false_positives = sum(f'http://example.com/other/{i}' in store for i in range(20000))
+        assert false_positives < 20000 * 0.003
+    finally:
+        store.close()
+
+
+def test_bloom_filter_warns_when_max_bytes_stops_growth(caplog):
+    store = MmapBloomFilter(capacity=1000, error_rate=0.001, max_bytes=8192)
+    with caplog.at_level(logging.WARNING, logger='core.crawl.dedup'):
+        for i in range(3500):
+            store.check_and_add(f'http://example.com/{i}')
+    assert len(store._slices) == 2
+    assert len(store.mm) - 64 <= 8192
+    warnings = [record for record in caplog.records if record.levelno == logging.WARNING]
+    assert len(warnings) == 1
+    store.close()
+
+
+def test_shared_bloom_filters_see_each_others_growth(tmp_path):
+    path = str(tmp_path / 'urls.bloom')
+    first = MmapBloomFilter(capacity=100, path=path, shared=True)
+    second = MmapBloomFilter(capacity=100, path=path, shared=True)
+    try:
+        assert all(first.check_and_add(url) for url in URLS[:1000])
+        assert len(first._slices) > 1
+        assert all(url in second for url in URLS[:1000])
+        assert not second.check_and_add(URLS[0])
+        assert second.check_and_add('http://example.com/new')
+        assert 'http://example.com/new' in first
+        assert len(first) == len(second) == 1001
+    finally:
+        first.close()
+        second.close()
+
+
+@pytest.mark.parametrize('mode', ['bloom', 'exact'])
+def test_clear_forgets_every_url(tmp_path, mode):
+    config = {'mode': mode, 'capacity': 100}
+    store = create_dedup_store('job', config, str(tmp_path))
+    for url in URLS:
+        store.check_and_add(url)
+    store.clear()
+    assert len(store) == 0
+    assert not any(url in store for url in URLS)
+    assert store.check_and_add(URLS[0])
+    store.close()
+
+    store = create_dedup_store('job', config, str(tmp_path))
+    try:
+        assert len(store) == 1
+        assert URLS[0] in store and URLS[1] not in store
+    finally:
+        store.close()
+
+
+def _site_job(site, mode):
+    site.routes['/'] = (200, {}, '<html><a href="/a">a</a><a href="/b">b</a></html>')
+    site.routes['/a'] = (200, {}, '<html><a href="/b">b</a></html>')
+    site.routes['/b'] = (200, {}, '<html></html>')
+    return {
+        'name': 'site',
+        'url': site.url('/'),
+        'max_depth': 2,
+        'bloomfilter': {'mode': mode},
+        'template': {'selector': 'tr', 'attr': {'n': 'td'}, 'links': {'selector': 'a[href]'}},
+    }
+
+
+@pytest.mark.parametrize('mode', ['bloom', 'exact'])
+def test_fresh_crawl_rediscovers_links_after_restart(site, crawler_config, storage, mode):
+    crawler_config['jobs'] = [_site_job(site, mode)]
+
+    async def crawl():
+        crawler = WebCrawler(crawler_config, storage)
+        try:
+            return await crawler.crawl('site', resume=False)
+        finally:
+            await crawler.close()
+
+    # 去重文件在两次运行之间保留,重新抓取时随队列一起清空
+    assert asyncio.run(crawl()) == 3
+    assert asyncio.run(crawl()) == 3
+    assert [site.hits[path] for path in ('/', '/a', '/b')] == [2, 2, 2]
+
+
+def test_fresh_crawl_in_one_crawler_rediscovers_links(site, crawler_config, storage):
+    crawler_config['jobs'] = [_site_job(site, 'memory')]
+    crawler = WebCrawler(crawler_config, storage)
+
+    async def main():
+        try:
+            return [await crawler.crawl('site', resume=False) for _ in range(2)]
+        finally:
+            await crawler.close()
+
+    assert asyncio.run(main()) == [3, 3]
+
+
+def test_coordinator_clears_shared_dedup_file_for_fresh_crawl(site, crawler_config, storage):
+    crawler_config['jobs'] = [_site_job(site, 'memory')]
+    coordinator = WorkerCoordinator(crawler_config, storage, workers=2)
+    # 工作进程把 memory 模式改为共享的 bloom 文件
+    store = create_dedup_store('site', {'mode': 'bloom', 'shared': True}, crawler_config['dedup']['path'])
+    store.check_and_add(site.url('/a'))
+    store.close()
+
+    coordinator._prepare('site', resume=True).close()
+    store = create_dedup_store('site', {'mode': 'bloom'}, crawler_config['dedup']['path'])
+    assert site.url('/a') in store
+    store.close()
+
+    frontier = coordinator._prepare('site', resume=False)
+    assert frontier.stats('site')['pending'] == 1
+    frontier.close()
+    store = create_dedup_store('site', {'mode': 'bloom'}, crawler_config['dedup']['path'])
+    try:
+        assert len(store) == 0
+    finally:
+        store.close()
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from core.crawl.extraction import ExtractionPlan
+from core.crawl.page import Page
+
+
+def _json_page(data):
+    return Page('http://example.com/api', json.dumps(data), 'application/json')
+
+
+ITEMS = {'data': [
+    {'name': 'apple', 'price': {'avg': 3.5}},
+    {'name': 'pear'},
+]}
+
+
+@pytest.mark.parametrize('name_field', ['name', '$.name', {'path': 'name'}, {'path': '$.name'}])
+def test_json_row_fields_are_relative_paths(name_field):
+    plan = ExtractionPlan({
+        'selector': {'path': '$.data[*]'},
+        'attr': {'name': name_field, 'avg': 'price.avg'},
+    })
+    assert list(plan.iter_records(_json_page(ITEMS))) == [
+        {'name': 'apple', 'avg': 3.5},
+        {'name': 'pear', 'avg': None},
+    ]
+
+
+def test_bare_string_row_field_is_css_for_html_rows():
+    plan = ExtractionPlan({'selector': 'tr', 'attr': {'name': 'td.name'}})
+    page = Page('http://example.com/', '<table><tr><td class="name">apple</td></tr></table>', 'text/html')
+    assert list(plan.iter_records(page)) == [{'name': 'apple'}]
+
+
+HTML = '''<html><body>
+<h1 class="title">Fruit</h1>
+<table>
+  <tr class="item"><td class="name">apple</td><td class="price">3.5</td><td><a href="/apple">more</a></td></tr>
+  <tr class="item"><td class="name">pear</td><td><a href="/pear">more</a></td></tr>
+  <tr class="item ad"><td class="name">sponsored</td><td class="price">0</td><td class="ad">ad</td></tr>
+  <tr class="item"><td class="name">plum</td><td class="price">1</td><td class="price">2</td></tr>
+</table>
+<a class="next" href="/page/2">next</a>
+</body></html>'''
+
+
+@pytest.fixture(params=['html.parser', 'bs4-lxml', 'lxml', 'selectolax'])
+def parser(request):
+    """解析后端依赖的第三方库未安装时跳过"""
+    from core.crawl.page import get_parser_backend
+    try:
+        get_parser_backend(request.param)
+    except ImportError:
+        pytest.skip(f'{request.param} 未安装')
+    return request.param
+
+
+def test_fields_match_across_backends(parser):
+    plan = ExtractionPlan({'selectors': {
+        'title': 'h1.title',
+        'names': 'td.name',
+        'next': {'selector': 'a.next', 'attr': 'href'},
+        'missing': 'div.none',
+    }}, parser)
+    assert plan.extract(Page('http://example.com/', HTML, 'text/html', parser)) == {
+        'title': ['Fruit'],
+        'names': ['apple', 'pear', 'sponsored', 'plum'],
+        'next': ['/page/2'],
+        'missing': [],
+    }
+
+
+def test_rows_match_across_backends(parser):
+    plan = ExtractionPlan({
+        'selector': {'css': 'tr.item'},
+        'filters': ['td.ad'],
+        'attr': {
+            'name': 'td.name',
+            'price': {'css': 'td.price'},
+            'prices': {'css': 'td.price', 'multiple': True},
+            'link': {'css': 'a', 'value': '@href'},
+            'class': {'value': '@class'},
+        },
+    }, parser)
+    records = list(plan.iter_records(Page('http://example.com/', HTML, 'text/html', parser)))
+    # 包含 td.ad 的行被模板级 filters 跳过
+    assert [record['name'] for record in records] == ['apple', 'pear', 'plum']
+    assert records[0] == {'name': 'apple', 'price': '3.5', 'prices': ['3.5'], 'link': '/apple', 'class': 'item'}
+    # 缺失的字段为 None,不会错位到下一行
+    assert records[1] == {'name': 'pear', 'price': None, 'prices': [], 'link': '/pear', 'class': 'item'}
+    assert records[2]['prices'] == ['1', '2']
+
+
+def test_plan_recompiles_for_page_of_other_backend(parser):
+    plan = ExtractionPlan({'selector': 'tr.item', 'attr': {'name': 'td.name'}}, 'html.parser')
+    page = Page('http://example.com/', HTML, 'text/html', parser)
+    assert [record['name'] for record in plan.iter_records(page)] == ['apple', 'pear', 'sponsored', 'plum']
@@ -0,0 +1,62 @@
+import asyncio
+import json
+import threading
+import time
+
+from core.storage.file_storage import FileStorage, SegmentWriter
+
+
+def _lines(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_records_are_flushed_on_close(tmp_path):
+    async def main():
+        storage = FileStorage({'path': str(tmp_path), 'flush_interval': 60})
+        await storage.save_many('items', [{'n': i} for i in range(5)])
+        await storage.save('items', {'n': 5})
+        assert not (tmp_path / 'items.txt').exists()
+        await storage.close()
+
+    asyncio.run(main())
+    assert _lines(tmp_path / 'items.txt') == [{'n': i} for i in range(6)]
+
+
+def test_close_waits_for_a_flush_in_progress(tmp_path, monkeypatch):
+    writing = threading.Event()
+    original = SegmentWriter._write
+
+    def slow_write(self, data):
+        writing.set()
+        time.sleep(0.3)
+        original(self, data)
+
+    monkeypatch.setattr(SegmentWriter, '_write', slow_write)
+
+    async def main():
+        storage = FileStorage({'path': str(tmp_path), 'flush_interval': 0.01})
+        await storage.save('items', {'n': 1})
+        # 等定时写盘任务进入线程中的写入后再关闭
+        while not writing.is_set():
+            await asyncio.sleep(0.005)
+        await storage.close()
+        writer = storage.writers['items']
+        assert writer._file is None and writer._raw_file is None
+        assert _lines(tmp_path / 'items.txt') == [{'n': 1}]
+
+    asyncio.run(main())
+
+
+def test_periodic_flush_writes_quiet_tables(tmp_path):
+    async def main():
+        storage = FileStorage({'path': str(tmp_path), 'flush_interval': 0.02})
+        await storage.save('items', {'n': 1})
+        for _ in range(100):
+            if (tmp_path / 'items.txt').exists():
+                break
+            await asyncio.sleep(0.01)
+        assert _lines(tmp_path / 'items.txt') == [{'n': 1}]
+        await storage.close()
+
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+import pytest
+
+from core.crawl.crawler import WebCrawler
+from core.crawl.fingerprint import ContentFingerprinter, FingerprintStore
+from core.crawl.page import Page
+
+
+def _digest(config, content, content_type='text/html'):
+    return ContentFingerprinter(config).digest(Page('http://example.com/', content, content_type))
+
+
+def test_scripts_comments_and_whitespace_do_not_change_digest():
+    assert _digest(True, '<p>price 3</p>') == _digest(
+        True, '<script>track(1)</script>\n<p>price   3</p><!-- 12:00 --><style>p{}</style>'
+    )
+    assert _digest(True, '<p>price 3</p>') != _digest(True, '<p>price 4</p>')
+
+
+def test_ignore_patterns_are_removed_before_hashing():
+    config = {'ignore': [r'访问量: \d+']}
+    assert _digest(config, '<p>a</p>访问量: 10') == _digest(config, '<p>a</p>访问量: 11')
+
+
+def test_region_limits_digest_to_selected_content():
+    config = {'region': 'div.main'}
+    page = '<div class="main">{}</div><div class="ad">{}</div>'
+    assert _digest(config, page.format('a', 'x')) == _digest(config, page.format('a', 'y'))
+    assert _digest(config, page.format('a', 'x')) != _digest(config, page.format('b', 'x'))
+
+
+def test_json_region_uses_jsonpath():
+    config = {'region': '$.items'}
+
+    def digest(data):
+        return _digest(config, json.dumps(data), 'application/json')
+
+    assert digest({'items': [1, 2], 'server_time': 1}) == digest({'server_time': 2, 'items': [1, 2]})
+    assert digest({'items': [1, 2]}) != digest({'items': [2, 1]})
+
+
+def test_store_remembers_digest_per_job_and_url(tmp_path):
+    store = FingerprintStore(str(tmp_path / 'fingerprint.db'))
+    try:
+        assert not store.is_unchanged('job', 'http://a/', b'1')
+        store.update('job', 'http://a/', b'1')
+        assert store.is_unchanged('job', 'http://a/', b'1')
+        assert not store.is_unchanged('job', 'http://a/', b'2')
+        assert not store.is_unchanged('other', 'http://a/', b'1')
+        store.clear('job')
+        assert not store.is_unchanged('job', 'http://a/', b'1')
+    finally:
+        store.close()
+
+
+def test_unchanged_page_is_skipped_until_content_changes(site, crawler_config, storage):
+    page = '<html><script>var t = {};</script><table><tr><td>{}</td></tr></table></html>'
+    site.routes['/'] = (200, {}, page.format(1, 'apple'))
+    crawler_config['jobs'] = [{
+        'name': 'site',
+        'url': site.url('/'),
+        'bloomfilter': {'mode': 'memory'},
+        'fingerprint': True,
+        'template': {'selector': 'tr', 'attr': {'name': 'td'}},
+    }]
+    crawler = WebCrawler(crawler_config, storage)
+
+    async def main():
+        try:
+            results = [(await crawler.process_url(site.url('/'), 'site'))[0]]
+            # 只有脚本变化,页面视为未变化
+            site.routes['/'] = (200, {}, page.format(2, 'apple'))
+            results.append((await crawler.process_url(site.url('/'), 'site'))[0])
+            site.routes['/'] = (200, {}, page.format(2, 'pear'))
+            results.append((await crawler.process_url(site.url('/'), 'site'))[0])
+            return results
+        finally:
+            await crawler.close()
+
+    results = asyncio.run(main())
+    assert [result.get('unchanged', False) for result in results] == [False, True, False]
+    assert [record['name'] for _, record in storage.records] == ['apple', 'pear']
+
+
+def test_fingerprint_is_not_recorded_when_storage_fails(site, crawler_config, storage):
+    site.routes['/'] = (200, {}, '<html><table><tr><td>apple</td></tr></table></html>')
+    crawler_config['jobs'] = [{
+        'name': 'site',
+        'url': site.url('/'),
+        'bloomfilter': {'mode': 'memory'},
+        'fingerprint': True,
+        'template': {'selector': 'tr', 'attr': {'name': 'td'}},
+    }]
+    crawler = WebCrawler(crawler_config, storage)
+    save = storage.save
+
+    async def failing_save(table_name, data):
+        raise ConnectionError('存储不可用')
+
+    async def main():
+        try:
+            storage.save = failing_save
+            await crawler.process_url(site.url('/'), 'site')
+            storage.save = save
+            return (await crawler.process_url(site.url('/'), 'site'))[0]
+        finally:
+            await crawler.close()
+
+    assert not asyncio.run(main()).get('unchanged')
+    assert [record['name'] for _, record in storage.records] == ['apple']
@@ -0,0 +1,152 @@
+import sqlite3
+import time
+
+import pytest
+
+from core.crawl.frontier import CrawlFrontier, shard_for
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'frontier.db')
+
+
+@pytest.fixture
+def frontier(path):
+    crawl_frontier = CrawlFrontier(path)
+    yield crawl_frontier
+    crawl_frontier.close()
+
+
+def test_push_ignores_known_urls(frontier):
+    assert frontier.push('job', ['http://a/1', 'http://a/2'], 1) == 2
+    assert frontier.push('job', ['http://a/2', 'http://a/3'], 1) == 1
+    assert frontier.pending('job') == 3
+    assert frontier.pending('other') == 0
+
+
+def test_pop_order_is_priority_then_depth_then_age(frontier):
+    frontier.push('job', ['http://a/deep'], 3)
+    frontier.push('job', ['http://a/shallow-1', 'http://a/shallow-2'], 1)
+    frontier.push('job', ['http://a/urgent'], 5, priority=10)
+    assert [url for url, _ in frontier.pop_batch('job', 10)] == [
+        'http://a/urgent', 'http://a/shallow-1', 'http://a/shallow-2', 'http://a/deep'
+    ]
+    assert frontier.pop_batch('job', 10) == []
+    assert frontier.stats('job')['in_progress'] == 4
+
+
+def test_seed_requeues_a_finished_seed(frontier):
+    frontier.seed('job', 'http://a/')
+    assert frontier.pop_batch('job') == [('http://a/', 0)]
+    frontier.complete('job', ['http://a/'])
+    assert frontier.pending('job') == 0
+    frontier.seed('job', 'http://a/')
+    assert frontier.pop_batch('job') == [('http://a/', 0)]
+
+
+def test_reopen_resumes_in_progress_urls(path):
+    frontier = CrawlFrontier(path)
+    frontier.push('job', ['http://a/1', 'http://a/2', 'http://a/3'], 1)
+    popped = [url for url, _ in frontier.pop_batch('job', 2)]
+    frontier.complete('job', popped[:1])
+    # 模拟进程退出: 第二个URL仍处于抓取中
+    frontier.close()
+
+    frontier = CrawlFrontier(path)
+    try:
+        assert frontier.stats('job') == {'pending': 2, 'in_progress': 0, 'done': 1, 'failed': 0}
+        assert sorted(url for url, _ in frontier.pop_batch('job', 10)) == sorted(['http://a/3', popped[1]])
+    finally:
+        frontier.close()
+
+
+def test_reopen_without_recover_leaves_in_progress_urls(path):
+    frontier = CrawlFrontier(path)
+    frontier.push('job', ['http://a/1'], 1)
+    frontier.pop_batch('job')
+    frontier.close()
+    frontier = CrawlFrontier(path, recover=False)
+    try:
+        assert frontier.stats('job')['in_progress'] == 1
+    finally:
+        frontier.close()
+
+
+def test_fail_requeues_until_max_attempts(frontier):
+    frontier.push('job', ['http://a/1'], 1)
+    for _ in range(2):
+        assert frontier.pop_batch('job') == [('http://a/1', 1)]
+        frontier.fail('job', ['http://a/1'], max_attempts=2)
+    assert frontier.pop_batch('job') == []
+    assert frontier.stats('job')['failed'] == 1
+
+
+def _make_due(frontier):
+    frontier.conn.execute('UPDATE frontier SET not_before = 0')
+
+
+def test_failed_urls_wait_with_exponential_backoff(frontier):
+    frontier.push('job', ['http://a/1'], 1)
+    assert frontier.next_retry('job') == 0
+    delays = []
+    for _ in range(4):
+        assert frontier.pop_batch('job') == [('http://a/1', 1)]
+        frontier.fail('job', ['http://a/1'], max_attempts=10, retry_delay=10, max_retry_delay=50)
+        assert frontier.pop_batch('job') == []
+        delays.append(round(frontier.next_retry('job')))
+        _make_due(frontier)
+    assert delays == [10, 20, 40, 50]
+    assert frontier.pending('job') == 1
+
+
+def test_postponed_urls_keep_their_attempts(frontier):
+    frontier.push('job', ['http://a/1'], 1)
+    for _ in range(5):
+        assert frontier.pop_batch('job') == [('http://a/1', 1)]
+        frontier.postpone('job', [('http://a/1', 30)])
+        assert frontier.pop_batch('job') == []
+        assert 29 < frontier.next_retry('job') <= 30
+        _make_due(frontier)
+    frontier.pop_batch('job')
+    frontier.fail('job', ['http://a/1'], max_attempts=2)
+    assert frontier.stats('job')['pending'] == 1
+
+
+def test_abandoned_urls_fail_immediately(frontier):
+    frontier.push('job', ['http://a/1', 'http://a/2'], 1)
+    frontier.pop_batch('job')
+    frontier.abandon('job', ['http://a/1'])
+    frontier.fail('job', ['http://a/2'])
+    assert frontier.stats('job') == {'pending': 1, 'in_progress': 0, 'done': 0, 'failed': 1}
+    assert frontier.next_retry('other') is None
+
+
+def test_old_queue_files_gain_retry_times(path):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE frontier (job TEXT NOT NULL, url TEXT NOT NULL, depth INTEGER NOT NULL, '
+                 'priority INTEGER NOT NULL DEFAULT 0, state INTEGER NOT NULL DEFAULT 0, '
+                 'attempts INTEGER NOT NULL DEFAULT 0, enqueued_at REAL NOT NULL, PRIMARY KEY (job, url))')
+    conn.execute("INSERT INTO frontier (job, url, depth, enqueued_at) VALUES ('job', 'http://a/1', 1, ?)",
+                 (time.time(),))
+    conn.commit()
+    conn.close()
+    frontier = CrawlFrontier(path)
+    try:
+        assert frontier.pop_batch('job') == [('http://a/1', 1)]
+    finally:
+        frontier.close()
+
+
+def test_shards_split_by_host(path):
+    frontier = CrawlFrontier(path, shards=4)
+    try:
+        urls = [f'http://host{i}.example/{page}' for i in range(8) for page in range(3)]
+        frontier.push('job', urls, 1)
+        popped = {shard: frontier.pop_batch('job', 100, shard) for shard in range(4)}
+        assert sum(len(batch) for batch in popped.values()) == len(urls)
+        for shard, batch in popped.items():
+            assert all(shard_for(url, 4) == shard for url, _ in batch)
+        assert frontier.active('job') == len(urls)
+    finally:
+        frontier.close()
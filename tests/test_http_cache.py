@@ -0,0 +1,155 @@
+import asyncio
+import time
+
+import pytest
+
+from core.crawl.crawler import WebCrawler
+from core.crawl.http_cache import HttpCache
+from core.crawl.http_client import FetchResult
+
+URL = 'http://example.com/'
+
+
+@pytest.fixture
+def cache(tmp_path):
+    http_cache = HttpCache(str(tmp_path / 'http_cache.db'), max_bytes=1000, max_entry_bytes=400)
+    yield http_cache
+    http_cache.close()
+
+
+def _response(body=b'<html>cached</html>', status=200, **headers):
+    return FetchResult(URL, status, headers, body, 'text/html; charset=utf-8', 'utf-8')
+
+
+def test_validators_are_sent_once_stored(cache):
+    assert cache.validators(URL) == {}
+    assert cache.store(URL, _response(ETag='"v1"', **{'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}))
+    assert cache.validators(URL) == {
+        'If-None-Match': '"v1"', 'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'
+    }
+
+
+@pytest.mark.parametrize('response', [
+    _response(),                                   # 没有校验信息
+    _response(status=203, ETag='"v1"'),            # 非200响应
+    _response(b'x' * 401, ETag='"v1"'),            # 超过单个响应体上限
+])
+def test_uncacheable_responses_are_not_stored(cache, response):
+    assert not cache.store(URL, response)
+    assert cache.validators(URL) == {}
+
+
+def test_304_returns_cached_body_and_refreshes_validators(cache):
+    cache.store(URL, _response(etag='"v1"'))
+    result = cache.revalidated(URL, FetchResult(URL, 304, {'etag': '"v2"'}))
+    assert result.status == 304
+    assert result.text == '<html>cached</html>'
+    assert result.content_type == 'text/html; charset=utf-8'
+    assert cache.validators(URL) == {'If-None-Match': '"v2"'}
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['bytes_saved'] == len(b'<html>cached</html>')
+
+
+def test_304_after_eviction_returns_the_bare_response(cache):
+    bare = FetchResult(URL, 304, {})
+    assert cache.revalidated(URL, bare) is bare
+
+
+def test_least_recently_used_entries_are_evicted(cache):
+    for i in range(3):
+        cache.store(f'{URL}{i}', _response(b'x' * 300, ETag=f'"{i}"'))
+        time.sleep(0.01)
+    # 访问第一个,使第二个成为最久未访问的缓存项
+    cache.revalidated(f'{URL}0', FetchResult(f'{URL}0', 304, {}))
+    cache.store(f'{URL}3', _response(b'x' * 300, ETag='"3"'))
+    assert cache.size <= 900
+    assert cache.validators(f'{URL}1') == {}
+    assert cache.validators(f'{URL}0') and cache.validators(f'{URL}3')
+
+
+@pytest.mark.parametrize('method', ['requests', 'aiohttp'])
+def test_unchanged_page_is_not_extracted_again(site, crawler_config, storage, method):
+    def page(handler):
+        if handler.headers.get('If-None-Match') == '"v1"':
+            return 304, {'ETag': '"v1"'}, b''
+        return 200, {'ETag': '"v1"'}, '<html><table><tr><td>apple</td></tr></table></html>'
+
+    site.routes['/'] = page
+    crawler_config['http_cache']['enabled'] = True
+    crawler_config['jobs'] = [{
+        'name': 'site',
+        'url': site.url('/'),
+        'method': method,
+        'bloomfilter': {'mode': 'memory'},
+        'template': {'selector': 'tr', 'attr': {'name': 'td'}},
+    }]
+    crawler = WebCrawler(crawler_config, storage)
+
+    async def main():
+        try:
+            first, _ = await crawler.process_url(site.url('/'), 'site')
+            second, _ = await crawler.process_url(site.url('/'), 'site')
+            return first, second, await crawler.fetch(site.url('/'), method, 'site')
+        finally:
+            await crawler.close()
+
+    first, second, fetched = asyncio.run(main())
+    assert 'unchanged' not in first
+    assert second['unchanged'] is True
+    # 304 时 fetch 返回缓存的页面内容
+    assert fetched == ('<html><table><tr><td>apple</td></tr></table></html>', 'text/html; charset=utf-8')
+    assert [record['name'] for _, record in storage.records] == ['apple']
+    assert site.hits['/'] == 3
+
+
+class FlakyStorage:
+    """第一次写入失败的存储"""
+
+    def __init__(self):
+        self.records = []
+        self.failures = 1
+
+    async def save(self, table_name, data):
+        await self.save_many(table_name, [data])
+
+    async def save_many(self, table_name, records):
+        if self.failures:
+            self.failures -= 1
+            raise OSError('disk full')
+        self.records.extend(records)
+
+    async def close(self):
+        pass
+
+
+def test_validators_are_kept_only_after_the_page_is_stored(site, crawler_config):
+    def page(handler):
+        if handler.headers.get('If-None-Match') == '"v1"':
+            return 304, {'ETag': '"v1"'}, b''
+        return 200, {'ETag': '"v1"'}, '<html><table><tr><td>apple</td></tr></table></html>'
+
+    site.routes['/'] = page
+    crawler_config['http_cache']['enabled'] = True
+    crawler_config['frontier']['retry_delay'] = 0
+    crawler_config['jobs'] = [{
+        'name': 'site',
+        'url': site.url('/'),
+        'method': 'aiohttp',
+        'bloomfilter': {'mode': 'memory'},
+        'template': {'selector': 'tr', 'attr': {'name': 'td'}},
+    }]
+    storage = FlakyStorage()
+    crawler = WebCrawler(crawler_config, storage)
+
+    async def main():
+        try:
+            await crawler.crawl('site', resume=False)
+            return crawler.frontier.stats('site')
+        finally:
+            await crawler.close()
+
+    stats = asyncio.run(main())
+    # 第一次写入失败,重试时必须重新下载完整页面,而不是得到304被当作未变化
+    assert stats['done'] == 1
+    assert [record['name'] for record in storage.records] == ['apple']
+    assert site.hits['/'] == 2
@@ -0,0 +1,213 @@
+import asyncio
+
+from core.crawl.crawler import WebCrawler
+from core.crawl.pipeline import Stage, _batched
+
+
+def test_batched_splits_records_lazily():
+    produced = []
+
+    def records():
+        for i in range(7):
+            produced.append(i)
+            yield {'i': i}
+
+    batches = _batched(records(), 3)
+    assert [record['i'] for record in next(batches)] == [0, 1, 2]
+    assert produced == [0, 1, 2]
+    assert [[record['i'] for record in batch] for batch in batches] == [[3, 4, 5], [6]]
+    assert list(_batched([], 3)) == []
+
+
+def test_stage_processes_every_item_before_stopping():
+    handled = []
+
+    async def handler(item):
+        await asyncio.sleep(0)
+        handled.append(item)
+
+    async def main():
+        stage = Stage('work', handler, workers=3, queue_size=2)
+        stage.start('job')
+        for i in range(10):
+            await stage.put(i)
+        await stage.stop()
+        return stage.stats()
+
+    stats = asyncio.run(main())
+    assert sorted(handled) == list(range(10))
+    assert stats['processed'] == 10
+    assert stats['queued'] == 0
+    assert stats['busy'] == 0
+
+
+def test_full_stage_queue_holds_back_upstream():
+    release = None
+
+    async def handler(item):
+        await release.wait()
+
+    async def main():
+        nonlocal release
+        release = asyncio.Event()
+        stage = Stage('slow', handler, workers=1, queue_size=2)
+        stage.start()
+        # 1个在处理,2个在队列中,第4个必须等待
+        for i in range(3):
+            await stage.put(i)
+        await asyncio.sleep(0)
+        blocked = asyncio.ensure_future(stage.put(3))
+        await asyncio.sleep(0.05)
+        assert not blocked.done()
+        assert stage.stats()['queued'] == 2
+        release.set()
+        await blocked
+        await stage.stop()
+        return stage.stats()
+
+    stats = asyncio.run(main())
+    assert stats['processed'] == 4
+    assert stats['backpressure'] >= 0.04
+
+
+def test_failed_item_goes_to_error_handler_and_stage_keeps_running():
+    failed = []
+
+    async def handler(item):
+        if item % 2:
+            raise RuntimeError('处理失败')
+
+    async def main():
+        stage = Stage('work', handler, workers=1, queue_size=10, on_error=failed.append)
+        stage.start()
+        for i in range(6):
+            await stage.put(i)
+        await stage.stop()
+        return stage.stats()
+
+    stats = asyncio.run(main())
+    assert failed == [1, 3, 5]
+    assert stats['processed'] == 6
+    assert stats['failed'] == 3
+
+
+def _page(rows, links=()):
+    anchors = ''.join(f'<a href="{link}">link</a>' for link in links)
+    cells = ''.join(f'<tr><td class="n">{row}</td></tr>' for row in rows)
+    return f'<html><body>{anchors}<table>{cells}</table></body></html>'
+
+
+def _crawler(site, crawler_config, storage, **frontier):
+    crawler_config['frontier'].update({'retry_delay': 0}, **frontier)
+    crawler_config['request'] = {'retries': 0}
+    crawler_config['jobs'] = [{
+        'name': 'site',
+        'url': site.url('/'),
+        'max_depth': 2,
+        'bloomfilter': {'mode': 'memory'},
+        'template': {
+            'selector': {'css': 'tr'},
+            'attr': {'n': {'css': 'td.n'}},
+            'links': {'selector': 'a[href]'},
+        },
+    }]
+    return WebCrawler(crawler_config, storage)
+
+
+def _crawl(crawler):
+    """整站抓取一次,返回抓取队列各状态的URL数"""
+    async def main():
+        try:
+            await crawler.crawl('site', resume=False)
+            return crawler.frontier.stats('site')
+        finally:
+            await crawler.close()
+    return asyncio.run(main())
+
+
+def test_failed_pages_are_retried_then_given_up(site, crawler_config, storage):
+    site.routes['/'] = (200, {}, _page(['root'], ['/ok', '/broken', '/empty']))
+    site.routes['/ok'] = (200, {}, _page(['a', 'b']))
+    site.routes['/broken'] = (500, {}, '')
+    site.routes['/empty'] = (200, {}, '')
+    crawler = _crawler(site, crawler_config, storage, max_attempts=2)
+    stats = _crawl(crawler)
+
+    assert sorted(record['n'] for _, record in storage.records) == ['a', 'b', 'root']
+    assert stats == {'pending': 0, 'in_progress': 0, 'done': 2, 'failed': 2}
+    assert site.hits['/broken'] == 2
+    assert site.hits['/empty'] == 2
+
+
+def test_permanent_errors_are_not_retried(site, crawler_config, storage):
+    site.routes['/'] = (200, {}, _page(['root'], ['/missing', '/gone']))
+    site.routes['/gone'] = (410, {}, '')
+    crawler = _crawler(site, crawler_config, storage, max_attempts=3)
+    stats = _crawl(crawler)
+
+    assert stats == {'pending': 0, 'in_progress': 0, 'done': 1, 'failed': 2}
+    assert site.hits['/missing'] == 1
+    assert site.hits['/gone'] == 1
+
+
+def test_open_circuit_postpones_pages_without_using_attempts(site, crawler_config, storage):
+    links = [f'/down{i}' for i in range(3)]
+    site.routes['/'] = (200, {}, _page(['root'], links))
+    for link in links:
+        site.routes[link] = (500, {}, '')
+    crawler_config['circuit_breaker'] = {'failure_threshold': 1, 'reset_timeout': 0.05, 'max_reset_timeout': 0.1}
+    crawler = _crawler(site, crawler_config, storage, max_attempts=2, retry_delay=0.01)
+    stats = _crawl(crawler)
+
+    # 熔断期间被拒绝的请求不算一次尝试,每个页面都真正请求了 max_attempts 次
+    assert stats == {'pending': 0, 'in_progress': 0, 'done': 1, 'failed': 3}
+    assert [site.hits[link] for link in links] == [2, 2, 2]
+
+
+def test_page_that_recovers_is_completed(site, crawler_config, storage):
+    def flaky(handler):
+        if handler.server.hits['/flaky'] == 1:
+            return 503, {}, ''
+        return 200, {}, _page(['recovered'])
+
+    site.routes['/'] = (200, {}, _page(['root'], ['/flaky']))
+    site.routes['/flaky'] = flaky
+    crawler = _crawler(site, crawler_config, storage)
+    stats = _crawl(crawler)
+
+    assert sorted(record['n'] for _, record in storage.records) == ['recovered', 'root']
+    assert stats['done'] == 2
+
+
+def test_records_reach_storage_in_bounded_batches(site, crawler_config, storage, monkeypatch):
+    """大页面的记录边提取边分批写入,不会先在内存中生成整页的记录"""
+    from core.crawl.data_processor import DataProcessor
+
+    results = []
+    extract = DataProcessor.extract
+
+    async def tracking_extract(self):
+        result, records = await extract(self)
+        results.append(result)
+        return result, records
+
+    monkeypatch.setattr(DataProcessor, 'extract', tracking_extract)
+    generated_at_first_save = []
+    save = storage.save
+
+    async def tracking_save(table_name, data):
+        if not generated_at_first_save:
+            generated_at_first_save.append(results[0]['records'])
+        await save(table_name, data)
+
+    storage.save = tracking_save
+    site.routes['/'] = (200, {}, _page(range(1200)))
+    crawler_config['pipeline'] = {'store_batch': 100, 'store_queue': 1}
+    crawler = _crawler(site, crawler_config, storage)
+    stats = _crawl(crawler)
+
+    assert stats['done'] == 1
+    assert [record['_meta']['index'] for _, record in storage.records] == list(range(1200))
+    assert results[0]['records'] == 1200
+    # 第一条记录写入时,最多只生成了存储队列中的批次、存储阶段手中的批次与正在生成的批次
+    assert generated_at_first_save[0] <= 300
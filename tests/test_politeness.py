@@ -0,0 +1,255 @@
+import asyncio
+import time
+
+import aiohttp
+import pytest
+
+from core.crawl.crawler import WebCrawler
+from core.crawl.politeness import (ERROR, OK, THROTTLED, TIMEOUT, AimdController, ConcurrencyLimiter,
+                                   PolitenessScheduler, TokenBucket, classify_exception)
+from core.monitor.api import GLOBAL_LIMIT, collect_crawler_metrics
+from core.monitor.metrics import AIMD_ADJUSTMENTS
+
+
+def _saturated(limit):
+    """槽位已全部占用的限制器,只有这时成功的请求才会使并发增加"""
+    limiter = ConcurrencyLimiter(limit)
+    limiter.active = limit
+    return limiter
+
+
+def _controller(**policy):
+    return AimdController(dict({'min_concurrency': 1, 'max_concurrency': 64}, **policy))
+
+
+def _end_cooldown(controller):
+    controller._cooldown_until = 0.0
+
+
+def test_additive_increase_after_a_full_window_of_successes():
+    controller = _controller()
+    limiter = _saturated(4)
+    for _ in range(3):
+        controller.record(limiter, OK, 0.1)
+    assert limiter.limit == 4
+    controller.record(limiter, OK, 0.1)
+    assert limiter.limit == 5
+    # 新增的槽位也用满后,需要5次成功才再加1
+    limiter.active = 5
+    for _ in range(5):
+        controller.record(limiter, OK, 0.1)
+    assert limiter.limit == 6
+    assert controller.increases == 2
+
+
+def test_no_increase_while_slots_are_unused():
+    controller = _controller()
+    limiter = ConcurrencyLimiter(4)
+    for _ in range(20):
+        controller.record(limiter, OK, 0.1)
+    assert limiter.limit == 4
+
+
+def test_increase_stops_at_ceiling():
+    controller = _controller(max_concurrency=5)
+    limiter = _saturated(5)
+    for _ in range(50):
+        controller.record(limiter, OK, 0.1)
+    assert limiter.limit == 5
+
+
+@pytest.mark.parametrize('outcome', [THROTTLED, TIMEOUT])
+def test_multiplicative_decrease_on_throttling_and_timeouts(outcome):
+    controller = _controller(backoff=0.5)
+    limiter = _saturated(16)
+    controller.record(limiter, outcome, 1.0)
+    assert limiter.limit == 8
+    # 同一批在途请求的失败只触发一次减小
+    controller.record(limiter, outcome, 1.0)
+    assert limiter.limit == 8
+    _end_cooldown(controller)
+    controller.record(limiter, outcome, 1.0)
+    assert limiter.limit == 4
+    assert controller.decreases == 2
+
+
+def test_decrease_stops_at_floor():
+    controller = _controller(min_concurrency=3)
+    limiter = _saturated(4)
+    for _ in range(5):
+        _end_cooldown(controller)
+        controller.record(limiter, THROTTLED, 0.1)
+    assert limiter.limit == 3
+
+
+def test_rising_latency_decreases_by_one():
+    controller = _controller(latency_tolerance=1.5)
+    limiter = _saturated(10)
+    controller.record(limiter, OK, 0.1)
+    for _ in range(10):
+        controller.record(limiter, OK, 1.0)
+        if limiter.limit < 10:
+            break
+    assert limiter.limit == 9
+    assert controller.min_latency == 0.1
+
+
+def test_other_errors_do_not_adjust_concurrency():
+    controller = _controller()
+    limiter = _saturated(8)
+    for _ in range(20):
+        controller.record(limiter, ERROR, 5.0)
+    assert limiter.limit == 8
+    assert controller.ewma_latency is None
+
+
+def test_increase_wakes_waiters():
+    async def main():
+        limiter = ConcurrencyLimiter(1)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        _controller().record(limiter, OK, 0.1)
+        await asyncio.sleep(0)
+        assert waiter.done()
+        assert limiter.limit == 2
+
+    asyncio.run(main())
+
+
+def test_token_bucket_spaces_out_requests():
+    bucket = TokenBucket(rate=10, burst=2)
+    now = bucket.updated
+    assert bucket.reserve(now) == 0
+    assert bucket.reserve(now) == 0
+    assert bucket.reserve(now) == pytest.approx(0.1)
+    assert bucket.reserve(now) == pytest.approx(0.2)
+
+
+@pytest.mark.parametrize('error, expected', [
+    (asyncio.TimeoutError(), TIMEOUT),
+    (aiohttp.ServerTimeoutError(), TIMEOUT),
+    (aiohttp.ClientResponseError(None, (), status=429), THROTTLED),
+    (aiohttp.ClientResponseError(None, (), status=503), THROTTLED),
+    (aiohttp.ClientResponseError(None, (), status=500), ERROR),
+    (ConnectionError(), ERROR),
+])
+def test_exceptions_are_classified_for_feedback(error, expected):
+    assert classify_exception(error) == expected
+
+
+def test_scheduler_adapts_per_host():
+    scheduler = PolitenessScheduler({
+        'politeness': {'concurrency': 4, 'adaptive': True, 'backoff': 0.5},
+        'jobs': [],
+    })
+
+    async def throttled():
+        async with scheduler.slot('http://slow.com/'):
+            raise aiohttp.ClientResponseError(None, (), status=429)
+
+    async def main():
+        with pytest.raises(aiohttp.ClientResponseError):
+            await throttled()
+        async with scheduler.slot('http://fast.com/'):
+            pass
+
+    asyncio.run(main())
+    hosts = scheduler.stats()['hosts']
+    assert hosts['slow.com']['limit'] == 2
+    assert hosts['fast.com']['limit'] == 4
+
+
+def test_global_limit_and_adjustments_are_exported(crawler_config, storage):
+    crawler_config['crawler'] = {'concurrency': 8, 'adaptive': True, 'min_concurrency': 2, 'backoff': 0.5}
+    crawler = WebCrawler(crawler_config, storage)
+    decreased = AIMD_ADJUSTMENTS.labels('global', 'decrease')
+    before = decreased.value
+
+    async def main():
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                async with crawler.politeness.slot('http://slow.com/'):
+                    raise asyncio.TimeoutError()
+            await collect_crawler_metrics(crawler)
+        finally:
+            await crawler.close()
+
+    asyncio.run(main())
+    assert decreased.value == before + 1
+    assert GLOBAL_LIMIT.labels().value == 4
+
+
+def test_min_delay_spaces_requests_to_one_host():
+    scheduler = PolitenessScheduler({'politeness': {'min_delay': 0.05}, 'jobs': []})
+
+    async def request(url):
+        async with scheduler.slot(url):
+            return time.monotonic()
+
+    async def main():
+        return await asyncio.gather(*(request('http://a.com/') for _ in range(3)), request('http://b.com/'))
+
+    started = time.monotonic()
+    *same_host, other_host = asyncio.run(main())
+    assert max(same_host) - started >= 0.09
+    assert other_host - started < 0.04
+
+
+def _peak_concurrency(scheduler, requests):
+    """同时发出 (url, job) 请求,返回同一时刻进行中请求数的最大值"""
+    active = peak = 0
+
+    async def request(url, job_name):
+        nonlocal active, peak
+        async with scheduler.slot(url, job_name):
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    async def main():
+        await asyncio.gather(*(request(url, job_name) for url, job_name in requests))
+
+    asyncio.run(main())
+    return peak
+
+
+def test_jobs_share_one_budget_per_host():
+    scheduler = PolitenessScheduler({
+        'politeness': {'concurrency': 3},
+        'jobs': [{'name': 'a'}, {'name': 'b'}],
+    })
+    requests = [('http://shared.com/', job_name) for job_name in ('a', 'b') for _ in range(6)]
+    assert _peak_concurrency(scheduler, requests) == 3
+    assert list(scheduler.stats()['hosts']) == ['shared.com']
+
+
+def test_job_override_only_tightens_its_own_requests():
+    scheduler = PolitenessScheduler({
+        'politeness': {'concurrency': 4},
+        'jobs': [{'name': 'strict', 'politeness': {'concurrency': 1}},
+                 {'name': 'loose', 'politeness': {'concurrency': 50}}],
+    })
+    assert _peak_concurrency(scheduler, [('http://a.com/', 'strict')] * 4) == 1
+    # 任务自己的上限高于共享预算时,仍以共享预算为准
+    assert _peak_concurrency(scheduler, [('http://a.com/', 'loose')] * 8) == 4
+    assert _peak_concurrency(scheduler, [('http://a.com/', 'strict')] * 4 + [('http://a.com/', 'loose')] * 8) == 4
+    stats = scheduler.stats()
+    assert set(stats['job_hosts']) == {'strict|a.com', 'loose|a.com'}
+    assert stats['hosts']['a.com']['requests'] == 24
+
+
+def test_retry_after_defers_the_host_for_every_job():
+    scheduler = PolitenessScheduler({'jobs': [{'name': 'a'}, {'name': 'b', 'politeness': {'min_delay': 0}}]})
+
+    async def main():
+        async with scheduler.slot('http://a.com/', 'a'):
+            pass
+        scheduler.defer('http://a.com/x', 0.05)
+        started = time.monotonic()
+        async with scheduler.slot('http://a.com/', 'b'):
+            return time.monotonic() - started
+
+    assert asyncio.run(main()) >= 0.04
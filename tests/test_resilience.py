@@ -0,0 +1,213 @@
+import asyncio
+import email.utils
+import time
+
+import aiohttp
+import pytest
+import requests
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from core.crawl.crawler import WebCrawler
+from core.crawl.resilience import (CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError, ResilientFetcher,
+                                   parse_retry_after)
+
+
+def _expire(breaker):
+    """让打开的熔断器冷却结束"""
+    breaker.opened_at -= breaker.reset_timeout
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker('a.com', {'failure_threshold': 3, 'reset_timeout': 10})
+    for _ in range(2):
+        breaker.before_request()
+        breaker.record_failure()
+    breaker.record_success()
+    # 成功后失败计数清零,需要重新连续失败3次
+    for _ in range(3):
+        breaker.before_request()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_request()
+    assert 0 < error.value.retry_in <= 10
+    assert breaker.stats()['rejected'] == 1
+
+
+def test_half_open_admits_probe_and_closes_on_success():
+    breaker = CircuitBreaker('a.com', {'failure_threshold': 1, 'reset_timeout': 10, 'half_open_probes': 1})
+    breaker.record_failure()
+    _expire(breaker)
+    breaker.before_request()
+    assert breaker.state == HALF_OPEN
+    # 探测请求返回前,其余请求继续快速失败
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_request()
+
+
+def test_failed_probe_reopens_with_longer_cooldown():
+    breaker = CircuitBreaker('a.com', {'failure_threshold': 1, 'reset_timeout': 10, 'max_reset_timeout': 30})
+    breaker.record_failure()
+    for expected in (20, 30, 30):
+        _expire(breaker)
+        breaker.before_request()
+        breaker.record_failure()
+        assert breaker.state == OPEN
+        assert breaker.reset_timeout == expected
+    breaker.record_success()
+    assert breaker.reset_timeout == 10
+
+
+def test_cancelled_probe_is_returned():
+    breaker = CircuitBreaker('a.com', {'failure_threshold': 1, 'reset_timeout': 10})
+    breaker.record_failure()
+    _expire(breaker)
+    breaker.before_request()
+    breaker.release_probe()
+    breaker.before_request()
+
+
+def _http_error(status, headers=None):
+    url = URL('http://a.com/')
+    request_info = aiohttp.RequestInfo(url, 'GET', CIMultiDictProxy(CIMultiDict()), url)
+    return aiohttp.ClientResponseError(request_info, (), status=status, headers=headers or {})
+
+
+def _requests_error(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.HTTPError(response=response)
+
+
+@pytest.mark.parametrize('make_error', [_http_error, _requests_error])
+@pytest.mark.parametrize('status, expected', [
+    (404, (False, False, None)),
+    (403, (False, False, None)),
+    (500, (True, True, None)),
+    (502, (True, True, None)),
+    (501, (False, True, None)),
+    (429, (True, False, 7.0)),
+    (503, (True, True, 7.0)),
+])
+def test_http_errors_are_classified_by_status(make_error, status, expected):
+    fetcher = ResilientFetcher({})
+    assert fetcher.classify(make_error(status, {'Retry-After': '7'})) == expected
+
+
+@pytest.mark.parametrize('error, expected', [
+    (asyncio.TimeoutError(), (True, True, None)),
+    (aiohttp.ClientConnectionError(), (True, True, None)),
+    (requests.ConnectionError(), (True, True, None)),
+    (ValueError('响应体过大'), (False, False, None)),
+])
+def test_other_errors_are_classified_by_type(error, expected):
+    assert ResilientFetcher({}).classify(error) == expected
+
+
+def test_retry_after_accepts_seconds_and_http_dates():
+    assert parse_retry_after('120') == 120
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert 50 < parse_retry_after(email.utils.formatdate(time.time() + 60, usegmt=True)) <= 60
+
+
+def test_retryable_errors_are_retried_until_success():
+    fetcher = ResilientFetcher({'request': {'retries': 3, 'backoff_base': 0}})
+    errors = [aiohttp.ClientConnectionError(), _http_error(502)]
+
+    async def attempt():
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+
+    assert asyncio.run(fetcher.call('http://a.com/', attempt)) == 'ok'
+    assert fetcher.stats()['attempts'] == 3
+    assert fetcher.stats()['retried'] == 2
+    assert fetcher.breaker('http://a.com/x').failures == 0
+
+
+def test_permanent_errors_are_not_retried():
+    fetcher = ResilientFetcher({'request': {'retries': 3, 'backoff_base': 0}})
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        raise _http_error(404)
+
+    with pytest.raises(aiohttp.ClientResponseError):
+        asyncio.run(fetcher.call('http://a.com/', attempt))
+    assert len(calls) == 1
+    # 404 说明主机本身可用,不计入熔断
+    assert fetcher.breaker('http://a.com/').failures == 0
+
+
+def test_retry_after_is_honoured_and_shared_with_host():
+    fetcher = ResilientFetcher({'request': {'retries': 1, 'max_retry_after': 0.01}})
+    deferred = []
+    errors = [_http_error(429, {'Retry-After': '30'})]
+
+    async def attempt():
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+
+    assert asyncio.run(fetcher.call('http://a.com/', attempt, deferred.append)) == 'ok'
+    # 等待时间不超过 max_retry_after
+    assert deferred == [0.01]
+
+
+def test_open_breaker_fails_fast_without_calling_host():
+    fetcher = ResilientFetcher({
+        'request': {'retries': 0},
+        'circuit_breaker': {'failure_threshold': 2, 'reset_timeout': 60},
+    })
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        raise aiohttp.ClientConnectionError()
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(aiohttp.ClientConnectionError):
+                await fetcher.call('http://a.com/', attempt)
+        with pytest.raises(CircuitOpenError):
+            await fetcher.call('http://a.com/other', attempt)
+        # 其他主机不受影响
+        with pytest.raises(aiohttp.ClientConnectionError):
+            await fetcher.call('http://b.com/', attempt)
+
+    asyncio.run(main())
+    assert len(calls) == 3
+    assert fetcher.stats()['hosts']['a.com']['state'] == OPEN
+
+
+@pytest.mark.parametrize('method', ['requests', 'aiohttp'])
+def test_failing_host_does_not_hold_up_healthy_host(site, blackhole, crawler_config, method):
+    """不可用的主机只会拖慢自己的请求,其他主机的抓取照常进行"""
+    site.routes['/ok'] = (200, {}, '<html>ok</html>')
+    crawler_config['request'] = {'timeout': 0.5, 'retries': 1, 'backoff_base': 0}
+
+    async def main():
+        crawler = WebCrawler(crawler_config, None)
+        try:
+            started = time.perf_counter()
+            # 先发出不可用主机的请求,再与健康主机的请求同时进行
+            dead = [asyncio.ensure_future(crawler.fetch(f'{blackhole}/{i}', method)) for i in range(4)]
+            healthy = await asyncio.gather(*(crawler.fetch(site.url('/ok'), method) for _ in range(5)))
+            elapsed = time.perf_counter() - started
+            assert await asyncio.gather(*dead) == [(None, None)] * 4
+            return healthy, elapsed
+        finally:
+            await crawler.close()
+
+    healthy, elapsed = asyncio.run(main())
+    assert all(text == '<html>ok</html>' for text, _ in healthy)
+    # 每个不可用主机的请求要等 0.5 秒超时,阻塞事件循环时健康主机至少要等 2 秒
+    assert elapsed < 0.4
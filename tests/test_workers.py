@@ -0,0 +1,68 @@
+import asyncio
+import threading
+import time
+
+from core.crawl.frontier import CrawlFrontier
+from core.crawl.workers import WorkerCoordinator
+
+
+def _job(site):
+    return {
+        'name': 'site',
+        'url': site.url('/'),
+        'max_depth': 1,
+        'bloomfilter': {'mode': 'memory'},
+        'template': {'selector': 'tr', 'attr': {'n': 'td'}, 'links': {'selector': 'a[href]'}},
+    }
+
+
+def test_resume_can_be_limited_to_one_shard(tmp_path):
+    frontier = CrawlFrontier(str(tmp_path / 'frontier.db'), shards=2)
+    try:
+        urls = [f'http://host{i}.example/' for i in range(8)]
+        frontier.push('job', urls, 1)
+        shard0 = frontier.pop_batch('job', 100, 0)
+        assert len(shard0) + len(frontier.pop_batch('job', 100, 1)) == 8
+        # 分片0的工作进程退出后只恢复它领取的URL,分片1正在抓取的不受影响
+        recovered = frontier.resume('job', 0)
+        assert recovered == len(shard0) and 0 < recovered < 8
+        assert frontier.stats('job') == {'pending': recovered, 'in_progress': 8 - recovered, 'done': 0, 'failed': 0}
+        assert frontier.pop_batch('job', 100, 1) == []
+    finally:
+        frontier.close()
+
+
+def test_killed_worker_is_restarted_and_its_urls_requeued(site, crawler_config, storage):
+    release = threading.Event()
+
+    def slow(handler):
+        release.wait(30)
+        return 200, {}, '<html><table><tr><td>slow</td></tr></table></html>'
+
+    site.routes['/'] = (200, {}, '<html><a href="/slow">s</a><table><tr><td>root</td></tr></table></html>')
+    site.routes['/slow'] = slow
+    crawler_config['jobs'] = [_job(site)]
+    crawler_config['workers'] = {'poll_interval': 0.1, 'flush_interval': 0.1}
+    crawler_config['request'] = {'retries': 0, 'timeout': 60}
+    coordinator = WorkerCoordinator(crawler_config, storage, workers=1)
+
+    def kill_worker_mid_request():
+        deadline = time.monotonic() + 60
+        while not site.hits['/slow'] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        coordinator._processes[0].kill()
+        release.set()
+
+    killer = threading.Thread(target=kill_worker_mid_request, daemon=True)
+    killer.start()
+    asyncio.run(coordinator.run('site', resume=False))
+    killer.join()
+
+    frontier = CrawlFrontier(crawler_config['frontier']['path'], recover=False)
+    try:
+        assert frontier.stats('site') == {'pending': 0, 'in_progress': 0, 'done': 2, 'failed': 0}
+    finally:
+        frontier.close()
+    assert coordinator.restarts == {0: 1}
+    assert site.hits['/slow'] == 2
+    assert 'slow' in [record['n'] for _, record in storage.records]
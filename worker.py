@@ -0,0 +1,46 @@
+"""
+多进程抓取入口: 协调进程按主机把URL分给多个工作进程,每个进程运行自己的事件循环,
+共用同一个抓取队列和去重文件,记录汇总后写入配置中的存储。
+
+用法:
+    python worker.py --job 新发地                 # 进程数默认为 workers.processes 或CPU核数
+    python worker.py --job 新发地 --workers 4 --restart
+"""
+import argparse
+import asyncio
+import logging
+
+from core.config import ConfigLoader
+
+
+async def main(args):
+    from core.crawl.workers import WorkerCoordinator
+    from core.storage import StorageFactory
+
+    config = ConfigLoader.load_config(args.config)
+    if not config:
+        logging.error("Failed to load configuration")
+        return
+    storage = StorageFactory(config).create_storage()
+    try:
+        await WorkerCoordinator(config, storage, args.workers).run(args.job, resume=not args.restart)
+    finally:
+        await storage.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Hermes 多进程抓取')
+    parser.add_argument('--job', required=True, help='要抓取的任务名称')
+    parser.add_argument('--workers', type=int, help='工作进程数')
+    parser.add_argument('--config', default='config/config.json', help='配置文件')
+    parser.add_argument('--restart', action='store_true', help='忽略上次的进度,从起始地址重新抓取')
+    arguments = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[logging.FileHandler('system.log'), logging.StreamHandler()]
+    )
+    try:
+        asyncio.run(main(arguments))
+    except KeyboardInterrupt:
+        logging.info("收到键盘中断信号，程序正在退出...")